@@ -0,0 +1,166 @@
+import asyncio
+import collections
+import json
+import time
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        # Returns 0 when a token was taken, otherwise the seconds until one is available
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class EndpointClass:
+    def __init__(self, name, max_in_flight, global_share, rate, burst, limit_anonymous=True):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        # Share of the global in-flight limit this class may fill; lower-priority
+        # classes get a smaller share so the remainder is kept free for critical work.
+        self.global_share = global_share
+        self.rate = rate
+        self.burst = burst
+        # Anonymous callers are bucketed by IP, which many field teams may share behind
+        # one satellite or NAT gateway; classes that must not shed them rely on the
+        # in-flight caps alone
+        self.limit_anonymous = limit_anonymous
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed_rate_limited = 0
+        self.shed_overload = 0
+
+    def as_dict(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "admitted": self.admitted,
+            "shed_rate_limited": self.shed_rate_limited,
+            "shed_overload": self.shed_overload,
+        }
+
+
+class AdmissionController:
+    # All state is touched from the event loop only, so no locking is needed.
+    # take(key, rate, burst) replaces the per-process token buckets, e.g. with
+    # ones in a store shared by several workers; in-flight limits stay local.
+    # admit() calls it in a thread, since a shared store does I/O.
+
+    def __init__(self, classes, classify, global_max_in_flight=64, max_tracked_users=10000, take=None):
+        self.classes = {endpoint_class.name: endpoint_class for endpoint_class in classes}
+        self.classify = classify
+        self.take = take
+        self.global_max_in_flight = global_max_in_flight
+        self.in_flight = 0
+        self._buckets = collections.OrderedDict()
+        self._max_tracked_users = max_tracked_users
+
+    def _bucket(self, key, endpoint_class):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(endpoint_class.rate, endpoint_class.burst)
+            if len(self._buckets) > self._max_tracked_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _limited(self, endpoint_class, authenticated):
+        return endpoint_class.rate > 0 and (authenticated or endpoint_class.limit_anonymous)
+
+    def try_admit(self, class_name, identity, authenticated=True):
+        # Returns (status_code, retry_after) for a shed request, or None when admitted
+        endpoint_class = self.classes[class_name]
+        if self._limited(endpoint_class, authenticated):
+            if self.take is not None:
+                wait = self.take(f"{identity}:{class_name}", endpoint_class.rate, endpoint_class.burst)
+            else:
+                wait = self._bucket((identity, class_name), endpoint_class).take()
+            if wait > 0:
+                endpoint_class.shed_rate_limited += 1
+                return 429, wait
+        return self._admit_in_flight(endpoint_class)
+
+    async def admit(self, class_name, identity, authenticated=True):
+        # As try_admit, without blocking the event loop on the shared take
+        endpoint_class = self.classes[class_name]
+        if self.take is None or not self._limited(endpoint_class, authenticated):
+            return self.try_admit(class_name, identity, authenticated)
+        wait = await asyncio.to_thread(self.take, f"{identity}:{class_name}", endpoint_class.rate, endpoint_class.burst)
+        if wait > 0:
+            endpoint_class.shed_rate_limited += 1
+            return 429, wait
+        return self._admit_in_flight(endpoint_class)
+
+    def _admit_in_flight(self, endpoint_class):
+        global_limit = self.global_max_in_flight * endpoint_class.global_share
+        if endpoint_class.in_flight >= endpoint_class.max_in_flight or self.in_flight >= global_limit:
+            endpoint_class.shed_overload += 1
+            return 503, 1.0
+        endpoint_class.in_flight += 1
+        endpoint_class.admitted += 1
+        self.in_flight += 1
+        return None
+
+    def release(self, class_name):
+        self.classes[class_name].in_flight -= 1
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "global_max_in_flight": self.global_max_in_flight,
+            "tracked_users": len(self._buckets),
+            "classes": {name: endpoint_class.as_dict() for name, endpoint_class in self.classes.items()},
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller, identify, enabled=True):
+        self.app = app
+        self.controller = controller
+        self.identify = identify
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        class_name = self.controller.classify(scope["method"], scope["path"])
+        if class_name is None:
+            await self.app(scope, receive, send)
+            return
+        # identify(headers, client) -> (identity, authenticated)
+        identity, authenticated = self.identify(dict(scope.get("headers") or []), scope.get("client"))
+        rejected = await self.controller.admit(class_name, identity, authenticated)
+        if rejected is not None:
+            status_code, retry_after = rejected
+            detail = "Too many requests" if status_code == 429 else "Server busy, retry later"
+            body = json.dumps({"detail": detail}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(class_name)
@@ -11,6 +11,7 @@ def polish_symptoms_table(symptoms):
         return
 
     df = pd.DataFrame(symptoms)
+    symptom_ids = df["id"].tolist() if "id" in df.columns else [None] * len(df)
     if "diagnosis" not in df.columns:
         df["diagnosis"] = ""
     if "treatment_guidance" not in df.columns:
@@ -29,6 +30,7 @@ def polish_symptoms_table(symptoms):
         updated_symptoms = []
         for index, row in edited_df.iterrows():
             updated_symptoms.append({
+                "id": symptom_ids[index],
                 "symptom": row["Symptom"],
                 "user_severity": row["Patient Rating"],
                 "calculated_severity": row["Calculated Severity"],
@@ -47,6 +49,36 @@ def polish_symptoms_table(symptoms):
         except Exception as e:
             st.error(f"Error saving changes: {e}")
 
+# --- Change Feed Sync ---
+def synced_list(entity, key="id"):
+    # Cached copy of a list, kept current from /changes instead of re-downloading it
+    headers = {"Authorization": f"Bearer {st.session_state.token}"}
+    cache = st.session_state.setdefault("synced", {}).get(entity)
+    while cache is not None:
+        resp = requests.get(f"{API_URL}/changes", headers=headers, params={"since": cache["cursor"], "entities": entity})
+        resp.raise_for_status()
+        feed = resp.json()
+        if feed["reset"]:
+            cache = None
+            break
+        for change in feed["changes"]:
+            if change["op"] == "delete":
+                cache["rows"].pop(str(change["id"]), None)
+            else:
+                cache["rows"][str(change["id"])] = change["row"]
+        cache["cursor"] = feed["cursor"]
+        if not feed["has_more"]:
+            break
+    if cache is None:
+        # Cursor and full list come from the primary in one call, so the list is never
+        # older than the cursor (the list endpoints may be served by a lagging replica)
+        resp = requests.get(f"{API_URL}/changes", headers=headers, params={"since": 0, "entities": entity, "snapshot": True})
+        resp.raise_for_status()
+        feed = resp.json()
+        cache = {"cursor": feed["cursor"], "rows": {str(row[key]): row for row in feed["rows"][entity]}}
+        st.session_state.synced[entity] = cache
+    return list(cache["rows"].values())
+
 # --- Auth State ---
 if 'token' not in st.session_state:
     st.session_state.token = None
@@ -81,8 +113,41 @@ def login():
 # --- Health Monitoring (Medic) ---
 def health_monitoring():
     st.header("Health Monitoring")
-    patients = ["patient1"]
-    selected_patient = st.selectbox("Select Patient", patients)
+    search = st.text_input("Search Patients", placeholder="Start typing a username or name...")
+    try:
+        response = requests.get(
+            f"{API_URL}/patients/directory",
+            headers={"Authorization": f"Bearer {st.session_state.token}"},
+            params={"q": search, "limit": 50}
+        )
+        response.raise_for_status()
+        patients = [
+            f"{p['username']} ({p['full_name']})" if p.get("full_name") else p["username"]
+            for p in response.json()["results"]
+        ]
+    except Exception as e:
+        st.error(f"Error searching patients: {e}")
+        return
+    if not patients:
+        st.info("No matching patients.")
+        return
+    selected_patient = st.selectbox("Select Patient", patients).split(" (")[0]
+    try:
+        response = requests.get(
+            f"{API_URL}/patients/summary",
+            headers={"Authorization": f"Bearer {st.session_state.token}"},
+            params={"patient": selected_patient}
+        )
+        if response.status_code == 200:
+            summary = response.json()
+            latest = summary.get("latest") or {}
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Latest", f"{latest.get('symptom', '-')} ({latest.get('calculated_severity', '-')})")
+            col2.metric("Max 24h", summary.get("max_severity_24h") or "-")
+            col3.metric("Max 7d", summary.get("max_severity_7d") or "-")
+            col4.metric("Open diagnoses", summary.get("open_diagnoses", 0))
+    except Exception as e:
+        st.warning(f"Could not load patient summary: {e}")
     if st.button("Medical Record"):
         try:
             response = requests.get(
@@ -139,6 +204,9 @@ def create_video_session():
             response.raise_for_status()
             data = response.json()
             st.success(data.get("message", "Session started"))
+            if data.get("room_id"):
+                st.session_state.chat_room = data["room_id"]
+                st.info(f"Chat room for this session: {data['room_id']}")
             video_url = data.get("video_url")
             if video_url:
                 st.markdown(f"[Click here to join the video session]({video_url})", unsafe_allow_html=True)
@@ -164,17 +232,10 @@ def trigger_alert():
 def active_alerts():
     st.header("Active Alerts")
     status_filter = st.selectbox("Filter Alerts by Status", ["all", "active", "inactive"])
-    params = {}
-    if status_filter != "all":
-        params["status"] = status_filter
     try:
-        response = requests.get(
-            f"{API_URL}/active-alerts",
-            headers={"Authorization": f"Bearer {st.session_state.token}"},
-            params=params
-        )
-        response.raise_for_status()
-        alerts = response.json()
+        alerts = synced_list("alerts", key="alert_id")
+        if status_filter != "all":
+            alerts = [alert for alert in alerts if alert.get("status") == status_filter]
         if not alerts:
             st.info("No alerts to display.")
             return
@@ -331,12 +392,7 @@ def delivery_logistics():
                 st.error(f"Error submitting delivery request: {e}")
     # Show existing delivery requests
     try:
-        resp = requests.get(
-            f"{API_URL}/deliveries",
-            headers={"Authorization": f"Bearer {st.session_state.token}"}
-        )
-        resp.raise_for_status()
-        deliveries = resp.json()
+        deliveries = synced_list("deliveries")
         if deliveries:
             st.subheader("Recent Delivery Requests")
             st.table(deliveries)
@@ -376,12 +432,7 @@ def search_and_rescue():
                 st.error(f"Error: {e}")
     # Show existing SAR requests in a polished, expandable table
     try:
-        resp = requests.get(
-            f"{API_URL}/sar-requests",
-            headers={"Authorization": f"Bearer {st.session_state.token}"}
-        )
-        resp.raise_for_status()
-        sar_requests = resp.json()
+        sar_requests = synced_list("sar_requests")
         if sar_requests:
             df = pd.DataFrame(sar_requests)
             # Optional: Rename columns for clarity
@@ -455,12 +506,7 @@ def submit_sar_with_satellite():
                     st.error(f"Error submitting SAR request: {e}")
     # Show existing SAR requests with satellite in a polished table
     try:
-        resp = requests.get(
-            f"{API_URL}/sar-requests",
-            headers={"Authorization": f"Bearer {st.session_state.token}"}
-        )
-        resp.raise_for_status()
-        sar_requests = resp.json()
+        sar_requests = synced_list("sar_requests")
         if sar_requests:
             df = pd.DataFrame(sar_requests)
             df = df.rename(columns={
@@ -474,6 +520,16 @@ def submit_sar_with_satellite():
             })
             with st.expander("Show All SAR Requests Table", expanded=False):
                 st.dataframe(df, use_container_width=True)
+            # Scene details are fetched only for the request being looked at
+            with st.expander("Satellite Scenes", expanded=False):
+                sar_id = st.selectbox("SAR request", df["ID"].tolist(), key="sar_scene_id")
+                if st.button("Load Scenes"):
+                    response = requests.get(
+                        f"{API_URL}/sar-requests/{sar_id}/scenes",
+                        headers={"Authorization": f"Bearer {st.session_state.token}"}
+                    )
+                    response.raise_for_status()
+                    st.json(response.json())
         else:
             st.info("No SAR requests found.")
     except Exception as e:
@@ -483,19 +539,23 @@ import requests
 import streamlit as st
 
 def address_to_coordinates(address):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"q": address, "format": "json"}
-    headers = {"User-Agent": "RemoteHealthApp/1.0 (ktrepas@gmail.com)"}
+    # Resolved by the backend's geocoding worker, which owns the Nominatim quota
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = requests.post(
+            f"{API_URL}/geocode/batch",
+            headers={"Authorization": f"Bearer {st.session_state.token}"},
+            json={"addresses": [address], "priority": "ui"},
+            timeout=60
+        )
         if response.status_code != 200:
             st.warning(f"Geocoding API error: {response.status_code}")
             return None
-        results = response.json()
-        if results:
-            lat = results[0]["lat"]
-            lon = results[0]["lon"]
-            return f"{lat},{lon}"
+        result = response.json()["results"][0]
+        if result["status"] in ("pending", "busy"):
+            st.warning("Geocoding is busy, please try again in a moment.")
+            return None
+        if result["status"] == "ok":
+            return f"{result['latitude']},{result['longitude']}"
         else:
             return None
     except Exception as e:
@@ -505,6 +565,16 @@ def address_to_coordinates(address):
 # --- Chat Session ---
 def chat_session():
     st.header("Chat Session")
+    room_id = st.text_input(
+        "Chat Room",
+        value=st.session_state.get("chat_room", ""),
+        help="The room id shown when the video session was created."
+    ).strip()
+    if not room_id:
+        st.info("Start a video session or enter its room id to chat.")
+        return
+    st.session_state.chat_room = room_id
+    headers = {"Authorization": f"Bearer {st.session_state.token}"}
     if st.session_state.role == "medical_staff":
         diagnosis = st.text_area("Diagnosis", placeholder="Enter diagnosis here...")
         treatment_guidance = st.text_area("Treatment Guidance", placeholder="Enter treatment guidance here...")
@@ -512,23 +582,73 @@ def chat_session():
             if not diagnosis.strip() or not treatment_guidance.strip():
                 st.error("Both fields are required.")
                 return
-            st.success("Diagnosis and Treatment Guidance submitted successfully!")
-            st.write("### Submitted Data")
-            st.write(f"**Diagnosis:** {diagnosis}")
-            st.write(f"**Treatment Guidance:** {treatment_guidance}")
+            try:
+                for kind, text in (("diagnosis", diagnosis), ("treatment_guidance", treatment_guidance)):
+                    response = requests.post(
+                        f"{API_URL}/chat/{room_id}/messages",
+                        headers=headers,
+                        json={"kind": kind, "text": text}
+                    )
+                    response.raise_for_status()
+                st.success("Diagnosis and Treatment Guidance submitted successfully!")
+            except Exception as e:
+                st.error(f"Error sending message: {e}")
     else:
-        st.text_area("Diagnosis (Read-Only)", "No diagnosis available yet.", disabled=True)
-        treatment_guidance = st.text_area("Treatment Guidance", placeholder="Enter treatment guidance here...")
+        text = st.text_area("Message", placeholder="Describe how you are feeling or ask a question...")
         if st.button("Submit"):
-            if not treatment_guidance.strip():
-                st.error("Treatment Guidance is required.")
+            if not text.strip():
+                st.error("A message is required.")
                 return
-            st.success("Treatment Guidance submitted successfully!")
-            st.write("### Submitted Data")
-            st.write(f"**Treatment Guidance:** {treatment_guidance}")
+            try:
+                response = requests.post(
+                    f"{API_URL}/chat/{room_id}/messages",
+                    headers=headers,
+                    json={"kind": "message", "text": text}
+                )
+                response.raise_for_status()
+                st.success("Message sent successfully!")
+            except Exception as e:
+                st.error(f"Error sending message: {e}")
+    st.button("Refresh")
+    try:
+        response = requests.get(f"{API_URL}/chat/{room_id}/messages", headers=headers, params={"limit": 100})
+        response.raise_for_status()
+        messages = response.json()
+    except Exception as e:
+        st.error(f"Error loading messages: {e}")
+        return
+    labels = {"diagnosis": "Diagnosis", "treatment_guidance": "Treatment Guidance"}
+    if not messages:
+        st.info("No messages yet.")
+    for message in messages:
+        label = labels.get(message["kind"])
+        prefix = f"**{label}** from" if label else "From"
+        st.write(f"{prefix} **{message['sender']}** ({message['timestamp'][:16].replace('T', ' ')}): {message['text']}")
 
 def dashboard():
     st.header("Dashboard")
+    try:
+        response = requests.get(
+            f"{API_URL}/stats",
+            headers={"Authorization": f"Bearer {st.session_state.token}"}
+        )
+        if response.status_code == 200:
+            stats = response.json()
+            open_sar = stats["sar"]["open_by_urgency"]
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Active alerts", stats["alerts"]["active"])
+            col2.metric("Open SAR", sum(open_sar.values()))
+            col3.metric("Pending deliveries", stats["deliveries"]["by_status"].get("pending", 0))
+            col4.metric("Low-stock items", stats["supplies"]["low_stock_count"])
+            col1, col2 = st.columns(2)
+            col1.caption("Open SAR by urgency")
+            col1.bar_chart(pd.Series(open_sar, dtype="int64"))
+            col2.caption("Deliveries by vehicle")
+            col2.bar_chart(pd.Series(stats["deliveries"]["by_vehicle"], dtype="int64"))
+            if stats["supplies"]["low_stock"]:
+                st.caption("Low stock: " + ", ".join(stats["supplies"]["low_stock"]))
+    except Exception as e:
+        st.warning(f"Could not load statistics: {e}")
     # ...rest of the code...
     # Fetch available tables
     try:
@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+
+import pandas as pd
+
+
+class ParquetArchive:
+    # Cold rows as compressed Parquet files under root/<table>/<YYYY-MM>/.
+    # Every archival batch adds a part file, so writers never rewrite data in
+    # place; compact() later merges a month's parts. A batch may be archived
+    # twice if its hot rows could not be deleted afterwards, so reads drop
+    # duplicate keys.
+
+    def __init__(self, root, compression="zstd"):
+        self.root = root
+        self.compression = compression
+
+    def _table_dir(self, table):
+        return os.path.join(self.root, table)
+
+    def months(self, table):
+        path = self._table_dir(table)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+
+    def parts(self, table, month):
+        path = os.path.join(self._table_dir(table), month)
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.endswith(".parquet")
+        ) if os.path.isdir(path) else []
+
+    def _write_file(self, df, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        df.to_parquet(tmp, index=False, compression=self.compression)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def write(self, table, df, time_column, key_column):
+        # Returns the number of part files written; they are on disk (fsynced) on return
+        times = pd.to_datetime(df[time_column])
+        df = df.assign(**{time_column: times})
+        written = 0
+        for month, part in df.groupby(times.dt.strftime("%Y-%m")):
+            name = f"part-{part[key_column].min()}-{part[key_column].max()}-{uuid.uuid4().hex[:8]}.parquet"
+            self._write_file(part, os.path.join(self._table_dir(table), month, name))
+            written += 1
+        return written
+
+    def read_months(self, table, key_column, time_column=None, filters=None, since=None, until=None):
+        # One DataFrame per archived month, oldest first; filters are pyarrow
+        # (column, op, value) tuples pushed down to each file
+        for month in self.months(table):
+            if since is not None and month < pd.Timestamp(since).strftime("%Y-%m"):
+                continue
+            if until is not None and month > pd.Timestamp(until).strftime("%Y-%m"):
+                continue
+            frames = []
+            for path in self.parts(table, month):
+                frame = pd.read_parquet(path, filters=filters or None)
+                if len(frame):
+                    frames.append(frame)
+            if not frames:
+                continue
+            df = pd.concat(frames, ignore_index=True).drop_duplicates(subset=key_column, keep="last")
+            if time_column is not None and since is not None:
+                df = df[df[time_column] >= pd.Timestamp(since)]
+            if time_column is not None and until is not None:
+                df = df[df[time_column] < pd.Timestamp(until)]
+            if len(df):
+                yield df.sort_values(time_column or key_column, kind="stable").reset_index(drop=True)
+
+    def read(self, table, key_column, time_column=None, filters=None, since=None, until=None):
+        frames = list(self.read_months(table, key_column, time_column, filters, since, until))
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values(time_column or key_column, kind="stable").reset_index(drop=True)
+
+    def compact(self, table, month, key_column, min_parts=8):
+        # Merges a month's part files into one once there are at least min_parts.
+        # The merged file is written before the parts are removed; a reader in
+        # between sees duplicates, which read() drops.
+        parts = self.parts(table, month)
+        if len(parts) < min_parts:
+            return False
+        df = pd.concat([pd.read_parquet(path) for path in parts], ignore_index=True)
+        df = df.drop_duplicates(subset=key_column, keep="last").sort_values(key_column, kind="stable")
+        name = f"part-{df[key_column].min()}-{df[key_column].max()}-{uuid.uuid4().hex[:8]}.parquet"
+        self._write_file(df, os.path.join(self._table_dir(table), month, name))
+        for path in parts:
+            os.remove(path)
+        return True
+
+    def stats(self):
+        tables = {}
+        if not os.path.isdir(self.root):
+            return tables
+        for table in sorted(os.listdir(self.root)):
+            if not os.path.isdir(self._table_dir(table)):
+                continue
+            months = self.months(table)
+            files = [path for month in months for path in self.parts(table, month)]
+            tables[table] = {
+                "months": len(months),
+                "oldest_month": months[0] if months else None,
+                "newest_month": months[-1] if months else None,
+                "files": len(files),
+                "bytes": sum(os.path.getsize(path) for path in files),
+            }
+        return tables
+
+
+class LockFile:
+    # Cross-process "only one archiver" lock that works on Windows and POSIX.
+    # A lock older than stale_seconds is assumed to belong to a dead process, so
+    # the holder calls refresh() as it makes progress to keep its mtime recent.
+
+    def __init__(self, path, stale_seconds=3600):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.held = False
+        self._token = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        try:
+            if time.time() - os.path.getmtime(self.path) > self.stale_seconds:
+                os.remove(self.path)
+        except OSError:
+            pass
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.write(fd, self._token.encode())
+        os.close(fd)
+        self.held = True
+        return True
+
+    def refresh(self):
+        # Returns False if the lock was taken over (it went stale before this call)
+        if not self.held:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                if f.read().decode(errors="replace") != self._token:
+                    self.held = False
+                    return False
+            os.utime(self.path)
+        except OSError:
+            self.held = False
+            return False
+        return True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            try:
+                with open(self.path, "rb") as f:
+                    if f.read().decode(errors="replace") != self._token:
+                        return
+                os.remove(self.path)
+            except OSError:
+                pass
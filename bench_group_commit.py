@@ -0,0 +1,120 @@
+"""Inserts per second with one commit per request vs. group commit.
+
+    python bench_group_commit.py                      # local SQLite file, synchronous=FULL
+    python bench_group_commit.py --odbc "DRIVER=...;" # a real SQL Server
+
+Each concurrency level runs the same number of inserts from N threads; a
+request counts as done only once its row is committed.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from group_commit import GroupCommitWriter
+
+INSERT = "INSERT INTO BenchInserts (patient, symptom, severity) VALUES (?, ?, ?)"
+
+
+def sqlite_factory(path):
+    def connect():
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+    return connect
+
+
+def odbc_factory(connection_string):
+    import pyodbc
+
+    def connect():
+        return pyodbc.connect(connection_string)
+    return connect
+
+
+def prepare(connect, odbc):
+    conn = connect()
+    if odbc:
+        conn.execute("IF OBJECT_ID('BenchInserts') IS NOT NULL DROP TABLE BenchInserts")
+        conn.execute("CREATE TABLE BenchInserts (id INT IDENTITY(1,1) PRIMARY KEY, patient NVARCHAR(100), symptom NVARCHAR(100), severity INT)")
+    else:
+        conn.execute("DROP TABLE IF EXISTS BenchInserts")
+        conn.execute("CREATE TABLE BenchInserts (id INTEGER PRIMARY KEY AUTOINCREMENT, patient TEXT, symptom TEXT, severity INT)")
+    conn.commit()
+    conn.close()
+
+
+def run_threads(concurrency, total, work):
+    per_thread = total // concurrency
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(n):
+        barrier.wait()
+        for i in range(per_thread):
+            work(n, i)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return per_thread * concurrency / (time.perf_counter() - started)
+
+
+def bench_per_request(connect, concurrency, total):
+    connections = [connect() for _ in range(concurrency)]
+
+    def work(n, i):
+        conn = connections[n]
+        conn.execute(INSERT, (f"patient{n}", "cough", i % 10 + 1))
+        conn.commit()
+
+    rate = run_threads(concurrency, total, work)
+    for conn in connections:
+        conn.close()
+    return rate
+
+
+def bench_group(connect, concurrency, total, max_batch, max_wait_ms):
+    writer = GroupCommitWriter("BenchInserts", connect, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def work(n, i):
+        writer.submit(INSERT, (f"patient{n}", "cough", i % 10 + 1)).result()
+
+    rate = run_threads(concurrency, total, work)
+    stats = writer.stats()
+    writer.stop()
+    return rate, stats["avg_batch"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--odbc", help="ODBC connection string; defaults to a temporary SQLite file")
+    parser.add_argument("--total", type=int, default=2000, help="inserts per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.odbc:
+        connect = odbc_factory(args.odbc)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench_group_commit.db")
+        connect = sqlite_factory(path)
+
+    print(f"{'concurrency':>11} {'per-request/s':>14} {'group/s':>10} {'avg batch':>10} {'speedup':>8}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        prepare(connect, bool(args.odbc))
+        single = bench_per_request(connect, concurrency, args.total)
+        prepare(connect, bool(args.odbc))
+        grouped, avg_batch = bench_group(connect, concurrency, args.total, args.max_batch, args.max_wait_ms)
+        print(f"{concurrency:>11} {single:>14.0f} {grouped:>10.0f} {avg_batch:>10.1f} {grouped / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Bytes on the wire for the standard list payloads under each transport encoding.
+
+    python bench_transport.py
+    python bench_transport.py --rows 1000
+
+Payloads are synthetic but shaped like /sar-requests (with Sentinel product
+metadata in satellite_data), /active-alerts, /deliveries, /medical-supplies and
+a /changes page. Each one is sent through TransportMiddleware with the given
+Accept / Accept-Encoding headers; "before" is the uncompressed JSON with
+satellite_data pretty-printed as format_json_column used to do it.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from transport import TransportMiddleware
+
+ENCODINGS = [
+    ("json", "application/json", ""),
+    ("json+gzip", "application/json", "gzip"),
+    ("json+br", "application/json", "br"),
+    ("msgpack", "application/msgpack", ""),
+    ("msgpack+gzip", "application/msgpack", "gzip"),
+    ("msgpack+br", "application/msgpack", "br"),
+    ("cbor", "application/cbor", ""),
+    ("cbor+br", "application/cbor", "br"),
+]
+
+
+def sentinel_products(rng, count):
+    products = {}
+    for _ in range(count):
+        lat, lon = rng.uniform(-60, 60), rng.uniform(-180, 180)
+        taken = datetime(2025, 1, 1) + timedelta(hours=rng.randint(0, 720))
+        title = f"S2B_MSIL1C_{taken:%Y%m%dT%H%M%S}_N0511_R{rng.randint(1, 143):03d}_T{rng.randint(10, 60)}ABC"
+        products[str(uuid.UUID(int=rng.getrandbits(128)))] = {
+            "title": title,
+            "link": f"https://scihub.copernicus.eu/dhus/odata/v1/Products('{uuid.UUID(int=rng.getrandbits(128))}')/$value",
+            "summary": f"Date: {taken:%Y-%m-%dT%H:%M:%S.000Z}, Instrument: MSI, Mode: , Satellite: Sentinel-2, Size: 785.43 MB",
+            "beginposition": taken.isoformat(),
+            "endposition": taken.isoformat(),
+            "ingestiondate": (taken + timedelta(hours=3)).isoformat(),
+            "orbitnumber": rng.randint(10000, 40000),
+            "relativeorbitnumber": rng.randint(1, 143),
+            "cloudcoverpercentage": round(rng.uniform(0, 30), 4),
+            "footprint": f"MULTIPOLYGON((({lon:.4f} {lat:.4f},{lon + 1:.4f} {lat:.4f},{lon + 1:.4f} {lat + 1:.4f},{lon:.4f} {lat + 1:.4f},{lon:.4f} {lat:.4f})))",
+            "format": "SAFE",
+            "instrumentshortname": "MSI",
+            "instrumentname": "Multi-Spectral Instrument",
+            "platformname": "Sentinel-2",
+            "platformidentifier": "2017-013A",
+            "processinglevel": "Level-1C",
+            "producttype": "S2MSI1C",
+            "size": "785.43 MB",
+            "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+        }
+    return products
+
+
+def payloads(rows, indent):
+    rng = random.Random(1)
+    now = datetime(2025, 6, 1)
+    sar = [{
+        "id": i,
+        "emergency_type": rng.choice(["Medical Emergency", "Natural Disaster", "Lost Person"]),
+        "location": f"{rng.uniform(-60, 60):.5f}, {rng.uniform(-180, 180):.5f}",
+        "urgency": rng.choice(["Low", "Medium", "High", "Critical"]),
+        "description": "Injured hiker, conscious, needs evacuation",
+        "contact_number": f"+30 69{rng.randint(10000000, 99999999)}",
+        "satellite_data": json.dumps(sentinel_products(rng, rng.randint(0, 4)), indent=indent,
+                                     separators=None if indent else (",", ":")),
+        "latitude": rng.uniform(-60, 60),
+        "longitude": rng.uniform(-180, 180),
+        "status": rng.choice(["open", "claimed", "resolved"]),
+        "claimed_by": None,
+        "created_at": (now - timedelta(minutes=i)).isoformat(),
+        "updated_at": (now - timedelta(minutes=i)).isoformat(),
+    } for i in range(rows)]
+    alerts = [{
+        "alert_id": i, "patient": f"patient{rng.randint(1, 200)}",
+        "status": rng.choice(["active", "resolved"]), "trigger_time": (now - timedelta(minutes=i)).isoformat(),
+    } for i in range(rows)]
+    deliveries = [{
+        "id": i, "destination": f"Clinic {rng.randint(1, 50)}", "item": rng.choice(["gloves", "masks", "insulin"]),
+        "quantity": rng.randint(1, 500), "vehicle": "drone", "delivery_time": "ASAP",
+        "latitude": rng.uniform(-60, 60), "longitude": rng.uniform(-180, 180), "status": "pending",
+        "assigned_vehicle_id": None, "route_order": None,
+    } for i in range(rows)]
+    supplies = [{"item": f"item-{i}", "quantity": rng.randint(0, 1000)} for i in range(min(rows, 200))]
+    changes = {"reset": False, "cursor": 123456, "has_more": False, "changes": [
+        {"entity": "alerts", "id": row["alert_id"], "op": "upsert", "version": 123000 + n, "row": row}
+        for n, row in enumerate(alerts[:50])
+    ]}
+    return {"/sar-requests": sar, "/active-alerts": alerts, "/deliveries": deliveries,
+            "/medical-supplies": supplies, "/changes": changes}
+
+
+def json_app(body):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+async def on_the_wire(body, accept, accept_encoding):
+    # Response header and body bytes as the middleware would send them
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [
+        (b"accept", accept.encode()), (b"accept-encoding", accept_encoding.encode())]}
+    await TransportMiddleware(json_app(body))(scope, receive, send)
+    headers = sum(len(name) + len(value) + 4 for name, value in sent[0]["headers"])
+    return headers + sum(len(message.get("body", b"")) for message in sent[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300, help="rows per list payload")
+    args = parser.parse_args()
+
+    before = {path: json.dumps(data).encode() for path, data in payloads(args.rows, indent=2).items()}
+    after = {path: json.dumps(data).encode() for path, data in payloads(args.rows, indent=None).items()}
+    print(f"{'payload':<19} {'encoding':<13} {'bytes':>10} {'vs before':>10} {'ms':>7}")
+    for path, body in after.items():
+        baseline = asyncio.run(on_the_wire(before[path], "application/json", ""))
+        print(f"{path:<19} {'before':<13} {baseline:>10} {1:>9.1f}x {'':>7}")
+        for name, accept, accept_encoding in ENCODINGS:
+            started = time.perf_counter()
+            size = asyncio.run(on_the_wire(body, accept, accept_encoding))
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{'':<19} {name:<13} {size:>10} {baseline / size:>9.1f}x {elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Requests per second against serve.py as the worker count grows.
+
+    python bench_workers.py
+    python bench_workers.py --workers 1 2 4 8 --seconds 10 --path /patients/directory?q=pat
+
+For each worker count a server is started with serve.py on a spare port and a
+shared SQLite store, then several client processes each keep --concurrency
+authenticated requests in flight for --seconds. The clients run on the same
+host, so throughput only keeps growing while workers and clients together have
+cores to spare.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+async def drive(url, path, token, concurrency, seconds):
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as client:
+        async def loop():
+            nonlocal done, errors
+            while time.monotonic() < deadline:
+                response = await client.get(path)
+                if response.status_code == 200:
+                    done += 1
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return done, errors
+
+
+def client_process(args):
+    return asyncio.run(drive(*args))
+
+
+def measure(url, path, username, password, clients, concurrency, seconds):
+    token = httpx.post(f"{url}/token", data={"username": username, "password": password}).json()["access_token"]
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client_process, [(url, path, token, concurrency, seconds)] * clients)
+    return sum(done for done, _ in results) / seconds, sum(errors for _, errors in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--path", default="/patients/directory?q=pat")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=max(2, (os.cpu_count() or 1) // 2), help="client processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight per client process")
+    parser.add_argument("--username", default="medic1")
+    parser.add_argument("--password", default="medicpass")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>10} {'errors':>7} {'speedup':>8}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        port = free_port()
+        store = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+        env = {**os.environ, "SHARED_STORE_URL": f"sqlite:///{store}", "ADMISSION_ENABLED": "0"}
+        server = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(url)
+            rate, errors = measure(url, args.path, args.username, args.password,
+                                   args.clients, args.concurrency, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(store + suffix):
+                    os.remove(store + suffix)
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>10.0f} {errors:>7} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import asyncio
+import collections
+import time
+
+
+class Subscriber:
+    # One connection's outbox. A subscriber that falls more than `limit`
+    # messages behind is closed rather than buffering without bound.
+
+    def __init__(self, limit=256):
+        self.limit = limit
+        self.closed = False
+        self._buffer = collections.deque()
+        self._ready = asyncio.Event()
+
+    def push(self, message):
+        if len(self._buffer) >= self.limit:
+            self.closed = True
+        else:
+            self._buffer.append(message)
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def next_batch(self):
+        # Everything queued since the last call, or None once closed
+        await self._ready.wait()
+        self._ready.clear()
+        if self.closed:
+            return None
+        batch = list(self._buffer)
+        self._buffer.clear()
+        return batch
+
+
+class ChatRoom:
+    __slots__ = ("room_id", "owner", "history", "seen", "subscribers", "last_active")
+
+    def __init__(self, room_id, history_size, owner=None):
+        self.room_id = room_id
+        # Username of whoever opened the session, None while it is not known
+        self.owner = owner
+        self.history = collections.deque(maxlen=history_size)
+        self.seen = set()
+        self.subscribers = set()
+        self.last_active = time.monotonic()
+
+
+class ChatHub:
+    # Rooms live in memory with a bounded ring of recent messages, so a join
+    # is answered without touching the database. Must only be used from the
+    # event loop thread. Messages are dicts with at least an "id".
+
+    def __init__(self, history_size=200, subscriber_limit=256):
+        self.history_size = history_size
+        self.subscriber_limit = subscriber_limit
+        self._rooms = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def __contains__(self, room_id):
+        return room_id in self._rooms
+
+    def room_ids(self):
+        return list(self._rooms)
+
+    def open(self, room_id, history=(), owner=None):
+        room = self._rooms.get(room_id)
+        if room is None:
+            room = self._rooms[room_id] = ChatRoom(room_id, self.history_size, owner)
+            for message in history:
+                self._append(room, message)
+        elif room.owner is None:
+            room.owner = owner
+        return room
+
+    def owner(self, room_id):
+        room = self._rooms.get(room_id)
+        return room.owner if room is not None else None
+
+    def _append(self, room, message):
+        if message["id"] in room.seen:
+            return False
+        if len(room.history) == room.history.maxlen:
+            room.seen.discard(room.history[0]["id"])
+        room.history.append(message)
+        room.seen.add(message["id"])
+        return True
+
+    def publish(self, room_id, message):
+        # Returns False for a message the room has already seen
+        room = self.open(room_id)
+        if not self._append(room, message):
+            return False
+        room.last_active = time.monotonic()
+        self.published += 1
+        for subscriber in list(room.subscribers):
+            subscriber.push(message)
+            if subscriber.closed:
+                room.subscribers.discard(subscriber)
+                self.dropped_subscribers += 1
+            else:
+                self.delivered += 1
+        return True
+
+    def subscribe(self, room_id):
+        room = self.open(room_id)
+        subscriber = Subscriber(self.subscriber_limit)
+        room.subscribers.add(subscriber)
+        room.last_active = time.monotonic()
+        return subscriber
+
+    def unsubscribe(self, room_id, subscriber):
+        subscriber.close()
+        room = self._rooms.get(room_id)
+        if room is not None:
+            room.subscribers.discard(subscriber)
+            room.last_active = time.monotonic()
+
+    def recent(self, room_id, limit=None):
+        room = self._rooms.get(room_id)
+        if room is None:
+            return []
+        history = list(room.history)
+        return history[-limit:] if limit else history
+
+    def evict_idle(self, idle_seconds):
+        # Drops rooms nobody is connected to that have been quiet for idle_seconds
+        cutoff = time.monotonic() - idle_seconds
+        idle = [
+            room_id for room_id, room in self._rooms.items()
+            if not room.subscribers and room.last_active < cutoff
+        ]
+        for room_id in idle:
+            del self._rooms[room_id]
+        return len(idle)
+
+    def stats(self):
+        return {
+            "rooms": len(self._rooms),
+            "subscribers": sum(len(room.subscribers) for room in self._rooms.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
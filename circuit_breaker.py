@@ -0,0 +1,106 @@
+import collections
+import threading
+import time
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # Closed: calls go through and their outcomes are kept for window_seconds.
+    # Once at least min_calls were seen and the failure share reaches
+    # failure_rate, the circuit opens and calls fail at once for open_seconds.
+    # It is then half-open: a single probe call is let through, and its outcome
+    # closes the circuit again or re-opens it.
+
+    def __init__(self, name, failure_rate=0.5, min_calls=5, window_seconds=30.0, open_seconds=10.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._outcomes = collections.deque()
+        self._failures = 0
+        self._state = "closed"
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def _open(self, now):
+        self._state = "open"
+        self._opened_at = now
+        self._probing = False
+        self.trips += 1
+
+    def before_call(self):
+        # Raises CircuitOpen if the call must not be attempted
+        with self._lock:
+            if self._state == "closed":
+                return
+            now = time.monotonic()
+            if self._state == "open":
+                remaining = self._opened_at + self.open_seconds - now
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, remaining)
+                self._state = "half_open"
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self.open_seconds)
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != "closed":
+                self._state = "closed"
+                self._probing = False
+                self._outcomes.clear()
+                self._failures = 0
+                return
+            now = time.monotonic()
+            self._prune(now)
+            self._outcomes.append((now, True))
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.last_error = str(error) if error is not None else None
+            now = time.monotonic()
+            if self._state != "closed":
+                self._open(now)
+                return
+            self._prune(now)
+            self._outcomes.append((now, False))
+            self._failures += 1
+            if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_rate:
+                self._outcomes.clear()
+                self._failures = 0
+                self._open(now)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            state = self._state
+            if state == "open" and now >= self._opened_at + self.open_seconds:
+                state = "half_open"
+            return {
+                "state": state,
+                "recent_calls": len(self._outcomes),
+                "recent_failure_rate": round(self._failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+                "retry_after_seconds": round(max(self._opened_at + self.open_seconds - now, 0.0), 3) if state == "open" else None,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,140 @@
+import datetime
+import decimal
+import io
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# DB-API type_code (a Python type for pyodbc) -> Arrow type
+ARROW_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+    datetime.time: pa.time64("us"),
+    uuid.UUID: pa.string(),
+}
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def arrow_type(column):
+    # column is a cursor.description entry; None when the driver does not say (SQLite)
+    type_code = column[1]
+    if type_code is decimal.Decimal:
+        precision, scale = column[4], column[5]
+        if precision and 0 < precision <= 38:
+            return pa.decimal128(precision, scale or 0)
+        return pa.float64()
+    return ARROW_TYPES.get(type_code)
+
+
+def arrow_schema(description, rows):
+    # Types come from the driver where it reports them, otherwise from the first
+    # batch; a column that is all NULL there becomes a string column
+    fields = []
+    for i, column in enumerate(description):
+        field_type = arrow_type(column)
+        if field_type is None:
+            inferred = pa.array([row[i] for row in rows]).type if rows else pa.null()
+            field_type = pa.string() if pa.types.is_null(inferred) else inferred
+        fields.append(pa.field(column[0], field_type))
+    return pa.schema(fields)
+
+
+def record_batch(rows, schema):
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for field, values in zip(schema, columns):
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if field.type != pa.string():
+                raise
+            # SQLite does not enforce column types
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def cursor_batches(cursor, batch_rows):
+    # (schema, generator of RecordBatches) for an executed cursor, fetching batch_rows at a time
+    rows = cursor.fetchmany(batch_rows)
+    schema = arrow_schema(cursor.description, rows)
+
+    def batches():
+        current = rows
+        while current:
+            yield record_batch(current, schema)
+            if len(current) < batch_rows:
+                return
+            current = cursor.fetchmany(batch_rows)
+
+    return schema, batches()
+
+
+def frame_batches(frames, schema, batch_rows):
+    # Conforms pandas DataFrames (e.g. archived rows) to schema, batch_rows at a time
+    for df in frames:
+        table = pa.Table.from_pandas(df[schema.names], preserve_index=False).cast(schema, safe=False)
+        yield from table.to_batches(max_chunksize=batch_rows)
+
+
+def drop_keys(batches, key, seen):
+    # Leaves out rows whose key is in one of the seen arrays. seen may still be
+    # filled by a generator chained in front, so it is read at the first batch.
+    value_set = None
+    for batch in batches:
+        column = batch.column(key)
+        if value_set is None:
+            value_set = pa.concat_arrays([pa.array(keys).cast(column.type) for keys in seen]) if seen else None
+        if value_set is not None and len(value_set):
+            batch = batch.filter(pc.invert(pc.is_in(column, value_set=value_set)))
+        if batch.num_rows:
+            yield batch
+
+
+class _Sink(io.RawIOBase):
+    # File object that hands back whatever was written since the last take()
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream(schema, batches, fmt, compression="zstd"):
+    # Yields the encoded file piece by piece: one Arrow IPC message or one
+    # Parquet row group per record batch, so memory stays at one batch
+    sink = _Sink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression=compression)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,70 @@
+"""Deployment settings.
+
+Values come from the environment. TELEMED_CONFIG_FILE may name a file of
+KEY=value lines (the .env format) that fills in whatever the environment does
+not set, so every os.getenv() setting in the app can live there too. Secrets
+can also be read from a file by setting NAME_FILE instead of NAME (e.g.
+SECRET_KEY_FILE=/run/secrets/jwt_key).
+"""
+import os
+
+DEFAULT_SECRET_KEY = "your-secret-key-here"
+
+
+def load_env_file(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            os.environ.setdefault(key.strip(), value)
+
+
+def secret(name, default=None):
+    path = os.getenv(f"{name}_FILE")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    return os.getenv(name, default)
+
+
+if os.getenv("TELEMED_CONFIG_FILE"):
+    load_env_file(os.environ["TELEMED_CONFIG_FILE"])
+
+# APP_ENV=production refuses to start with the built-in JWT secret
+APP_ENV = os.getenv("APP_ENV", "development")
+
+DB_CONNECTION_STRING = secret("DB_CONNECTION_STRING", (
+    "DRIVER={ODBC Driver 17 for SQL Server};"
+    "SERVER=DESKTOP-4F2MQM0\\SQLEXPRESS;"
+    "DATABASE=Telemedicine;"
+    "Trusted_Connection=yes;"
+))
+# ODBC driver manager connection pooling, and the threads each worker runs sync
+# endpoints on (which also caps its concurrent database connections)
+DB_POOLING = os.getenv("DB_POOLING", "1") == "1"
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+SECRET_KEY = secret("SECRET_KEY", DEFAULT_SECRET_KEY)
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# Rate limits, revoked tokens and background-task leases: memory:// for a single
+# process, sqlite:///path for several workers on one node, redis://host:port/db across nodes
+SHARED_STORE_URL = os.getenv("SHARED_STORE_URL", "memory://")
+# Redis socket timeout; when the store fails, each worker falls back to its own state
+SHARED_STORE_TIMEOUT_SECONDS = float(os.getenv("SHARED_STORE_TIMEOUT_SECONDS", "0.5"))
+
+# serve.py: worker processes and bind address. Without WEB_CONCURRENCY: one per core
+# when SHARED_STORE_URL is shared between processes, otherwise a single worker
+SHARED_STORE_IS_LOCAL = SHARED_STORE_URL in ("", "memory://")
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "0")) or (1 if SHARED_STORE_IS_LOCAL else os.cpu_count() or 1)
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+if APP_ENV == "production" and SECRET_KEY == DEFAULT_SECRET_KEY:
+    raise RuntimeError("Set SECRET_KEY (or SECRET_KEY_FILE) when APP_ENV=production")
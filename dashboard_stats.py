@@ -0,0 +1,148 @@
+import collections
+import threading
+from datetime import datetime
+
+from supply_ledger import apply_movement
+
+GROUPS = ("alerts", "sar", "deliveries")
+
+
+def urgency_label(urgency):
+    # Urgency is free text on the row; "high" and "High" count together
+    return (urgency or "Unknown").strip().title()
+
+
+class DashboardStats:
+    # Aggregate counts for /stats, kept up to date in O(1) per write.
+    # Keys: alerts -> status, sar -> (status, urgency), deliveries -> (vehicle, status);
+    # supplies are tracked as stock per item with the set of items at or below
+    # low_stock_quantity. Write handlers apply deltas after they commit; reconcile
+    # replaces everything with exact GROUP BY counts, which also brings in writes
+    # made through other workers, replayed from the spool or deleted in bulk.
+
+    def __init__(self, low_stock_quantity=10):
+        self.low_stock_quantity = low_stock_quantity
+        self._counts = {group: collections.Counter() for group in GROUPS}
+        self._stock = {}
+        self._low = set()
+        self._lock = threading.Lock()
+        # Deltas applied while a reconcile query runs, replayed on top of its result
+        self._journal = None
+        self._dirty = threading.Event()
+        self.reconciled_at = None
+        self.drift = {}
+
+    def add(self, group, key, delta=1):
+        with self._lock:
+            self._add(group, key, delta)
+            if self._journal is not None:
+                self._journal.append(("add", group, key, delta))
+
+    def move(self, group, old_key, new_key):
+        # A row changed status (or urgency): one count moves between keys
+        if old_key == new_key:
+            return
+        with self._lock:
+            self._add(group, old_key, -1)
+            self._add(group, new_key, 1)
+            if self._journal is not None:
+                self._journal.extend([("add", group, old_key, -1), ("add", group, new_key, 1)])
+
+    def apply_movement(self, item, kind, quantity):
+        with self._lock:
+            self._set_stock(item, apply_movement(self._stock.get(item, 0), kind, quantity))
+            if self._journal is not None:
+                self._journal.append(("movement", item, kind, quantity))
+
+    def _add(self, group, key, delta):
+        counts = self._counts[group]
+        counts[key] += delta
+        if counts[key] <= 0:
+            del counts[key]
+
+    def _set_stock(self, item, quantity):
+        if quantity <= 0:
+            # Written off or used up: the item no longer counts as stocked
+            self._stock.pop(item, None)
+            self._low.discard(item)
+            return
+        self._stock[item] = quantity
+        if quantity <= self.low_stock_quantity:
+            self._low.add(item)
+        else:
+            self._low.discard(item)
+
+    def invalidate(self):
+        # For changes whose effect on the counts is not known to the caller
+        self._dirty.set()
+
+    def needs_reconcile(self):
+        return self._dirty.is_set()
+
+    def begin_reconcile(self):
+        with self._lock:
+            self._dirty.clear()
+            self._journal = []
+
+    def finish_reconcile(self, counts, stock):
+        # counts: {group: {key: n}} and stock {item: quantity} as read from the database
+        with self._lock:
+            previous = self._counts
+            self._counts = {group: collections.Counter() for group in GROUPS}
+            for group in GROUPS:
+                for key, n in counts.get(group, {}).items():
+                    self._add(group, key, n)
+            self._stock, self._low = {}, set()
+            for item, quantity in stock.items():
+                self._set_stock(item, quantity)
+            for entry in self._journal or []:
+                if entry[0] == "add":
+                    self._add(*entry[1:])
+                else:
+                    _, item, kind, quantity = entry
+                    self._set_stock(item, apply_movement(self._stock.get(item, 0), kind, quantity))
+            self._journal = None
+            # How far the incremental counts had drifted from the table
+            self.drift = {
+                group: sum(((previous[group] - self._counts[group]) + (self._counts[group] - previous[group])).values())
+                for group in GROUPS
+            }
+            self.reconciled_at = datetime.now()
+
+    def abort_reconcile(self):
+        with self._lock:
+            self._journal = None
+
+    def snapshot(self):
+        # Cost depends on the number of distinct statuses, urgencies, vehicles and low
+        # items, never on the number of rows
+        with self._lock:
+            alerts = dict(self._counts["alerts"])
+            sar = dict(self._counts["sar"])
+            deliveries = dict(self._counts["deliveries"])
+            low = sorted(self._low)
+            stocked = len(self._stock)
+        sar_by_status = collections.Counter()
+        open_by_urgency = collections.Counter()
+        for (case_status, urgency), n in sar.items():
+            sar_by_status[case_status] += n
+            if case_status == "open":
+                open_by_urgency[urgency] += n
+        by_vehicle = collections.Counter()
+        by_status = collections.Counter()
+        for (vehicle, delivery_status), n in deliveries.items():
+            by_vehicle[vehicle] += n
+            by_status[delivery_status] += n
+        return {
+            "alerts": {"active": alerts.get("active", 0), "by_status": alerts},
+            "sar": {"open_by_urgency": dict(open_by_urgency), "by_status": dict(sar_by_status)},
+            "deliveries": {"by_vehicle": dict(by_vehicle), "by_status": dict(by_status)},
+            "supplies": {
+                "items": stocked,
+                "low_stock_quantity": self.low_stock_quantity,
+                "low_stock_count": len(low),
+                "low_stock": low,
+            },
+            "reconciled_at": self.reconciled_at,
+            "drift": dict(self.drift),
+        }
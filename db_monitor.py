@@ -0,0 +1,291 @@
+import collections
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\]])-?\d+(?:\.\d+)?(?![\w\[])")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    # Literals become placeholders so that f-string queries such as
+    # "SELECT TOP 500 * FROM [Alerts]" and "... TOP 1000 ..." share a fingerprint.
+    normalized = _COMMENT_RE.sub(" ", sql)
+    normalized = _STRING_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("(?+)", normalized)
+    normalized = _SPACE_RE.sub(" ", normalized).strip().rstrip(";")
+    digest = hashlib.sha1(normalized.lower().encode()).hexdigest()[:12]
+    return digest, normalized
+
+
+def redact_params(params):
+    if params is None:
+        return []
+    if not isinstance(params, (list, tuple)):
+        params = [params]
+    redacted = []
+    for value in params:
+        if value is None:
+            redacted.append(None)
+        elif isinstance(value, (str, bytes)):
+            redacted.append(f"<{type(value).__name__}:{len(value)}>")
+        else:
+            redacted.append(f"<{type(value).__name__}>")
+    return redacted
+
+
+class QueryStats:
+    __slots__ = ("fingerprint", "statement", "calls", "errors", "rows", "total_ms", "max_ms", "slow_calls", "last_seen")
+
+    def __init__(self, fingerprint_id, statement):
+        self.fingerprint = fingerprint_id
+        self.statement = statement
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow_calls = 0
+        self.last_seen = None
+
+    def as_dict(self):
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "slow_calls": self.slow_calls,
+            "last_seen": self.last_seen,
+        }
+
+
+class QueryMonitor:
+    # Plans are captured by one background thread from a queue of at most
+    # plan_queue_size statements, and at most once per fingerprint every
+    # plan_interval seconds, so a slow database is not handed extra work and
+    # connections in proportion to how slow it is.
+
+    def __init__(self, slow_ms=200.0, slow_log_size=200, plan_connection_factory=None, dialect="mssql",
+                 plan_interval=300.0, plan_queue_size=8):
+        self.slow_ms = slow_ms
+        self.plan_connection_factory = plan_connection_factory
+        self.dialect = dialect
+        self.plan_interval = plan_interval
+        self._stats = {}
+        self._slow_log = collections.deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self._plans = {}
+        self._plan_queue = queue.Queue(maxsize=plan_queue_size)
+        self._plan_thread = None
+        self.plans_skipped = 0
+
+    def record(self, sql, params, elapsed_ms, rows, error=None):
+        fingerprint_id, statement = fingerprint(sql)
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            stats = self._stats.get(fingerprint_id)
+            if stats is None:
+                stats = self._stats[fingerprint_id] = QueryStats(fingerprint_id, statement)
+            stats.calls += 1
+            stats.rows += max(rows or 0, 0)
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.last_seen = datetime.utcnow().isoformat()
+            if error is not None:
+                stats.errors += 1
+            if slow:
+                stats.slow_calls += 1
+        if slow:
+            entry = {
+                "fingerprint": fingerprint_id,
+                "statement": statement,
+                "params": redact_params(params),
+                "elapsed_ms": round(elapsed_ms, 3),
+                "rows": rows,
+                "error": str(error) if error is not None else None,
+                "at": datetime.utcnow().isoformat(),
+                "plan": None,
+            }
+            with self._lock:
+                self._slow_log.append(entry)
+            logging.warning(
+                f"Slow query {fingerprint_id} took {elapsed_ms:.1f} ms "
+                f"(rows={rows}, params={entry['params']}): {statement}"
+            )
+            if self.plan_connection_factory is not None and error is None:
+                self._queue_plan(entry, sql, params)
+
+    def _queue_plan(self, entry, sql, params):
+        now = time.monotonic()
+        with self._lock:
+            captured = self._plans.get(entry["fingerprint"])
+            if captured is not None and now - captured[0] < self.plan_interval:
+                # Recently captured (or queued): reuse that plan rather than asking again
+                entry["plan"] = captured[1]
+                return
+            self._plans[entry["fingerprint"]] = (now, None)
+            if self._plan_thread is None:
+                self._plan_thread = threading.Thread(target=self._plan_worker, name="query-plan-capture", daemon=True)
+                self._plan_thread.start()
+        try:
+            self._plan_queue.put_nowait((entry, sql, params))
+        except queue.Full:
+            with self._lock:
+                self.plans_skipped += 1
+                self._plans.pop(entry["fingerprint"], None)
+
+    def _plan_worker(self):
+        while True:
+            entry, sql, params = self._plan_queue.get()
+            self._capture_plan(entry, sql, params)
+            with self._lock:
+                captured = self._plans.get(entry["fingerprint"])
+                if captured is not None:
+                    self._plans[entry["fingerprint"]] = (captured[0], entry["plan"])
+
+    def _capture_plan(self, entry, sql, params):
+        # Plans are captured on a separate connection so the request's own
+        # connection (and any open result set on it) is left untouched.
+        conn = None
+        try:
+            conn = self.plan_connection_factory()
+            if conn is None:
+                return
+            cursor = conn.cursor()
+            args = (params,) if params is not None else ()
+            if self.dialect == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", *args)
+                entry["plan"] = "\n".join(str(row[-1]) for row in cursor.fetchall())
+            elif self.dialect == "mssql":
+                # With SHOWPLAN_XML on, SQL Server returns the estimated plan without running the statement
+                cursor.execute("SET SHOWPLAN_XML ON")
+                try:
+                    cursor.execute(sql, *args)
+                    row = cursor.fetchone()
+                    entry["plan"] = row[0] if row else None
+                finally:
+                    cursor.execute("SET SHOWPLAN_XML OFF")
+        except Exception as e:
+            logging.error(f"Error capturing plan for {entry['fingerprint']}: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def top(self, order_by="total_ms", limit=20):
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._stats.values()]
+        rows.sort(key=lambda row: row.get(order_by) or 0, reverse=True)
+        return rows[:limit]
+
+    def slow_log(self, limit=50):
+        with self._lock:
+            return list(self._slow_log)[-limit:][::-1]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow_log.clear()
+            self._plans.clear()
+
+
+class MonitoredCursor:
+    # Times execute() plus the fetches that follow it, so SELECTs are charged for
+    # the rows they actually return; the sample is recorded once the result is consumed.
+
+    def __init__(self, cursor, monitor):
+        self._cursor = cursor
+        self._monitor = monitor
+        self._pending = None
+
+    def _flush(self):
+        if self._pending is not None:
+            sql, params, elapsed_ms, rows = self._pending
+            self._pending = None
+            self._monitor.record(sql, params, elapsed_ms, rows)
+
+    def execute(self, sql, *params):
+        self._flush()
+        args = params[0] if len(params) == 1 else (list(params) if params else None)
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        except Exception as e:
+            self._monitor.record(sql, args, (time.perf_counter() - started) * 1000, 0, error=e)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if self._cursor.description is None:
+            self._monitor.record(sql, args, elapsed_ms, getattr(self._cursor, "rowcount", -1))
+        else:
+            self._pending = (sql, args, elapsed_ms, 0)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._flush()
+        seq_of_params = list(seq_of_params)
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        except Exception as e:
+            self._monitor.record(sql, None, (time.perf_counter() - started) * 1000, 0, error=e)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._monitor.record(sql, seq_of_params[0] if seq_of_params else None, elapsed_ms, len(seq_of_params))
+        return self
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        if self._pending is not None:
+            sql, params, elapsed_ms, rows = self._pending
+            fetched = (1 if result is not None else 0) if method == "fetchone" else len(result)
+            self._pending = (sql, params, elapsed_ms + (time.perf_counter() - started) * 1000, rows + fetched)
+            if method == "fetchall" or not fetched:
+                self._flush()
+        return result
+
+    def fetchone(self):
+        return self._fetch("fetchone")
+
+    def fetchmany(self, *args):
+        return self._fetch("fetchmany", *args)
+
+    def fetchall(self):
+        return self._fetch("fetchall")
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class MonitoredConnection:
+    def __init__(self, conn, monitor, dialect="mssql"):
+        self._conn = conn
+        self._monitor = monitor
+        self.dialect = dialect
+
+    def cursor(self):
+        return MonitoredCursor(self._conn.cursor(), self._monitor)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
@@ -0,0 +1,63 @@
+import bisect
+import threading
+
+
+class PrefixIndex:
+    # Sorted (term, value) pairs searched with bisect: a prefix lookup is
+    # O(log n + page size). A value can be indexed under several terms
+    # (username, first name, last name), and results are de-duplicated.
+
+    def __init__(self):
+        self._entries = []
+        self._terms = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, value):
+        return value in self._terms
+
+    def add(self, value, terms):
+        terms = sorted({term.strip().lower() for term in terms if term and term.strip()})
+        with self._lock:
+            self._remove(value)
+            for term in terms:
+                bisect.insort(self._entries, (term, value))
+            self._terms[value] = terms
+
+    def _remove(self, value):
+        for term in self._terms.pop(value, ()):
+            i = bisect.bisect_left(self._entries, (term, value))
+            if i < len(self._entries) and self._entries[i] == (term, value):
+                del self._entries[i]
+
+    def remove(self, value):
+        with self._lock:
+            self._remove(value)
+
+    def search(self, prefix, offset=0, limit=20):
+        # Returns (values, has_more)
+        prefix = (prefix or "").strip().lower()
+        seen = set()
+        results = []
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries):
+                term, value = self._entries[i]
+                if not term.startswith(prefix):
+                    break
+                i += 1
+                if value in seen:
+                    continue
+                seen.add(value)
+                if len(seen) > offset:
+                    if len(results) == limit:
+                        return results, True
+                    results.append(value)
+        return results, False
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._terms = {}
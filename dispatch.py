@@ -0,0 +1,146 @@
+import numpy as np
+
+from spatial import EARTH_RADIUS_KM
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    # Great-circle distances in km between every point in set 1 (rows) and set 2 (columns)
+    lat1 = np.radians(np.asarray(lat1, dtype=float))[:, None]
+    lon1 = np.radians(np.asarray(lon1, dtype=float))[:, None]
+    lat2 = np.radians(np.asarray(lat2, dtype=float))[None, :]
+    lon2 = np.radians(np.asarray(lon2, dtype=float))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def type_feasibility(vehicle_types, requested_types):
+    # A delivery can go on any vehicle when it does not ask for a specific type
+    vehicle_types = np.array([(t or "").strip().lower() for t in vehicle_types], dtype=object)
+    requested = np.array([(t or "").strip().lower() for t in requested_types], dtype=object)
+    unrestricted = np.isin(requested, ["", "any"])
+    return (vehicle_types[:, None] == requested[None, :]) | unrestricted[None, :]
+
+
+def assign(distance, feasible, capacity, quantity):
+    # Capacitated nearest-vehicle assignment done in vectorised rounds: every open
+    # delivery bids for its nearest feasible vehicle that still has room, and each
+    # vehicle accepts its bidders nearest-first up to its remaining capacity.
+    # Rejected bidders retry next round against the updated capacities.
+    # Returns the vehicle index per delivery (-1 when it cannot be served).
+    n_deliveries = distance.shape[1]
+    remaining = np.asarray(capacity, dtype=float).copy()
+    quantity = np.asarray(quantity, dtype=float)
+    cost = np.where(feasible, distance, np.inf)
+    assigned = np.full(n_deliveries, -1, dtype=np.int64)
+    while True:
+        open_idx = np.flatnonzero(assigned == -1)
+        if open_idx.size == 0:
+            break
+        fits = remaining[:, None] >= quantity[None, open_idx]
+        bids = np.where(fits, cost[:, open_idx], np.inf)
+        best_vehicle = bids.argmin(axis=0)
+        best_cost = bids[best_vehicle, np.arange(open_idx.size)]
+        valid = np.isfinite(best_cost)
+        if not valid.any():
+            break
+        bidders = open_idx[valid]
+        vehicles = best_vehicle[valid]
+        order = np.lexsort((best_cost[valid], vehicles))
+        bidders, vehicles = bidders[order], vehicles[order]
+        loads = quantity[bidders]
+        cumulative = np.cumsum(loads)
+        group_start = np.r_[True, vehicles[1:] != vehicles[:-1]]
+        group_base = np.maximum.accumulate(np.where(group_start, cumulative - loads, 0.0))
+        accept = (cumulative - group_base) <= remaining[vehicles]
+        assigned[bidders[accept]] = vehicles[accept]
+        np.subtract.at(remaining, vehicles[accept], loads[accept])
+    return assigned
+
+
+def order_route(start_lat, start_lon, stop_lats, stop_lons, max_passes=10):
+    # Nearest-neighbour tour from the vehicle's position, improved with 2-opt.
+    # Each 2-opt step evaluates all candidate reversals for one edge at once.
+    n = len(stop_lats)
+    if n <= 1:
+        return list(range(n))
+    lats = np.r_[start_lat, stop_lats]
+    lons = np.r_[start_lon, stop_lons]
+    dist = haversine_matrix(lats, lons, lats, lons)
+    visited = np.zeros(n + 1, dtype=bool)
+    visited[0] = True
+    tour = [0]
+    for _ in range(n):
+        row = np.where(visited, np.inf, dist[tour[-1]])
+        nxt = int(row.argmin())
+        visited[nxt] = True
+        tour.append(nxt)
+    tour = np.array(tour)
+    # Open path (no return to start): reversing tour[i:j+1] replaces edges
+    # (i-1, i) and (j, j+1) with (i-1, j) and (i, j+1); the last edge may be absent.
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n):
+            a, b = tour[i - 1], tour[i]
+            js = np.arange(i + 1, n + 1)
+            c = tour[js]
+            d_next = np.r_[tour[js[:-1] + 1], -1]
+            old = dist[a, b] + np.where(d_next >= 0, dist[c, np.maximum(d_next, 0)], 0.0)
+            new = dist[a, c] + np.where(d_next >= 0, dist[b, np.maximum(d_next, 0)], 0.0)
+            delta = new - old
+            k = int(delta.argmin())
+            if delta[k] < -1e-9:
+                j = js[k]
+                tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return [int(stop) - 1 for stop in tour[1:]]
+
+
+def route_length_km(start_lat, start_lon, stop_lats, stop_lons):
+    lats = np.r_[start_lat, stop_lats]
+    lons = np.r_[start_lon, stop_lons]
+    if len(lats) < 2:
+        return 0.0
+    legs = haversine_matrix(lats[:-1], lons[:-1], lats[1:], lons[1:]).diagonal()
+    return float(legs.sum())
+
+
+def plan_deliveries(vehicles, deliveries):
+    # vehicles: dicts with id, vehicle_type, capacity, latitude, longitude
+    # deliveries: dicts with id, vehicle (requested type), quantity, latitude, longitude
+    if not vehicles or not deliveries:
+        return {"routes": [], "unassigned": [d["id"] for d in deliveries]}
+    v_lat = np.array([v["latitude"] for v in vehicles], dtype=float)
+    v_lon = np.array([v["longitude"] for v in vehicles], dtype=float)
+    d_lat = np.array([d["latitude"] for d in deliveries], dtype=float)
+    d_lon = np.array([d["longitude"] for d in deliveries], dtype=float)
+    distance = haversine_matrix(v_lat, v_lon, d_lat, d_lon)
+    feasible = type_feasibility([v["vehicle_type"] for v in vehicles], [d.get("vehicle") for d in deliveries])
+    assigned = assign(
+        distance,
+        feasible,
+        [v["capacity"] for v in vehicles],
+        [d["quantity"] for d in deliveries],
+    )
+    routes = []
+    order = np.argsort(assigned, kind="stable")
+    sorted_vehicles = assigned[order]
+    boundaries = np.flatnonzero(np.r_[True, sorted_vehicles[1:] != sorted_vehicles[:-1], True])
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        vehicle_idx = int(sorted_vehicles[start])
+        if vehicle_idx < 0:
+            continue
+        stops = order[start:end]
+        sequence = stops[order_route(v_lat[vehicle_idx], v_lon[vehicle_idx], d_lat[stops], d_lon[stops])]
+        vehicle = vehicles[vehicle_idx]
+        routes.append({
+            "vehicle_id": vehicle["id"],
+            "vehicle_type": vehicle["vehicle_type"],
+            "capacity": vehicle["capacity"],
+            "load": int(sum(deliveries[i]["quantity"] for i in sequence)),
+            "distance_km": round(route_length_km(v_lat[vehicle_idx], v_lon[vehicle_idx], d_lat[sequence], d_lon[sequence]), 3),
+            "stops": [deliveries[i]["id"] for i in sequence],
+        })
+    unassigned = [deliveries[i]["id"] for i in np.flatnonzero(assigned < 0)]
+    return {"routes": routes, "unassigned": unassigned}
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+
+def consumption_rates(movements, items, now, window_days=28, half_life_days=7.0, first_seen=None):
+    # Exponentially weighted daily consumption per item over the last
+    # window_days, as one (items x days) matrix product. movements has item,
+    # quantity and created_at columns (consume movements only); items with no
+    # consumption get 0. Days before an item's first_seen date (its first ledger
+    # movement) are left out so a new item is not diluted by days it did not
+    # exist. Returns (rate, std) arrays aligned with items.
+    index = pd.Index(items, name="item")
+    day0 = (pd.Timestamp(now).normalize() - pd.Timedelta(days=window_days - 1)).to_datetime64()
+    daily = np.zeros((len(index), window_days))
+    if len(movements):
+        days = ((movements["created_at"].to_numpy(dtype="datetime64[ns]") - day0) // np.timedelta64(1, "D")).astype(int)
+        rows = index.get_indexer(movements["item"])
+        keep = (days >= 0) & (days < window_days) & (rows >= 0)
+        np.add.at(daily, (rows[keep], days[keep]), movements["quantity"].to_numpy(dtype=float)[keep])
+    ages = np.arange(window_days - 1, -1, -1)
+    weights = np.tile(0.5 ** (ages / half_life_days), (len(index), 1))
+    if first_seen:
+        start = pd.to_datetime(pd.Series([first_seen.get(item) for item in index], dtype=object))
+        start_day = ((start.to_numpy(dtype="datetime64[ns]") - day0) // np.timedelta64(1, "D")).astype(float)
+        start_day = np.nan_to_num(start_day, nan=0.0).clip(0, window_days - 1)
+        weights[np.arange(window_days)[None, :] < start_day[:, None]] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    rate = (daily * weights).sum(axis=1)
+    std = np.sqrt((((daily - rate[:, None]) ** 2) * weights).sum(axis=1))
+    return rate, std
+
+
+def forecast(stock, movements, now, window_days=28, half_life_days=7.0, reorder_days=7.0, target_days=30.0,
+             safety_factor=1.0, first_seen=None):
+    # stock: {item: quantity}. Days of cover is stock over the daily rate; an
+    # item is flagged when that falls below reorder_days, and the proposed
+    # order tops it up to target_days of (rate + safety_factor * std).
+    items = sorted(set(stock) | set(movements["item"].unique() if len(movements) else ()))
+    quantity = np.array([stock.get(item, 0) for item in items], dtype=float)
+    rate, std = consumption_rates(movements, items, now, window_days, half_life_days, first_seen)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(rate > 0, quantity / rate, np.inf)
+    demand = rate + safety_factor * std
+    reorder = np.ceil(np.maximum(demand * target_days - quantity, 0)).astype(int)
+    low = (cover < reorder_days) & (reorder > 0)
+    finite = np.isfinite(cover)
+    runs_out = pd.Timestamp(now) + pd.to_timedelta(np.where(finite, cover, np.nan), unit="D")
+    return pd.DataFrame({
+        "item": items,
+        "quantity": quantity.astype(int),
+        "daily_rate": rate.round(3),
+        "daily_std": std.round(3),
+        "days_of_cover": np.where(finite, cover.round(1), np.nan),
+        "runs_out_on": runs_out.strftime("%Y-%m-%d"),
+        "low_stock": low,
+        "reorder_quantity": np.where(low, reorder, 0),
+    })
@@ -0,0 +1,170 @@
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from admission import TokenBucket
+
+PRIORITY_SAR = 0
+PRIORITY_DELIVERY = 1
+PRIORITY_UI = 2
+
+
+class GeocodingBusy(Exception):
+    pass
+
+
+class GeocodingWorker:
+    # The only caller of the upstream geocoder. Lookups are queued by priority
+    # (SAR first) and sent one at a time through a token bucket, so the quota is
+    # respected however many requests arrive at once. Identical lookups that are
+    # queued or in flight share one future, and answers are cached for cache_ttl.
+    # At most max_queue lookups wait: when full, a new lookup displaces the least
+    # urgent queued one if it is more urgent, and is refused with GeocodingBusy
+    # otherwise.
+
+    def __init__(self, fetch, rate=1.0, burst=1, cache_size=4096, cache_ttl=86400.0, take=None, max_queue=1000):
+        # fetch(kind, query) does the upstream call; kind is "search" or "reverse".
+        # take() may replace the local token bucket, e.g. to share the quota between workers
+        self.fetch = fetch
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._take = take or TokenBucket(rate, burst).take
+        self._queue = []
+        self._seq = itertools.count()
+        self._pending = {}
+        self._priorities = {}
+        self._in_flight = None
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._thread = None
+        self.requests = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.upstream_calls = 0
+        self.errors = 0
+        self.shed = 0
+
+    def submit(self, kind, query, priority=PRIORITY_UI):
+        key = (kind, query)
+        with self._lock:
+            self.requests += 1
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                future = Future()
+                future.set_result(cached[1])
+                return future
+            future = self._pending.get(key)
+            if future is not None:
+                self.coalesced += 1
+                if priority < self._priorities[key]:
+                    # Re-queue at the higher priority; the stale entry is skipped
+                    self._priorities[key] = priority
+                    heapq.heappush(self._queue, (priority, next(self._seq), key))
+                    self._ready.notify()
+                return future
+            if len(self._pending) >= self.max_queue and not self._make_room(priority):
+                self.shed += 1
+                future = Future()
+                future.set_exception(GeocodingBusy("Geocoding queue is full"))
+                return future
+            future = self._pending[key] = Future()
+            self._priorities[key] = priority
+            heapq.heappush(self._queue, (priority, next(self._seq), key))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="geocoding-worker", daemon=True)
+                self._thread.start()
+            self._ready.notify()
+        return future
+
+    def _make_room(self, priority):
+        # Drops the least urgent, most recently queued lookup if it is less urgent
+        # than the new one. Called with the lock held.
+        waiting = [(p, key) for key, p in reversed(self._priorities.items()) if key != self._in_flight]
+        if not waiting:
+            return False
+        worst_priority, worst_key = max(waiting, key=lambda entry: entry[0])
+        if worst_priority <= priority:
+            return False
+        del self._priorities[worst_key]
+        self._pending.pop(worst_key).set_exception(GeocodingBusy("Displaced by a more urgent lookup"))
+        self.shed += 1
+        return True
+
+    def search(self, name, priority=PRIORITY_UI):
+        # Future of (lat, lon), or (None, None) if not found
+        return self.submit("search", " ".join(name.split()).lower(), priority)
+
+    def geocode(self, name, priority=PRIORITY_UI, timeout=None):
+        return self.search(name, priority).result(timeout)
+
+    def reverse(self, lat, lon, priority=PRIORITY_UI, timeout=None):
+        return self.submit("reverse", (round(lat, 6), round(lon, 6)), priority).result(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "upstream_calls": self.upstream_calls,
+                "errors": self.errors,
+                "shed": self.shed,
+                "queued": len(self._pending),
+                "cached": len(self._cache),
+            }
+
+    def _next(self):
+        # Waits for work, then for a token, and only then picks the most urgent
+        # lookup, so a SAR lookup queued during the wait still goes first
+        with self._lock:
+            while not self._pending:
+                self._ready.wait()
+        wait = self._take()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._take()
+        with self._lock:
+            while self._queue:
+                priority, _, key = heapq.heappop(self._queue)
+                if key in self._pending and self._priorities[key] == priority:
+                    self._in_flight = key
+                    return key
+        return None
+
+    def _run(self):
+        # Only the worker thread touches the bucket
+        while True:
+            key = self._next()
+            if key is None:
+                continue
+            with self._lock:
+                self.upstream_calls += 1
+            try:
+                result = self.fetch(*key)
+                error = None
+            except Exception as e:
+                logging.error(f"Geocoding {key[0]} for {key[1]!r} failed: {e}")
+                result, error = None, e
+            with self._lock:
+                future = self._pending.pop(key)
+                del self._priorities[key]
+                self._in_flight = None
+                if error is None:
+                    self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                else:
+                    self.errors += 1
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
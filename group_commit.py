@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DatabaseUnavailable(RuntimeError):
+    pass
+
+
+class GroupCommitWriter:
+    # Collects writes from concurrent requests and commits them together: a group
+    # grows while writes keep arriving (a gap of a fifth of max_wait_ms ends it),
+    # for at most max_wait_ms or max_batch rows, and is then written in one
+    # transaction. Each caller's future resolves only after that commit, so an
+    # acknowledged write is as durable as with a per-request commit, but the log
+    # flush is shared. A lone write with no recent concurrency is committed at once.
+    # If no connection can be opened, the batch goes to fallback(query, params)
+    # instead and each future resolves with what it returned.
+
+    def __init__(self, name, connect, max_batch=64, max_wait_ms=5.0, after_commit=None, fallback=None):
+        self.name = name
+        self.connect = connect
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.after_commit = after_commit
+        self.fallback = fallback
+        self._queue = queue.Queue()
+        self._conn = None
+        self._stopped = False
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self._last_batch = 0
+        self._thread = threading.Thread(target=self._run, name=f"group-commit-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, query, params):
+        future = Future()
+        if self._stopped:
+            future.set_exception(RuntimeError(f"Group commit writer {self.name} is stopped"))
+            return future
+        self._queue.put((query, params, future))
+        return future
+
+    def stop(self):
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "failures": self.failures,
+            "queued": self._queue.qsize(),
+        }
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = min(deadline - time.monotonic(), self.max_wait / 5)
+            if len(batch) == 1 and self._last_batch <= 1 and self._queue.empty():
+                remaining = 0
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped = True
+                break
+            batch.append(item)
+        return batch
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self.connect()
+            if self._conn is None:
+                raise DatabaseUnavailable("Database connection failed")
+        return self._conn
+
+    def _discard_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _write(self, batch):
+        conn = self._connection()
+        try:
+            for query, params, _ in batch:
+                conn.execute(query, params)
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard_connection()
+            raise
+        if self.after_commit is not None:
+            try:
+                self.after_commit(conn)
+            except Exception as e:
+                logging.error(f"Error in after-commit hook for {self.name}: {e}")
+
+    def _fall_back(self, batch, error):
+        if self.fallback is None:
+            return [(future, None, error) for _, _, future in batch]
+        results = []
+        for query, params, future in batch:
+            try:
+                results.append((future, self.fallback(query, params), None))
+            except Exception as fallback_error:
+                results.append((future, None, fallback_error))
+        return results
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            try:
+                self._write(batch)
+                results = [(future, None, None) for _, _, future in batch]
+            except DatabaseUnavailable as e:
+                results = self._fall_back(batch, e)
+            except Exception as e:
+                logging.error(f"Group commit of {len(batch)} rows to {self.name} failed, retrying one by one: {e}")
+                self.failures += 1
+                # Isolate the bad row(s) so one invalid write does not fail its neighbours
+                results = []
+                for item in batch:
+                    try:
+                        self._write([item])
+                        results.append((item[2], None, None))
+                    except DatabaseUnavailable as item_error:
+                        results.extend(self._fall_back([item], item_error))
+                    except Exception as item_error:
+                        results.append((item[2], None, item_error))
+            self.batches += 1
+            self.rows += len(batch)
+            self._last_batch = len(batch)
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            if self._stopped:
+                break
+        # Fail anything still queued after stop()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].set_exception(RuntimeError(f"Group commit writer {self.name} is stopped"))
+        self._discard_connection()
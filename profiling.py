@@ -0,0 +1,193 @@
+import asyncio
+import collections
+import contextvars
+import inspect
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Set while a request is profiled; the threadpool copies it into the calls it runs
+_profiled_request = contextvars.ContextVar("profiled_request", default=None)
+
+
+class SamplingProfiler:
+    # Periodically samples the stack of the thread running one invocation of the
+    # target code object and folds them into collapsed-stack counts
+    # ("frame;frame;frame count"), which speedscope and flamegraph.pl both import.
+    # The invocation is the first one _claims() accepts; other threads running the
+    # same code are never sampled. A coroutine is only on a stack while it runs, so
+    # time an async target spends awaiting I/O does not show up in the samples.
+
+    def __init__(self, target_code, interval=0.005):
+        self.target_code = target_code
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._frame = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._frame = None
+
+    def _target(self):
+        return self.target_code
+
+    def _claims(self, frame):
+        # Whether this frame running the target code is the invocation to profile
+        return True
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            target = self._target()
+            if target is None:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                hit = False
+                while frame is not None:
+                    code = frame.f_code
+                    if frame is self._frame:
+                        hit = True
+                    elif self._frame is None and code is target and self._claims(frame):
+                        self._frame = frame
+                        hit = True
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if hit:
+                    self.counts[";".join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+class ProfileRing:
+    # Bounded store of finished profiles; the oldest entry falls off once the ring is full.
+
+    def __init__(self, size=50):
+        self._profiles = collections.OrderedDict()
+        self._size = size
+        self._lock = threading.Lock()
+
+    def add(self, meta, collapsed):
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[profile_id] = (dict(meta, id=profile_id), collapsed)
+            while len(self._profiles) > self._size:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def list(self):
+        with self._lock:
+            return [meta for meta, _ in reversed(self._profiles.values())]
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+class ProfilingMiddleware:
+    # Pure ASGI middleware so the routed endpoint written into the scope by the
+    # router is visible here while the request is still running.
+    # Only one request per worker is profiled at a time to keep overhead bounded.
+
+    def __init__(self, app, ring, enabled=False, sample_rate=0.0, interval=0.005,
+                 header="x-profile-request", is_privileged=None):
+        self.app = app
+        self.ring = ring
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.header = header.lower().encode()
+        self.is_privileged = is_privileged
+        self._busy = threading.Lock()
+
+    def _wants_profile(self, scope):
+        headers = dict(scope.get("headers") or [])
+        if headers.get(self.header) in (b"1", b"true") and self.is_privileged and self.is_privileged(headers):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        marker = object()
+        context_token = _profiled_request.set(marker)
+        profiler = _ScopeProfiler(scope, self.interval, marker, asyncio.current_task())
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            _profiled_request.reset(context_token)
+            self._busy.release()
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.ring.add({
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status": status_code,
+                "duration_ms": round(duration_ms, 2),
+                "samples": profiler.samples,
+                "interval_ms": self.interval * 1000,
+                "created_at": datetime.utcnow().isoformat(),
+            }, profiler.collapsed())
+
+
+class _ScopeProfiler(SamplingProfiler):
+    # The endpoint is only known once routing has happened, so resolve the target
+    # code object lazily from the (shared) ASGI scope. Concurrent requests to the
+    # same endpoint run the same code, so an invocation is only claimed if it
+    # belongs to this request: a sync endpoint runs in the threadpool under a copy
+    # of the request's context, an async one in the request's task.
+
+    def __init__(self, scope, interval, marker, task):
+        super().__init__(None, interval)
+        self._scope = scope
+        self._marker = marker
+        self._task = task
+
+    def _target(self):
+        return getattr(self._scope.get("endpoint"), "__code__", None)
+
+    def _claims(self, frame):
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            # A coroutine on a stack is being run by the loop's current task
+            return self._task is not None and asyncio.current_task(self._task.get_loop()) is self._task
+        return _runs_in_context(frame, self._marker)
+
+
+def _runs_in_context(frame, marker):
+    # The worker loop below a threadpool call holds the context it runs the call in
+    while frame is not None:
+        for value in list(frame.f_locals.values()):
+            if isinstance(value, contextvars.Context) and value.get(_profiled_request) is marker:
+                return True
+        frame = frame.f_back
+    return False
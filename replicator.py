@@ -0,0 +1,107 @@
+"""Keeps a local SQLite file in sync with the primary so it can stand in for a
+read replica in development (DB_REPLICA_CONNECTION_STRING=sqlite:///replica.db).
+
+    python replicator.py --replica replica.db --odbc "DRIVER=..."
+    python replicator.py --replica replica.db --sqlite primary.db
+    python replicator.py --replica replica.db --sqlite primary.db --once
+
+Every pass copies each table into a staging table and swaps it in within one
+transaction, so readers see either the previous copy or the new one. The time
+of the last completed pass is kept in _replication for lag reporting. In
+production use a readable secondary of SQL Server itself.
+"""
+import argparse
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+
+
+def open_replica(path):
+    conn = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS _replication (synced_at TIMESTAMP NOT NULL)")
+    conn.commit()
+    return conn
+
+
+def mark_synced(replica):
+    replica.execute("DELETE FROM _replication")
+    replica.execute("INSERT INTO _replication (synced_at) VALUES (?)", (datetime.now(),))
+    replica.commit()
+
+
+def sync_from_sqlite(source_path, replica):
+    source = sqlite3.connect(source_path, timeout=30)
+    try:
+        # The backup API copies a consistent snapshot page by page
+        source.backup(replica)
+    finally:
+        source.close()
+    replica.execute("CREATE TABLE IF NOT EXISTS _replication (synced_at TIMESTAMP NOT NULL)")
+    mark_synced(replica)
+
+
+def sync_from_odbc(connection_string, replica, chunksize=10000):
+    import pyodbc
+
+    source = pyodbc.connect(connection_string)
+    try:
+        tables = [
+            row[0] for row in source.execute(
+                "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'"
+            ).fetchall()
+        ]
+        for table in tables:
+            staging = f"{table}__staging"
+            replica.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            rows = 0
+            for chunk in pd.read_sql(f"SELECT * FROM [{table}]", source, chunksize=chunksize):
+                chunk.to_sql(staging, replica, if_exists="append", index=False)
+                rows += len(chunk)
+            if rows == 0:
+                # Keep the columns of an empty table (replacing the empty chunk some drivers yield)
+                pd.read_sql(f"SELECT TOP 0 * FROM [{table}]", source).to_sql(staging, replica, if_exists="replace", index=False)
+            replica.commit()
+            replica.execute("BEGIN")
+            replica.execute(f'DROP TABLE IF EXISTS "{table}"')
+            replica.execute(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+            replica.commit()
+            logging.info(f"Replicated {table}: {rows} rows")
+    finally:
+        source.close()
+    mark_synced(replica)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replica", required=True, help="SQLite file to keep in sync")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--odbc", help="ODBC connection string of the primary")
+    source.add_argument("--sqlite", help="SQLite file standing in for the primary")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between passes")
+    parser.add_argument("--once", action="store_true", help="run one pass and exit")
+    args = parser.parse_args()
+
+    replica = open_replica(args.replica)
+    while True:
+        started = time.perf_counter()
+        try:
+            if args.sqlite:
+                sync_from_sqlite(args.sqlite, replica)
+            else:
+                sync_from_odbc(args.odbc, replica)
+            logging.info(f"Replica synced in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logging.error(f"Replication pass failed: {e}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
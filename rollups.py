@@ -0,0 +1,169 @@
+import bisect
+import collections
+import threading
+import time
+from datetime import timedelta
+
+
+class MaxWindow:
+    # Sliding-window maximum over a time horizon (monotonic deque): pushes and
+    # reads are amortised O(1) since every reading enters and leaves once.
+
+    def __init__(self, horizon):
+        self.horizon = horizon
+        self._items = collections.deque()
+
+    def push(self, timestamp, value):
+        items = self._items
+        if items and timestamp < items[-1][0]:
+            self._push_late(timestamp, value)
+            return
+        while items and items[-1][1] <= value:
+            items.pop()
+        items.append((timestamp, value))
+
+    def _push_late(self, timestamp, value):
+        # A reading that committed after newer ones: keep timestamps ascending and
+        # values descending. Rare, so a linear pass is fine.
+        items = list(self._items)
+        position = bisect.bisect_right(items, timestamp, key=lambda item: item[0])
+        if any(v >= value for _, v in items[position:]):
+            return
+        kept = [item for item in items[:position] if item[1] > value]
+        self._items = collections.deque(kept + [(timestamp, value)] + items[position:])
+
+    def max(self, now):
+        items = self._items
+        while items and items[0][0] < now - self.horizon:
+            items.popleft()
+        return items[0][1] if items else None
+
+
+class PatientSummary:
+    __slots__ = (
+        "patient", "symptom_count", "open_diagnoses", "latest_id", "latest_symptom",
+        "latest_severity", "latest_timestamp", "max_24h", "max_7d",
+    )
+
+    def __init__(self, patient):
+        self.patient = patient
+        self.symptom_count = 0
+        self.open_diagnoses = 0
+        self.latest_id = None
+        self.latest_symptom = None
+        self.latest_severity = None
+        self.latest_timestamp = None
+        self.max_24h = MaxWindow(timedelta(hours=24))
+        self.max_7d = MaxWindow(timedelta(days=7))
+
+    def as_dict(self, now):
+        return {
+            "patient": self.patient,
+            "symptom_count": self.symptom_count,
+            "open_diagnoses": self.open_diagnoses,
+            "latest": None if self.latest_id is None else {
+                "id": self.latest_id,
+                "symptom": self.latest_symptom,
+                "calculated_severity": self.latest_severity,
+                "timestamp": self.latest_timestamp,
+            },
+            "max_severity_24h": self.max_24h.max(now),
+            "max_severity_7d": self.max_7d.max(now),
+        }
+
+
+class PatientSummaryCache:
+    # Counters and the latest reading come from the PatientSummaries rollup table,
+    # which the write handlers keep up to date in the same transaction as the
+    # Symptoms row. The 24h/7d maxima depend on the current time, so they are
+    # only kept here, fed by the Symptoms rows themselves.
+    #
+    # Identities can commit out of order (concurrent transactions, group commit),
+    # so readings are re-read above last_symptom_id: the id below which every
+    # reading has been applied or its id given up on. Ids above it that were
+    # already applied are remembered in _seen. A gap still open after gap_seconds
+    # is a rolled-back insert and is skipped.
+
+    def __init__(self, gap_seconds=120.0):
+        self.gap_seconds = gap_seconds
+        self._patients = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self.last_symptom_id = 0
+        self._seen = set()
+        self._gap_since = None
+        self.synced_until = None
+
+    def __len__(self):
+        return len(self._patients)
+
+    def _get(self, patient):
+        summary = self._patients.get(patient)
+        if summary is None:
+            summary = self._patients[patient] = PatientSummary(patient)
+            bisect.insort(self._order, patient)
+        return summary
+
+    def apply_rollup(self, patient, symptom_count, open_diagnoses, latest_id, latest_symptom, latest_severity, latest_timestamp):
+        with self._lock:
+            summary = self._get(patient)
+            summary.symptom_count = symptom_count
+            summary.open_diagnoses = open_diagnoses
+            summary.latest_id = latest_id
+            summary.latest_symptom = latest_symptom
+            summary.latest_severity = latest_severity
+            summary.latest_timestamp = latest_timestamp
+
+    def apply_reading(self, symptom_id, patient, severity, timestamp):
+        # Readings may arrive in any order and more than once
+        with self._lock:
+            if symptom_id <= self.last_symptom_id or symptom_id in self._seen:
+                return
+            self._seen.add(symptom_id)
+            summary = self._get(patient)
+            summary.max_24h.push(timestamp, severity)
+            summary.max_7d.push(timestamp, severity)
+
+    def start_after(self, symptom_id):
+        # After a full load: older ids are out of the 7-day window anyway
+        with self._lock:
+            self.last_symptom_id = symptom_id
+            self._seen = {seen for seen in self._seen if seen > symptom_id}
+            self._gap_since = None
+
+    def advance(self, now=None):
+        # Moves last_symptom_id over the ids applied in sequence
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._seen:
+                next_id = self.last_symptom_id + 1
+                if next_id in self._seen:
+                    self._seen.discard(next_id)
+                    self.last_symptom_id = next_id
+                    self._gap_since = None
+                elif self._gap_since is None:
+                    self._gap_since = now
+                    break
+                elif now - self._gap_since >= self.gap_seconds:
+                    self.last_symptom_id = min(self._seen) - 1
+                    self._gap_since = None
+                else:
+                    break
+
+    def get(self, patient, now):
+        with self._lock:
+            summary = self._patients.get(patient)
+            return summary.as_dict(now) if summary is not None else None
+
+    def page(self, now, offset=0, limit=100):
+        with self._lock:
+            return [self._patients[patient].as_dict(now) for patient in self._order[offset:offset + limit]]
+
+    def clear(self):
+        with self._lock:
+            self._patients = {}
+            self._order = []
+            self.last_symptom_id = 0
+            self._seen = set()
+            self._gap_since = None
+            self.synced_until = None
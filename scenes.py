@@ -0,0 +1,97 @@
+import collections
+import gzip
+import json
+import threading
+from datetime import datetime
+
+
+def encode_metadata(metadata):
+    # gzip so SQL Server can read it back with DECOMPRESS() if needed
+    return gzip.compress(json.dumps(metadata, separators=(",", ":"), default=str).encode(), mtime=0)
+
+
+def decode_metadata(blob):
+    return json.loads(gzip.decompress(bytes(blob)))
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def scene_rows(products):
+    # SentinelAPI.query products {product_id: properties} -> SatelliteScenes rows:
+    # (product_id, title, platform, begin_position, cloud_cover, metadata)
+    rows = []
+    for product_id, properties in products.items():
+        properties = dict(properties)
+        cloud_cover = properties.get("cloudcoverpercentage")
+        rows.append((
+            str(product_id),
+            properties.get("title"),
+            properties.get("platformname"),
+            _timestamp(properties.get("beginposition")) if properties.get("beginposition") else None,
+            float(cloud_cover) if cloud_cover is not None else None,
+            encode_metadata(properties),
+        ))
+    return rows
+
+
+def parse_scene_refs(value):
+    # satellite_data on a SAR row -> (scene ids, inline metadata). New rows hold a JSON
+    # list of product ids; older rows hold the whole {product_id: properties} document.
+    if not value:
+        return [], {}
+    data = json.loads(value) if isinstance(value, str) else value
+    if isinstance(data, dict):
+        return [str(product_id) for product_id in data], data
+    return [str(product_id) for product_id in data], {}
+
+
+class SceneCache:
+    # LRU of decoded scene metadata by product id. Scenes never change once
+    # published, so entries only leave the cache to make room.
+
+    def __init__(self, load, max_scenes=2048):
+        # load(product_ids) -> {product_id: metadata} for the ids it finds
+        self.load = load
+        self.max_scenes = max_scenes
+        self._scenes = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, product_id, metadata):
+        with self._lock:
+            self._scenes[product_id] = metadata
+            self._scenes.move_to_end(product_id)
+            while len(self._scenes) > self.max_scenes:
+                self._scenes.popitem(last=False)
+
+    def get_many(self, product_ids):
+        # {product_id: metadata}; ids not in the store are left out
+        found, missing = {}, []
+        with self._lock:
+            for product_id in dict.fromkeys(product_ids):
+                metadata = self._scenes.get(product_id)
+                if metadata is None:
+                    missing.append(product_id)
+                else:
+                    self._scenes.move_to_end(product_id)
+                    found[product_id] = metadata
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            loaded = self.load(missing)
+            for product_id, metadata in loaded.items():
+                self.put(product_id, metadata)
+            found.update(loaded)
+        return {product_id: found[product_id] for product_id in product_ids if product_id in found}
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._scenes), "hits": self.hits, "misses": self.misses}
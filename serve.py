@@ -0,0 +1,35 @@
+"""Runs the API with one worker process per core.
+
+    python serve.py                 # WEB_CONCURRENCY workers, else see below
+    python serve.py --workers 4 --port 8080
+
+uvicorn's supervisor starts the workers on a shared socket and restarts any
+that die. Rate limits, revoked tokens and the leases that keep nightly and
+periodic jobs to one worker live in SHARED_STORE_URL, so more than one worker
+needs sqlite:///path (one node) or redis:// (several nodes); the in-process
+memory:// store would give every worker its own copy. Without WEB_CONCURRENCY
+or --workers, that means one worker per core with a shared store and a single
+worker with memory://.
+"""
+import argparse
+
+import uvicorn
+
+from config import HOST, PORT, SHARED_STORE_IS_LOCAL, WORKERS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default %(default)s)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.workers > 1 and SHARED_STORE_IS_LOCAL:
+        parser.error("several workers need SHARED_STORE_URL=sqlite:///path or redis://host:port/db")
+    uvicorn.run("telemedicine:app", host=args.host, port=args.port, workers=args.workers,
+                proxy_headers=True, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import threading
+
+import numpy as np
+
+# Relative clinical weight of each symptom the app lets patients report
+SYMPTOM_WEIGHTS = {
+    "shortness of breath": 1.5,
+    "fever": 1.2,
+    "cough": 1.0,
+    "headache": 0.9,
+}
+SYMPTOM_TYPES = list(SYMPTOM_WEIGHTS) + ["other"]
+_TYPE_INDEX = {name: i for i, name in enumerate(SYMPTOM_TYPES)}
+_WEIGHTS = np.array([SYMPTOM_WEIGHTS.get(name, 1.0) for name in SYMPTOM_TYPES], dtype=np.float32)
+
+
+def to_seconds(timestamps):
+    # Naive datetimes are treated the same way everywhere (as UTC wall time)
+    return np.asarray(timestamps, dtype="datetime64[us]").astype(np.int64) / 1e6
+
+
+def symptom_type(symptom):
+    return _TYPE_INDEX.get((symptom or "").strip().lower(), _TYPE_INDEX["other"])
+
+
+class SeverityEngine:
+    # Clinical severity from a patient's recent history rather than the single
+    # self-reported rating. Per patient we keep a few numbers in flat arrays:
+    #   level      - time-decayed average of weighted readings
+    #   trend      - smoothed change of that level (worsening > 0)
+    #   recurrence - decayed count of reports per symptom type
+    #   last_ts    - time of the previous reading (epoch seconds)
+    # so scoring a new reading is O(1), and a full rescore replays every
+    # patient's history in lock-step, one vectorised step per reading rank.
+
+    def __init__(self, half_life_hours=24.0, trend_gain=1.5, recurrence_gain=1.0, initial_capacity=1024):
+        self.decay_rate = np.log(2) / (half_life_hours * 3600.0)
+        self.trend_gain = trend_gain
+        self.recurrence_gain = recurrence_gain
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._allocate(initial_capacity)
+
+    def _allocate(self, capacity):
+        self.level = np.zeros(capacity, dtype=np.float32)
+        self.trend = np.zeros(capacity, dtype=np.float32)
+        self.last_ts = np.full(capacity, np.nan, dtype=np.float64)
+        self.recurrence = np.zeros((capacity, len(SYMPTOM_TYPES)), dtype=np.float32)
+
+    def _slot(self, patient):
+        slot = self._slots.get(patient)
+        if slot is None:
+            slot = self._slots[patient] = len(self._slots)
+            if slot >= len(self.level):
+                self._grow(2 * len(self.level))
+        return slot
+
+    def _grow(self, capacity):
+        old = (self.level, self.trend, self.last_ts, self.recurrence)
+        self._allocate(capacity)
+        n = len(old[0])
+        self.level[:n], self.trend[:n], self.last_ts[:n], self.recurrence[:n] = old
+
+    def _step(self, slots, types, severities, timestamps, commit=True):
+        # One reading for each of the given (distinct) patients; commit=False only
+        # computes the score and leaves the state as it was
+        weighted = np.clip(severities, 1, 10).astype(np.float32) * _WEIGHTS[types]
+        previous = self.last_ts[slots]
+        first = np.isnan(previous)
+        elapsed = np.where(first, 0.0, np.maximum(timestamps - np.nan_to_num(previous), 0.0))
+        decay = np.where(first, 0.0, np.exp(-self.decay_rate * elapsed)).astype(np.float32)
+        # New readings always carry at least 30% so a sudden deterioration shows immediately
+        keep = np.minimum(decay, 0.7)
+        old_level = self.level[slots]
+        level = np.where(first, weighted, keep * old_level + (1 - keep) * weighted)
+        trend = np.where(first, 0.0, 0.5 * (level - old_level) + 0.5 * decay * self.trend[slots])
+        recurrence = self.recurrence[slots] * decay[:, None]
+        recurrence[np.arange(len(slots)), types] += 1
+        if commit:
+            self.level[slots] = level
+            self.trend[slots] = trend
+            self.recurrence[slots] = recurrence
+            self.last_ts[slots] = timestamps
+        repeats = recurrence[np.arange(len(slots)), types] - 1
+        score = (
+            0.6 * weighted
+            + 0.4 * level
+            + self.trend_gain * np.maximum(trend, 0)
+            + self.recurrence_gain * np.log1p(np.maximum(repeats, 0))
+        )
+        return np.clip(np.rint(score), 1, 10).astype(np.int64)
+
+    def score(self, patient, symptom, severity, timestamp, commit=True):
+        # Callers that still have to store the reading score it with commit=False
+        # and call again with commit=True once it is saved
+        with self._lock:
+            slot = self._slot(patient)
+            result = self._step(
+                np.array([slot]),
+                np.array([symptom_type(symptom)]),
+                np.array([severity], dtype=np.float32),
+                to_seconds([timestamp]),
+                commit=commit,
+            )
+        return int(result[0])
+
+    def rescore(self, patients, symptoms, severities, timestamps):
+        # Rebuilds all state from history and returns the score of every reading,
+        # aligned with the input order.
+        patients = np.asarray(patients, dtype=object)
+        n = len(patients)
+        scores = np.zeros(n, dtype=np.int64)
+        with self._lock:
+            self._slots = {}
+            self._allocate(max(len(self.level), 1))
+            if n == 0:
+                return scores
+            unique_patients, slot_of_row = np.unique(patients.astype(str), return_inverse=True)
+            for patient in unique_patients:
+                self._slot(patient)
+            slots = np.array([self._slots[p] for p in unique_patients])[slot_of_row]
+            types = np.array([symptom_type(s) for s in symptoms])
+            severities = np.asarray(severities, dtype=np.float32)
+            seconds = to_seconds(timestamps)
+            order = np.lexsort((seconds, slots))
+            sorted_slots = slots[order]
+            # Rank of each reading within its patient's history
+            starts = np.r_[0, np.flatnonzero(sorted_slots[1:] != sorted_slots[:-1]) + 1]
+            run_lengths = np.diff(np.r_[starts, n])
+            rank = np.arange(n) - np.repeat(starts, run_lengths)
+            for step in range(int(rank.max()) + 1):
+                rows = order[rank == step]
+                scores[rows] = self._step(slots[rows], types[rows], severities[rows], seconds[rows])
+        return scores
+
+    def state(self, patient):
+        with self._lock:
+            slot = self._slots.get(patient)
+            if slot is None or np.isnan(self.last_ts[slot]):
+                return None
+            return {
+                "level": round(float(self.level[slot]), 3),
+                "trend": round(float(self.trend[slot]), 3),
+                "recurrence": {name: round(float(count), 3) for name, count in zip(SYMPTOM_TYPES, self.recurrence[slot]) if count > 0},
+            }
@@ -0,0 +1,241 @@
+import collections
+import logging
+import sqlite3
+import threading
+import time
+
+from admission import TokenBucket
+from circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+class MemoryStore:
+    # State for a single process; every method is also safe across threads.
+    shared = False
+
+    def __init__(self, max_buckets=10000):
+        self.max_buckets = max_buckets
+        self._buckets = collections.OrderedDict()
+        self._revoked = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        # Returns 0 when a token was taken, otherwise the seconds until one is available
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take()
+
+    def revoke(self, token_id, expires_at):
+        with self._lock:
+            now = time.time()
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+            self._revoked[token_id] = expires_at
+
+    def is_revoked(self, token_id):
+        with self._lock:
+            return self._revoked.get(token_id, 0) > time.time()
+
+    def lease(self, name, owner, ttl):
+        # True if owner holds (or now takes) the named lease for the next ttl seconds
+        with self._lock:
+            now = time.time()
+            holder = self._leases.get(name)
+            if holder is None or holder[0] == owner or holder[1] <= now:
+                self._leases[name] = (owner, now + ttl)
+                return True
+            return False
+
+    def stats(self):
+        return {"backend": "memory", "buckets": len(self._buckets), "revoked_tokens": len(self._revoked)}
+
+
+class SQLiteStore:
+    # State shared by the workers of one node through a SQLite file in WAL mode.
+    # Each operation is one short BEGIN IMMEDIATE transaction, so concurrent
+    # workers serialise on the file lock rather than overwrite each other.
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS revoked (token_id TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+        """)
+        self._lock = threading.Lock()
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def take(self, key, rate, burst):
+        def work(conn):
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if wait == 0:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            return wait
+        return self._transaction(work)
+
+    def revoke(self, token_id, expires_at):
+        def work(conn):
+            conn.execute("DELETE FROM revoked WHERE expires_at <= ?", (time.time(),))
+            conn.execute("INSERT OR REPLACE INTO revoked (token_id, expires_at) VALUES (?, ?)", (token_id, expires_at))
+        self._transaction(work)
+
+    def is_revoked(self, token_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM revoked WHERE token_id = ? AND expires_at > ?", (token_id, time.time())
+            ).fetchone()
+        return row is not None
+
+    def lease(self, name, owner, ttl):
+        def work(conn):
+            now = time.time()
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)", (name, owner, now + ttl))
+            return True
+        return self._transaction(work)
+
+    def stats(self):
+        with self._lock:
+            buckets = self._conn.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+            revoked = self._conn.execute("SELECT COUNT(*) FROM revoked WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "buckets": buckets, "revoked_tokens": revoked}
+
+
+# KEYS[1] bucket; ARGV rate, burst, now. Returns the wait in seconds as a string.
+_TAKE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+# KEYS[1] lease; ARGV owner, ttl in ms. Takes or renews the lease.
+_LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class RedisStore:
+    # State shared across nodes through Redis; token buckets and leases are
+    # updated atomically by server-side scripts.
+    shared = True
+
+    def __init__(self, url, prefix="telemed:", timeout=0.5):
+        import redis
+
+        self.url = url
+        self.prefix = prefix
+        # Bounded so an unreachable server fails the call instead of hanging it
+        self._redis = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._lease = self._redis.register_script(_LEASE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[f"{self.prefix}bucket:{key}"], args=[rate, burst, time.time()]))
+
+    def revoke(self, token_id, expires_at):
+        ttl = int(expires_at - time.time()) + 1
+        if ttl > 0:
+            self._redis.set(f"{self.prefix}revoked:{token_id}", 1, ex=ttl)
+
+    def is_revoked(self, token_id):
+        return bool(self._redis.exists(f"{self.prefix}revoked:{token_id}"))
+
+    def lease(self, name, owner, ttl):
+        return bool(self._lease(keys=[f"{self.prefix}lease:{name}"], args=[owner, int(ttl * 1000)]))
+
+    def stats(self):
+        return {"backend": "redis", "url": self._redis.connection_pool.connection_kwargs.get("host")}
+
+
+class FailOpenStore:
+    # Wraps a shared store so an outage degrades each worker to its own state
+    # instead of failing requests: tokens come from per-process buckets, tokens
+    # revoked through this worker stay revoked, and leases are not granted. The
+    # breaker stops a dead backend from costing a timeout on every call.
+    shared = True
+
+    def __init__(self, store, breaker=None):
+        self.store = store
+        self.local = MemoryStore()
+        self.breaker = breaker or CircuitBreaker("shared-store")
+        self.fallbacks = 0
+
+    def _call(self, method, *args, fallback):
+        try:
+            self.breaker.before_call()
+            result = getattr(self.store, method)(*args)
+        except CircuitOpen:
+            self.fallbacks += 1
+            return fallback()
+        except Exception as e:
+            self.breaker.record_failure(e)
+            self.fallbacks += 1
+            logging.warning(f"Shared store {method} failed, using local state: {e}")
+            return fallback()
+        self.breaker.record_success()
+        return result
+
+    def take(self, key, rate, burst):
+        return self._call("take", key, rate, burst, fallback=lambda: self.local.take(key, rate, burst))
+
+    def revoke(self, token_id, expires_at):
+        self.local.revoke(token_id, expires_at)
+        self._call("revoke", token_id, expires_at, fallback=lambda: None)
+
+    def is_revoked(self, token_id):
+        return self.local.is_revoked(token_id) or self._call("is_revoked", token_id, fallback=lambda: False)
+
+    def lease(self, name, owner, ttl):
+        return self._call("lease", name, owner, ttl, fallback=lambda: False)
+
+    def stats(self):
+        stats = self._call("stats", fallback=lambda: {"backend": "unavailable"})
+        return {**stats, "fallbacks": self.fallbacks, "breaker": self.breaker.stats()}
+
+
+def open_store(url, timeout=0.5):
+    # memory:// (one process), sqlite:///path (workers on one node) or redis://host:port/db
+    if url.startswith("sqlite:///"):
+        return FailOpenStore(SQLiteStore(url[len("sqlite:///"):]))
+    if url.startswith(("redis://", "rediss://")):
+        return FailOpenStore(RedisStore(url, timeout=timeout))
+    if url in ("", "memory://"):
+        return MemoryStore()
+    raise ValueError(f"Unsupported shared store URL: {url}")
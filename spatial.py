@@ -0,0 +1,109 @@
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    # Uniform lat/lon grid: each point lives in one cell, so inserts, moves and
+    # deletes are O(1) and a radius query only visits the cells its bounding box
+    # overlaps before the exact haversine check.
+
+    def __init__(self, cell_degrees=0.1):
+        self.cell_degrees = cell_degrees
+        self._lon_cells = int(round(360 / cell_degrees))
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.RLock()
+        # Sync cursor owned by whoever keeps the index up to date
+        self.synced_until = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, item_id):
+        return item_id in self._points
+
+    def _cell(self, lat, lon):
+        row = int(math.floor((min(max(lat, -90), 89.999999) + 90) / self.cell_degrees))
+        col = int(math.floor((lon + 180) / self.cell_degrees)) % self._lon_cells
+        return row, col
+
+    def upsert(self, item_id, lat, lon, data=None):
+        with self._lock:
+            self.remove(item_id)
+            cell = self._cell(lat, lon)
+            self._points[item_id] = (lat, lon, cell, data)
+            self._cells.setdefault(cell, set()).add(item_id)
+
+    def remove(self, item_id):
+        with self._lock:
+            point = self._points.pop(item_id, None)
+            if point is None:
+                return False
+            members = self._cells[point[2]]
+            members.discard(item_id)
+            if not members:
+                del self._cells[point[2]]
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            self.synced_until = None
+
+    def _scan(self, min_lat, min_lon, max_lat, max_lon):
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+        if max_lon - min_lon >= 360:
+            cols = range(self._lon_cells)
+        elif min_col <= max_col:
+            cols = range(min_col, max_col + 1)
+        else:
+            # Box crosses the antimeridian
+            cols = list(range(min_col, self._lon_cells)) + list(range(0, max_col + 1))
+        for row in range(min_row, max_row + 1):
+            for col in cols:
+                members = self._cells.get((row, col))
+                if members:
+                    yield from members
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, limit=None):
+        results = []
+        with self._lock:
+            for item_id in self._scan(min_lat, min_lon, max_lat, max_lon):
+                lat, lon, _, data = self._points[item_id]
+                in_lon = min_lon <= lon <= max_lon if min_lon <= max_lon else (lon >= min_lon or lon <= max_lon)
+                if min_lat <= lat <= max_lat and in_lon:
+                    results.append({"id": item_id, "lat": lat, "lon": lon, "data": data})
+                    if limit is not None and len(results) >= limit:
+                        break
+        return results
+
+    def within_radius(self, lat, lon, radius_km, limit=None):
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        # Use the latitude nearest the pole so the box always contains the circle;
+        # near the poles the longitude span covers the whole globe
+        cos_lat = math.cos(math.radians(min(90.0, abs(lat) + dlat)))
+        dlon = 360.0 if cos_lat < 1e-6 else min(360.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+        min_lon, max_lon = lon - dlon, lon + dlon
+        if dlon < 180:
+            min_lon = (min_lon + 180) % 360 - 180
+            max_lon = (max_lon + 180) % 360 - 180
+        results = []
+        with self._lock:
+            for item_id in self._scan(lat - dlat, min_lon, lat + dlat, max_lon if dlon < 180 else min_lon + 360):
+                point_lat, point_lon, _, data = self._points[item_id]
+                distance = haversine_km(lat, lon, point_lat, point_lon)
+                if distance <= radius_km:
+                    results.append({"id": item_id, "lat": point_lat, "lon": point_lon, "distance_km": round(distance, 3), "data": data})
+        results.sort(key=lambda result: result["distance_km"])
+        return results[:limit] if limit is not None else results
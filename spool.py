@@ -0,0 +1,183 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Cannot spool value of type {type(value).__name__}")
+
+
+def _decode(value):
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return value
+
+
+class WriteSpool:
+    # Append-only local log (SQLite in WAL mode, synchronous=FULL) for writes
+    # that could not reach the primary database. Entries are replayed strictly
+    # in order; each one is applied in the same transaction as a row in the
+    # primary's AppliedWrites table keyed by its idempotency key, so a replay
+    # that is interrupted, or run by two workers sharing the spool, never
+    # applies a write twice. An entry that fails holds back everything behind
+    # it: replay retries it with exponential backoff (retry_base_seconds doubling
+    # up to retry_max_seconds) and never skips it, and once it has failed
+    # max_attempts times every retry is logged as an error for an operator.
+
+    def __init__(self, path, max_attempts=10, retry_base_seconds=5.0, retry_max_seconds=600.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                table_name TEXT NOT NULL,
+                query TEXT NOT NULL,
+                params TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self.replayed = 0
+        self.duplicates = 0
+        self.last_replay_rate = 0.0
+        self.last_replay_at = None
+
+    def append(self, table, query, params, idempotency_key=None):
+        key = idempotency_key or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO spool (idempotency_key, table_name, query, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, table, query, json.dumps(list(params), default=_encode), time.time())
+            )
+        return key
+
+    def has_pending(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM spool LIMIT 1").fetchone() is not None
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM spool"
+            ).fetchone()
+            head = self._conn.execute(
+                "SELECT attempts, last_error FROM spool ORDER BY seq LIMIT 1"
+            ).fetchone()
+        return {
+            "depth": pending,
+            "head_attempts": head[0] if head else 0,
+            "head_error": head[1] if head else None,
+            "retry_in_seconds": round(max(self._retry_at - time.monotonic(), 0.0), 3),
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest else None,
+            "replayed": self.replayed,
+            "duplicates_skipped": self.duplicates,
+            "last_replay_rate_per_second": round(self.last_replay_rate, 2),
+            "last_replay_at": self.last_replay_at,
+        }
+
+    def _pending(self, limit):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, idempotency_key, table_name, query, params, attempts FROM spool "
+                "ORDER BY seq LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def _done(self, seq):
+        with self._lock:
+            self._conn.execute("DELETE FROM spool WHERE seq = ?", (seq,))
+
+    def _attempt_failed(self, seq, table, attempts, error):
+        attempts += 1
+        delay = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE spool SET attempts = ?, last_error = ? WHERE seq = ?",
+                (attempts, str(error), seq)
+            )
+            behind = self._conn.execute("SELECT COUNT(*) FROM spool WHERE seq > ?", (seq,)).fetchone()[0]
+        self._retry_at = time.monotonic() + delay
+        if attempts >= self.max_attempts:
+            logging.error(
+                f"Spooled write {seq} to {table} has failed {attempts} times and is holding back "
+                f"{behind} later writes; retrying in {delay:.0f}s: {error}"
+            )
+        else:
+            logging.error(f"Replay of spooled write {seq} to {table} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+
+    def replay(self, connect, after_commit=None, batch_size=100):
+        # Returns the number of entries applied; stops at the first entry that
+        # cannot be applied so later writes never overtake earlier ones.
+        if time.monotonic() < self._retry_at:
+            return 0
+        applied = 0
+        started = time.perf_counter()
+        tables = set()
+        conn = None
+        try:
+            while True:
+                entries = self._pending(batch_size)
+                if not entries:
+                    break
+                if conn is None:
+                    conn = connect()
+                    if conn is None:
+                        break
+                for seq, key, table, query, params, attempts in entries:
+                    params = json.loads(params, object_hook=_decode)
+                    try:
+                        if conn.execute("SELECT 1 FROM AppliedWrites WHERE idempotency_key = ?", (key,)).fetchone():
+                            self.duplicates += 1
+                        else:
+                            conn.execute("INSERT INTO AppliedWrites (idempotency_key) VALUES (?)", (key,))
+                            conn.execute(query, params)
+                            conn.commit()
+                            tables.add(table)
+                            applied += 1
+                    except Exception as e:
+                        try:
+                            conn.rollback()
+                        except Exception:
+                            pass
+                        self._attempt_failed(seq, table, attempts, e)
+                        return applied
+                    self._done(seq)
+                    self._retry_at = 0.0
+        finally:
+            elapsed = time.perf_counter() - started
+            if applied:
+                self.replayed += applied
+                self.last_replay_rate = applied / elapsed if elapsed > 0 else 0.0
+                self.last_replay_at = datetime.utcnow().isoformat()
+            if conn is not None:
+                if after_commit is not None:
+                    for table in tables:
+                        try:
+                            after_commit(table, conn)
+                        except Exception as e:
+                            logging.error(f"Error in after-commit hook for {table}: {e}")
+                conn.close()
+        return applied
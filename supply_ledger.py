@@ -0,0 +1,22 @@
+MOVEMENT_KINDS = ("receive", "consume", "adjust")
+
+
+def apply_movement(quantity, kind, amount):
+    # receive/consume move stock by amount; adjust records a stocktake count,
+    # so it sets the quantity rather than moving it
+    if kind == "receive":
+        return quantity + amount
+    if kind == "consume":
+        return quantity - amount
+    if kind == "adjust":
+        return amount
+    raise ValueError(f"Unknown supply movement kind: {kind}")
+
+
+def fold(snapshot, movements):
+    # Stock per item from a snapshot {item: quantity} and the (item, kind, amount)
+    # movements recorded after it, in ledger order: O(len(movements))
+    stock = dict(snapshot)
+    for item, kind, amount in movements:
+        stock[item] = apply_movement(stock.get(item, 0), kind, amount)
+    return stock
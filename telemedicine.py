@@ -1,7 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Body, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Body, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
@@ -15,23 +16,283 @@ from sentinelsat import SentinelAPI
 import requests
 from contextlib import asynccontextmanager
 import uuid
+import asyncio
+import re
+import time
+import itertools
+import anyio
+import sqlite3
+from config import (
+    DB_CONNECTION_STRING, DB_POOLING, THREADPOOL_SIZE, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    SHARED_STORE_URL, SHARED_STORE_TIMEOUT_SECONDS,
+)
+from shared_store import open_store
+from profiling import ProfileRing, ProfilingMiddleware
+from db_monitor import QueryMonitor, MonitoredConnection
+from admission import AdmissionController, AdmissionMiddleware, EndpointClass
+from triage import TriageQueue, URGENCY_RANK
+from spatial import GridIndex
+from dispatch import plan_deliveries
+from severity import SeverityEngine
+from rollups import PatientSummaryCache
+from directory import PrefixIndex
+from group_commit import GroupCommitWriter
+from spool import WriteSpool
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from supply_ledger import MOVEMENT_KINDS, fold
+from forecasting import forecast
+from chat import ChatHub
+from archive import ParquetArchive, LockFile
+from columnar import MEDIA_TYPES, cursor_batches, frame_batches, drop_keys, stream
+from transport import TransportMiddleware
+from scenes import SceneCache, scene_rows, decode_metadata, parse_scene_refs
+from dashboard_stats import DashboardStats, urgency_label
+from geocoding import GeocodingBusy, GeocodingWorker, PRIORITY_SAR, PRIORITY_DELIVERY, PRIORITY_UI
+from concurrent.futures import Future
 
 logging.basicConfig(level=logging.INFO)
 
-SECRET_KEY = "your-secret-key-here"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-SUPPLIES_FILE = "medical_supplies.json"
-COUNTS_FILE = "supply_update_counts.json"
+# Opt-in request profiling: a profile is taken when a medical_staff token sends the
+# X-Profile-Request header, or for a random PROFILING_SAMPLE_RATE share of requests.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_RING_SIZE = int(os.getenv("PROFILING_RING_SIZE", "50"))
+
+# DB_CONNECTION_STRING, pooling, secrets and worker settings live in config.py
+pyodbc.pooling = DB_POOLING
+
+# Login timeout for new connections; once DB_BREAKER_FAILURE_RATE of the connection
+# attempts in the last DB_BREAKER_WINDOW_SECONDS fail (at least DB_BREAKER_MIN_CALLS),
+# requests get 503 at once for DB_BREAKER_OPEN_SECONDS before a single probe is tried
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "3"))
+DB_BREAKER_FAILURE_RATE = float(os.getenv("DB_BREAKER_FAILURE_RATE", "0.5"))
+DB_BREAKER_MIN_CALLS = int(os.getenv("DB_BREAKER_MIN_CALLS", "5"))
+DB_BREAKER_WINDOW_SECONDS = float(os.getenv("DB_BREAKER_WINDOW_SECONDS", "30"))
+DB_BREAKER_OPEN_SECONDS = float(os.getenv("DB_BREAKER_OPEN_SECONDS", "10"))
+# Read-only endpoints use DB_REPLICA_CONNECTION_STRING when it is set (falling back to
+# the primary if it is unreachable); "sqlite:///replica.db" selects a local SQLite file
+# kept in sync by replicator.py. Endpoints in READ_PRIMARY_ENDPOINTS always read the
+# primary so they see their own writes.
+DB_REPLICA_CONNECTION_STRING = os.getenv("DB_REPLICA_CONNECTION_STRING", "")
+READ_PRIMARY_ENDPOINTS = {
+    path.strip() for path in os.getenv("READ_PRIMARY_ENDPOINTS", "/active-alerts,/patient-symptoms").split(",") if path.strip()
+}
+# Statements slower than this are logged with redacted parameters and their plan
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_CAPTURE_PLAN = os.getenv("SLOW_QUERY_CAPTURE_PLAN", "1") == "1"
+# One plan per query fingerprint in this many seconds, captured on a single background connection
+SLOW_QUERY_PLAN_INTERVAL_SECONDS = float(os.getenv("SLOW_QUERY_PLAN_INTERVAL_SECONDS", "300"))
+
+# Admission control: emergency endpoints are admitted ahead of routine reads when busy
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+CRITICAL_PATHS = {"/trigger-alert", "/submit-symptoms", "/sar-request", "/sar-with-satellite"}
+UNCLASSIFIED_PATHS = {"/", "/ready", "/docs", "/openapi.json", "/admission/stats"}
+
+# SAR triage: open cases are ordered by urgency, then age, then distance from the base
+SAR_BASE_LAT = float(os.getenv("SAR_BASE_LAT")) if os.getenv("SAR_BASE_LAT") else None
+SAR_BASE_LON = float(os.getenv("SAR_BASE_LON")) if os.getenv("SAR_BASE_LON") else None
+# In-memory SAR/delivery indexes are synced from the DB incrementally and fully rebuilt
+# now and then so rows deleted through other workers also drop out
+INDEX_SYNC_SECONDS = float(os.getenv("INDEX_SYNC_SECONDS", "5"))
+INDEX_FULL_REFRESH_SECONDS = float(os.getenv("INDEX_FULL_REFRESH_SECONDS", "300"))
+SPATIAL_CELL_DEGREES = float(os.getenv("SPATIAL_CELL_DEGREES", "0.1"))
+
+# Optional group commit: inserts into these tables are batched over a few ms
+# into one transaction, e.g. GROUP_COMMIT_TABLES=Symptoms,Alerts,SARRequests
+GROUP_COMMIT_TABLES = [t.strip() for t in os.getenv("GROUP_COMMIT_TABLES", "").split(",") if t.strip()]
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", "5"))
+
+# Writes to Symptoms, Alerts and SARRequests are kept in a local spool file while the
+# database is unreachable, answered 202 as queued, and replayed in order later
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "1") == "1"
+SPOOL_PATH = os.getenv("SPOOL_PATH", "write_spool.db")
+SPOOL_REPLAY_SECONDS = float(os.getenv("SPOOL_REPLAY_SECONDS", "5"))
+
+# All Nominatim calls go through one worker limited to GEOCODE_RATE_PER_SECOND
+# (their usage policy allows 1/s); lookups waiting longer than GEOCODE_TIMEOUT_SECONDS give up
+GEOCODE_RATE_PER_SECOND = float(os.getenv("GEOCODE_RATE_PER_SECOND", "1"))
+GEOCODE_TIMEOUT_SECONDS = float(os.getenv("GEOCODE_TIMEOUT_SECONDS", "30"))
+GEOCODE_BATCH_MAX = int(os.getenv("GEOCODE_BATCH_MAX", "100"))
+# Lookups allowed to wait for the quota; past this the least urgent ones are refused
+GEOCODE_QUEUE_MAX = int(os.getenv("GEOCODE_QUEUE_MAX", "1000"))
+GEOCODE_USER_AGENT = "RemoteHealthApp/1.0 (ktrepas@gmail.com)"
+
+# Supply stock is read from the latest snapshot plus the movements after it. Snapshots
+# are taken every SUPPLY_SNAPSHOT_SECONDS, covering movements older than SUPPLY_SNAPSHOT_LAG_SECONDS
+# so a slower transaction that commits a lower id late is never skipped
+SUPPLY_SNAPSHOT_SECONDS = float(os.getenv("SUPPLY_SNAPSHOT_SECONDS", "3600"))
+SUPPLY_SNAPSHOT_LAG_SECONDS = float(os.getenv("SUPPLY_SNAPSHOT_LAG_SECONDS", "60"))
+# Movements of one item wait at most this long for each other
+SUPPLY_LOCK_TIMEOUT_MS = int(os.getenv("SUPPLY_LOCK_TIMEOUT_MS", "10000"))
+
+# Consumption forecast: recomputed every SUPPLY_FORECAST_SECONDS from the last
+# SUPPLY_FORECAST_WINDOW_DAYS of consumption. Items with less than SUPPLY_REORDER_DAYS of
+# cover get a draft delivery to SUPPLY_REORDER_DESTINATION topping them up to SUPPLY_TARGET_DAYS
+SUPPLY_FORECAST_SECONDS = float(os.getenv("SUPPLY_FORECAST_SECONDS", "900"))
+SUPPLY_FORECAST_WINDOW_DAYS = int(os.getenv("SUPPLY_FORECAST_WINDOW_DAYS", "28"))
+SUPPLY_REORDER_DAYS = float(os.getenv("SUPPLY_REORDER_DAYS", "7"))
+SUPPLY_TARGET_DAYS = float(os.getenv("SUPPLY_TARGET_DAYS", "30"))
+# The destination must resolve to coordinates ("lat,lon" or a place the geocoder finds),
+# otherwise drafts could never be routed and drafting fails with an error
+SUPPLY_REORDER_DESTINATION = os.getenv("SUPPLY_REORDER_DESTINATION", "Central depot")
+SUPPLY_AUTO_REORDER = os.getenv("SUPPLY_AUTO_REORDER", "1") == "1"
+
+# Chat rooms keep the last CHAT_HISTORY_SIZE messages in memory; messages are written
+# to ChatMessages in batches, and messages sent through other workers are picked up
+# from there every CHAT_SYNC_SECONDS
+CHAT_HISTORY_SIZE = int(os.getenv("CHAT_HISTORY_SIZE", "200"))
+CHAT_FLUSH_MS = float(os.getenv("CHAT_FLUSH_MS", "200"))
+CHAT_SYNC_SECONDS = float(os.getenv("CHAT_SYNC_SECONDS", "1"))
+CHAT_ROOM_IDLE_SECONDS = float(os.getenv("CHAT_ROOM_IDLE_SECONDS", "600"))
+CHAT_MAX_MESSAGE_CHARS = int(os.getenv("CHAT_MAX_MESSAGE_CHARS", "4000"))
+CHAT_KINDS = {"message", "diagnosis", "treatment_guidance"}
+WORKER_ID = uuid.uuid4().hex
+
+# Retention: Symptoms older than SYMPTOMS_RETENTION_DAYS and non-active Alerts older than
+# ALERTS_RETENTION_DAYS are moved to Parquet files under ARCHIVE_DIR, ARCHIVE_BATCH_ROWS
+# rows per short transaction, every ARCHIVE_INTERVAL_SECONDS (0 disables archival)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+SYMPTOMS_RETENTION_DAYS = int(os.getenv("SYMPTOMS_RETENTION_DAYS", "180"))
+ALERTS_RETENTION_DAYS = int(os.getenv("ALERTS_RETENTION_DAYS", "90"))
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", "5000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.2"))
+
+# Change feed: triggers log every insert, update and delete into ChangeLog (see README);
+# entries older than CHANGE_FEED_RETENTION_DAYS are pruned by the archiver
+CHANGE_FEED_RETENTION_DAYS = int(os.getenv("CHANGE_FEED_RETENTION_DAYS", "7"))
+CHANGE_FEED_PAGE_SIZE = int(os.getenv("CHANGE_FEED_PAGE_SIZE", "500"))
+
+# Analytics exports stream EXPORT_BATCH_ROWS rows per Arrow record batch / Parquet row
+# group; since/until filter on the table's time column
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "65536"))
+EXPORT_TIME_COLUMNS = {
+    "Symptoms": "timestamp",
+    "Alerts": "trigger_time",
+    "SARRequests": "created_at",
+    "SupplyMovements": "created_at",
+    "ChatMessages": "created_at",
+    "ChangeLog": "changed_at",
+}
+
+# Field devices on metered links: responses are compressed (Accept-Encoding br/gzip) once
+# they reach TRANSPORT_MIN_BYTES and re-encoded as MessagePack/CBOR on request (Accept);
+# compressed or binary request bodies are decoded up to MAX_REQUEST_BYTES
+TRANSPORT_ENABLED = os.getenv("TRANSPORT_ENABLED", "1") == "1"
+TRANSPORT_MIN_BYTES = int(os.getenv("TRANSPORT_MIN_BYTES", "512"))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(50 * 1024 * 1024)))
+
+# /stats serves counters kept by the write handlers; every STATS_RECONCILE_SECONDS (or
+# sooner after a bulk change) they are replaced with exact GROUP BY counts
+STATS_RECONCILE_SECONDS = float(os.getenv("STATS_RECONCILE_SECONDS", "60"))
+STATS_LOW_STOCK_QUANTITY = int(os.getenv("STATS_LOW_STOCK_QUANTITY", "10"))
+
+# Sentinel scenes are stored once in SatelliteScenes with gzip-compressed metadata; SAR rows
+# keep only the product ids, and the last SCENE_CACHE_SIZE scenes read are cached decoded
+SCENE_CACHE_SIZE = int(os.getenv("SCENE_CACHE_SIZE", "2048"))
+SCENE_COMPACT_BATCH_ROWS = int(os.getenv("SCENE_COMPACT_BATCH_ROWS", "200"))
+
+# Calculated severity is scored from each patient's recent history and rescored nightly
+SEVERITY_HISTORY_DAYS = int(os.getenv("SEVERITY_HISTORY_DAYS", "30"))
+SEVERITY_HALF_LIFE_HOURS = float(os.getenv("SEVERITY_HALF_LIFE_HOURS", "24"))
+SEVERITY_RESCORE_HOUR = int(os.getenv("SEVERITY_RESCORE_HOUR", "2"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting up...")
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await asyncio.to_thread(refresh_indexes, True)
+    sync_task = asyncio.create_task(index_sync_loop())
+    await asyncio.to_thread(rescore_symptoms, False)
+    rescore_task = asyncio.create_task(nightly_rescore_loop())
+    start_group_writers()
+    replay_task = asyncio.create_task(spool_replay_loop())
+    snapshot_task = asyncio.create_task(supply_snapshot_loop())
+    await asyncio.to_thread(refresh_supply_forecast)
+    forecast_task = asyncio.create_task(supply_forecast_loop())
+    start_chat_writer()
+    chat_task = asyncio.create_task(chat_sync_loop())
+    archive_task = asyncio.create_task(archive_loop())
+    await asyncio.to_thread(reconcile_dashboard_stats)
+    stats_task = asyncio.create_task(stats_reconcile_loop())
     yield
+    sync_task.cancel()
+    rescore_task.cancel()
+    replay_task.cancel()
+    snapshot_task.cancel()
+    forecast_task.cancel()
+    chat_task.cancel()
+    archive_task.cancel()
+    stats_task.cancel()
+    await asyncio.to_thread(stop_group_writers)
+    await asyncio.to_thread(stop_chat_writer)
     print("Shutting down...")
 
 app = FastAPI(title="Telemedicine API", version="0.1.0", lifespan=lifespan)
 
+# Rate limits, revoked tokens and task leases, shared between workers unless memory://.
+# A shared store does I/O, so request paths call it through store_call.
+shared_store = open_store(SHARED_STORE_URL, timeout=SHARED_STORE_TIMEOUT_SECONDS)
+
+async def store_call(method, *args):
+    if not shared_store.shared:
+        return method(*args)
+    return await asyncio.to_thread(method, *args)
+
+def is_leader(task, ttl):
+    # Periodic jobs that must run once per deployment rather than once per worker
+    try:
+        return shared_store.lease(task, WORKER_ID, ttl)
+    except Exception as e:
+        logging.error(f"Could not take the {task} lease: {e}")
+        return False
+
+def decode_bearer(headers):
+    auth = headers.get(b"authorization", b"").decode()
+    if not auth.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+def classify_request(method, path):
+    if path in CRITICAL_PATHS:
+        return "critical"
+    if path in UNCLASSIFIED_PATHS:
+        return None
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write"
+    return "read"
+
+def identify_request(headers, client):
+    payload = decode_bearer(headers)
+    if payload and payload.get("sub"):
+        return f"user:{payload['sub']}", True
+    return f"ip:{client[0] if client else 'unknown'}", False
+
+admission_controller = AdmissionController(
+    classes=[
+        EndpointClass("critical", max_in_flight=ADMISSION_MAX_IN_FLIGHT, global_share=1.0, rate=1.0, burst=5, limit_anonymous=False),
+        EndpointClass("write", max_in_flight=ADMISSION_MAX_IN_FLIGHT // 2, global_share=0.8, rate=2.0, burst=10),
+        EndpointClass("read", max_in_flight=ADMISSION_MAX_IN_FLIGHT // 4, global_share=0.5, rate=10.0, burst=40),
+    ],
+    classify=classify_request,
+    global_max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    # Per-process buckets unless the store is shared; admit() takes from it in a thread
+    take=shared_store.take if shared_store.shared else None,
+)
+
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission_controller,
+    identify=identify_request,
+    enabled=ADMISSION_ENABLED,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -40,6 +301,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+profile_ring = ProfileRing(PROFILING_RING_SIZE)
+
+def is_privileged_request(headers):
+    payload = decode_bearer(headers)
+    return payload is not None and payload.get("role") == "medical_staff"
+
+app.add_middleware(
+    ProfilingMiddleware,
+    ring=profile_ring,
+    enabled=PROFILING_ENABLED,
+    sample_rate=PROFILING_SAMPLE_RATE,
+    interval=PROFILING_INTERVAL_MS / 1000,
+    is_privileged=is_privileged_request,
+)
+
+# Outermost, so every response (including shed and profiled ones) is encoded
+app.add_middleware(
+    TransportMiddleware,
+    enabled=TRANSPORT_ENABLED,
+    min_size=TRANSPORT_MIN_BYTES,
+    max_request_bytes=MAX_REQUEST_BYTES,
+)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -50,10 +334,27 @@ class User(BaseModel):
 class UserInDB(User):
     hashed_password: str
 
+class NewUser(BaseModel):
+    username: str
+    password: str
+    role: str = "patient"
+    full_name: Optional[str] = None
+
+class SymptomReport(BaseModel):
+    symptom: str = ""
+    # Self-reported rating on the app's 1-10 scale
+    severity: int = Field(1, ge=1, le=10)
+
 class DeleteSupplyRequest(BaseModel):
     item: str    
     quantity: int
 
+class SupplyMovement(BaseModel):
+    item: str
+    kind: str
+    quantity: int
+    note: Optional[str] = None
+
 class DeliveryRequest(BaseModel):
     destination: str
     item: str
@@ -61,6 +362,18 @@ class DeliveryRequest(BaseModel):
     vehicle: str
     delivery_time: str
 
+class Vehicle(BaseModel):
+    name: str
+    vehicle_type: str
+    capacity: int
+    latitude: float
+    longitude: float
+    status: str = "available"
+
+class GeocodeBatch(BaseModel):
+    addresses: list[str]
+    priority: str = "ui"
+
 class SARRequest(BaseModel):
     emergency_type: str
     location: str
@@ -83,18 +396,431 @@ fake_users_db = {
     }
 }
 
+def connect_primary():
+    return pyodbc.connect(DB_CONNECTION_STRING, timeout=DB_CONNECT_TIMEOUT_SECONDS)
+
+query_monitor = QueryMonitor(
+    slow_ms=SLOW_QUERY_MS,
+    plan_connection_factory=connect_primary if SLOW_QUERY_CAPTURE_PLAN else None,
+    dialect="mssql",
+    plan_interval=SLOW_QUERY_PLAN_INTERVAL_SECONDS,
+)
+
+db_breaker = CircuitBreaker(
+    "database",
+    failure_rate=DB_BREAKER_FAILURE_RATE,
+    min_calls=DB_BREAKER_MIN_CALLS,
+    window_seconds=DB_BREAKER_WINDOW_SECONDS,
+    open_seconds=DB_BREAKER_OPEN_SECONDS,
+)
+
 def get_db_connection():
+    # Raises CircuitOpen (answered 503) while the breaker is open
+    db_breaker.before_call()
     try:
-        conn = pyodbc.connect(
-            "DRIVER={ODBC Driver 17 for SQL Server};"
-            "SERVER=DESKTOP-4F2MQM0\\SQLEXPRESS;"
-            "DATABASE=Telemedicine;"
-            "Trusted_Connection=yes;"
-        )
-        return conn
+        conn = connect_primary()
     except pyodbc.Error as e:
+        db_breaker.record_failure(e)
         print("Error:", e)
         return None
+    except Exception as e:
+        db_breaker.record_failure(e)
+        raise
+    db_breaker.record_success()
+    return MonitoredConnection(conn, query_monitor)
+
+replica_breaker = CircuitBreaker(
+    "replica",
+    failure_rate=DB_BREAKER_FAILURE_RATE,
+    min_calls=DB_BREAKER_MIN_CALLS,
+    window_seconds=DB_BREAKER_WINDOW_SECONDS,
+    open_seconds=DB_BREAKER_OPEN_SECONDS,
+)
+REPLICA_DIALECT = "sqlite" if DB_REPLICA_CONNECTION_STRING.startswith("sqlite:///") else "mssql"
+
+def connect_replica():
+    if REPLICA_DIALECT == "sqlite":
+        conn = sqlite3.connect(
+            DB_REPLICA_CONNECTION_STRING[len("sqlite:///"):],
+            timeout=DB_CONNECT_TIMEOUT_SECONDS,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+    return pyodbc.connect(DB_REPLICA_CONNECTION_STRING, timeout=DB_CONNECT_TIMEOUT_SECONDS, readonly=True)
+
+def get_read_connection(endpoint):
+    # For read-only endpoints: the replica if one is configured and reachable, else the primary
+    if not DB_REPLICA_CONNECTION_STRING or endpoint in READ_PRIMARY_ENDPOINTS:
+        return get_db_connection()
+    try:
+        replica_breaker.before_call()
+    except CircuitOpen:
+        return get_db_connection()
+    try:
+        conn = connect_replica()
+    except Exception as e:
+        replica_breaker.record_failure(e)
+        logging.warning(f"Replica unavailable, reading {endpoint} from the primary: {e}")
+        return get_db_connection()
+    replica_breaker.record_success()
+    return MonitoredConnection(conn, query_monitor, dialect=REPLICA_DIALECT)
+
+def replica_lag_seconds():
+    # Only known for a SQLite replica written by replicator.py
+    if REPLICA_DIALECT != "sqlite":
+        return None
+    try:
+        conn = connect_replica()
+    except Exception:
+        return None
+    try:
+        row = conn.execute("SELECT synced_at FROM _replication").fetchone()
+        return round((datetime.now() - row[0]).total_seconds(), 3) if row and row[0] else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+def open_db_connection():
+    # For background work and the write spool: None while the database is unavailable
+    try:
+        return get_db_connection()
+    except CircuitOpen:
+        return None
+
+sar_triage = TriageQueue(base_lat=SAR_BASE_LAT, base_lon=SAR_BASE_LON)
+sar_spatial = GridIndex(SPATIAL_CELL_DEGREES)
+delivery_spatial = GridIndex(SPATIAL_CELL_DEGREES)
+patient_summaries = PatientSummaryCache()
+patient_directory = PrefixIndex()
+users_synced_id = 0
+
+def index_user(username, role, full_name=None):
+    if role == "patient":
+        patient_directory.add(username, [username] + (full_name or "").split())
+    else:
+        patient_directory.remove(username)
+
+for demo_user in fake_users_db.values():
+    index_user(demo_user["username"], demo_user["role"])
+
+def sync_user_directory(conn, full=False):
+    # Users persisted in the DB extend the built-in demo accounts
+    global users_synced_id
+    if full:
+        users_synced_id = 0
+    rows = conn.execute(
+        "SELECT id, username, role, hashed_password, full_name FROM Users WHERE id > ? ORDER BY id",
+        (users_synced_id,)
+    ).fetchall()
+    for user_id, username, role, hashed_password, full_name in rows:
+        fake_users_db[username] = {
+            "username": username,
+            "role": role,
+            "hashed_password": hashed_password,
+            "full_name": full_name
+        }
+        index_user(username, role, full_name)
+        users_synced_id = max(users_synced_id, user_id)
+
+LOCATION_COORDS_RE = re.compile(r"(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\]?\s*$")
+
+def parse_location_coordinates(location):
+    # Accepts "lat,lon" and the "NAME[lat,lon]" form stored by /sar-with-satellite
+    match = LOCATION_COORDS_RE.search(location or "")
+    if not match:
+        return None, None
+    return float(match.group(1)), float(match.group(2))
+
+def sync_sar_cases(conn, full=False):
+    columns = "id, emergency_type, location, urgency, status, created_at, updated_at, latitude, longitude"
+    if full or sar_triage.synced_until is None:
+        sar_triage.clear()
+        sar_spatial.clear()
+        cursor = conn.execute(f"SELECT {columns} FROM SARRequests WHERE status IN ('open', 'claimed')")
+    else:
+        # Overlap the window a little so rows committed out of timestamp order are not missed
+        since = sar_triage.synced_until - timedelta(seconds=5)
+        cursor = conn.execute(f"SELECT {columns} FROM SARRequests WHERE updated_at >= ?", (since,))
+    synced_until = sar_triage.synced_until
+    for row in cursor.fetchall():
+        case_id, emergency_type, location, urgency, case_status, created_at, updated_at, lat, lon = row
+        if lat is None or lon is None:
+            lat, lon = parse_location_coordinates(location)
+        sar_triage.upsert({
+            "id": case_id,
+            "emergency_type": emergency_type,
+            "location": location,
+            "urgency": urgency,
+            "status": case_status,
+            "created_at": created_at,
+            "lat": lat,
+            "lon": lon,
+        })
+        if lat is not None and lon is not None and case_status in ("open", "claimed"):
+            sar_spatial.upsert(case_id, lat, lon, {
+                "emergency_type": emergency_type,
+                "location": location,
+                "urgency": urgency,
+                "status": case_status,
+            })
+        else:
+            sar_spatial.remove(case_id)
+        if updated_at is not None and (synced_until is None or updated_at > synced_until):
+            synced_until = updated_at
+    sar_triage.synced_until = synced_until or datetime.now()
+
+DELIVERY_INDEX_COLUMNS = "id, destination, item, quantity, vehicle, status, assigned_vehicle_id, latitude, longitude"
+
+def index_delivery_row(row):
+    delivery_id, destination, item, quantity, vehicle, delivery_status, assigned_vehicle_id, lat, lon = row
+    if lat is None or lon is None:
+        delivery_spatial.remove(delivery_id)
+        return
+    delivery_spatial.upsert(delivery_id, lat, lon, {
+        "destination": destination,
+        "item": item,
+        "quantity": quantity,
+        "vehicle": vehicle,
+        "status": delivery_status,
+        "assigned_vehicle_id": assigned_vehicle_id,
+    })
+
+def sync_delivery_index(conn, full=False):
+    if full or delivery_spatial.synced_until is None:
+        delivery_spatial.clear()
+        last_id = 0
+    else:
+        last_id = delivery_spatial.synced_until
+    cursor = conn.execute(
+        f"SELECT {DELIVERY_INDEX_COLUMNS} FROM Deliveries "
+        "WHERE id > ? AND latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY id",
+        (last_id,)
+    )
+    for row in cursor.fetchall():
+        index_delivery_row(row)
+        last_id = max(last_id, row[0])
+    delivery_spatial.synced_until = last_id
+
+def refresh_delivery_entries(conn, delivery_ids):
+    # Status changes keep the row id, so the id cursor of sync_delivery_index never
+    # sees them: handlers that update deliveries re-read the rows they touched
+    delivery_ids = list(dict.fromkeys(delivery_ids))
+    for start in range(0, len(delivery_ids), 500):
+        chunk = delivery_ids[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(f"SELECT {DELIVERY_INDEX_COLUMNS} FROM Deliveries WHERE id IN ({placeholders})", chunk).fetchall()
+        for row in rows:
+            index_delivery_row(row)
+        for delivery_id in set(chunk) - {row[0] for row in rows}:
+            delivery_spatial.remove(delivery_id)
+
+def sync_patient_summaries(conn, full=False, severities=None):
+    # severities: {symptom id: score} overriding calculated_severity, for a worker whose
+    # rescore has not been written back (yet)
+    if full or patient_summaries.synced_until is None:
+        patient_summaries.clear()
+        rollups = conn.execute(
+            "SELECT patient, symptom_count, open_diagnoses, latest_id, latest_symptom, latest_severity, "
+            "latest_timestamp, updated_at FROM PatientSummaries"
+        ).fetchall()
+        readings = conn.execute(
+            "SELECT id, patient, calculated_severity, timestamp FROM Symptoms WHERE timestamp >= ? ORDER BY id",
+            (datetime.now() - timedelta(days=7),)
+        ).fetchall()
+        if readings:
+            patient_summaries.start_after(readings[0][0] - 1)
+        else:
+            patient_summaries.start_after(conn.execute("SELECT COALESCE(MAX(id), 0) FROM Symptoms").fetchone()[0])
+    else:
+        since = patient_summaries.synced_until - timedelta(seconds=5)
+        rollups = conn.execute(
+            "SELECT patient, symptom_count, open_diagnoses, latest_id, latest_symptom, latest_severity, "
+            "latest_timestamp, updated_at FROM PatientSummaries WHERE updated_at >= ?",
+            (since,)
+        ).fetchall()
+        readings = conn.execute(
+            "SELECT id, patient, calculated_severity, timestamp FROM Symptoms WHERE id > ? ORDER BY id",
+            (patient_summaries.last_symptom_id,)
+        ).fetchall()
+    synced_until = patient_summaries.synced_until
+    for row in rollups:
+        patient_summaries.apply_rollup(*row[:7])
+        if row[7] is not None and (synced_until is None or row[7] > synced_until):
+            synced_until = row[7]
+    for symptom_id, patient, severity, timestamp in readings:
+        if severities:
+            severity = severities.get(symptom_id, severity)
+        patient_summaries.apply_reading(symptom_id, patient, severity, timestamp)
+    patient_summaries.advance()
+    patient_summaries.synced_until = synced_until or datetime.now()
+
+def refresh_indexes(full=False):
+    conn = open_db_connection()
+    if conn is None:
+        return
+    try:
+        sync_sar_cases(conn, full=full)
+        sync_delivery_index(conn, full=full)
+        sync_patient_summaries(conn, full=full)
+        sync_user_directory(conn, full=full)
+    except Exception as e:
+        logging.error(f"Error syncing SAR/delivery indexes: {e}")
+    finally:
+        conn.close()
+
+async def index_sync_loop():
+    # Picks up rows created, claimed, completed or deleted through other workers
+    last_full = datetime.now()
+    while True:
+        await asyncio.sleep(INDEX_SYNC_SECONDS)
+        full = (datetime.now() - last_full).total_seconds() >= INDEX_FULL_REFRESH_SECONDS
+        if full:
+            last_full = datetime.now()
+        await asyncio.to_thread(refresh_indexes, full)
+
+group_writers = {}
+
+# Hooks run once per committed batch (or per write without group commit)
+AFTER_COMMIT_HOOKS = {
+    "Symptoms": lambda conn: sync_patient_summaries(conn),
+    "SARRequests": lambda conn: sync_sar_cases(conn),
+}
+
+def start_group_writers():
+    for table in GROUP_COMMIT_TABLES:
+        group_writers[table] = GroupCommitWriter(
+            table,
+            open_db_connection,
+            max_batch=GROUP_COMMIT_MAX_BATCH,
+            max_wait_ms=GROUP_COMMIT_MAX_WAIT_MS,
+            after_commit=AFTER_COMMIT_HOOKS.get(table),
+            fallback=(lambda query, params, table=table: spool_write(table, query, params)) if write_spool else None,
+        )
+
+def stop_group_writers():
+    for writer in group_writers.values():
+        writer.stop()
+    group_writers.clear()
+
+write_spool = WriteSpool(SPOOL_PATH) if SPOOL_ENABLED else None
+
+def spool_write(table, query, params):
+    key = write_spool.append(table, query, params)
+    logging.warning(f"Database unreachable, spooled write to {table} as {key}")
+    return key
+
+def sync_after_commit(sync, conn):
+    # The write is already committed: a failed index refresh is logged (index_sync_loop
+    # catches up) rather than turned into a 500 that makes clients retry the write
+    try:
+        sync(conn)
+    except Exception as e:
+        logging.error(f"Error refreshing in-memory indexes after commit: {e}")
+
+def run_after_commit_hook(table, conn):
+    hook = AFTER_COMMIT_HOOKS.get(table)
+    if hook is not None:
+        hook(conn)
+
+def submit_write(table, query, params):
+    # Returns a future that resolves once the write is committed (result None), or
+    # once it is in the local spool because the database is unreachable (result:
+    # its idempotency key). While older writes are still spooled, new ones queue
+    # behind them so replay keeps them in order.
+    future = Future()
+    if write_spool is not None and write_spool.has_pending():
+        future.set_result(spool_write(table, query, params))
+        return future
+    writer = group_writers.get(table)
+    if writer is not None:
+        return writer.submit(query, params)
+    conn = open_db_connection()
+    if conn is None:
+        if write_spool is None:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        future.set_result(spool_write(table, query, params))
+        return future
+    try:
+        conn.execute(query, params)
+        conn.commit()
+        future.set_result(None)
+    except Exception as e:
+        conn.rollback()
+        future.set_exception(e)
+    else:
+        try:
+            run_after_commit_hook(table, conn)
+        except Exception as e:
+            logging.error(f"Error in after-commit hook for {table}: {e}")
+    finally:
+        conn.close()
+    return future
+
+async def spool_replay_loop():
+    if write_spool is None:
+        return
+    while True:
+        await asyncio.sleep(SPOOL_REPLAY_SECONDS)
+        try:
+            if write_spool.has_pending():
+                replayed = await asyncio.to_thread(write_spool.replay, open_db_connection, run_after_commit_hook)
+                if replayed:
+                    logging.info(f"Replayed {replayed} spooled writes")
+                    dashboard_stats.invalidate()
+        except Exception as e:
+            logging.error(f"Error replaying write spool: {e}")
+
+severity_engine = SeverityEngine(half_life_hours=SEVERITY_HALF_LIFE_HOURS)
+
+def rescore_symptoms(write_back=True):
+    # Replays the last SEVERITY_HISTORY_DAYS of readings to rebuild the scoring state and
+    # the summary maxima, and optionally writes back every calculated_severity that changed
+    conn = open_db_connection()
+    if conn is None:
+        return None
+    try:
+        since = datetime.now() - timedelta(days=SEVERITY_HISTORY_DAYS)
+        rows = conn.execute(
+            "SELECT id, patient, symptom, user_severity, calculated_severity, timestamp "
+            "FROM Symptoms WHERE timestamp >= ?",
+            (since,)
+        ).fetchall()
+        scores = severity_engine.rescore(
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+            [row[3] for row in rows],
+            [row[5] for row in rows],
+        )
+        changed = [(int(score), row[0]) for row, score in zip(rows, scores) if row[4] != score]
+        if write_back and changed:
+            cursor = conn.cursor()
+            cursor.executemany("UPDATE Symptoms SET calculated_severity = ? WHERE id = ?", changed)
+            conn.commit()
+        if changed:
+            # The 24h/7d maxima are built from calculated_severity; use the new scores
+            # whether or not this worker is the one writing them back
+            sync_patient_summaries(conn, full=True, severities={symptom_id: score for score, symptom_id in changed})
+        return {"scored": len(rows), "changed": len(changed), "written": write_back}
+    except Exception as e:
+        logging.error(f"Error rescoring symptoms: {e}")
+        return None
+    finally:
+        conn.close()
+
+async def nightly_rescore_loop():
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=SEVERITY_RESCORE_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        # Every worker rebuilds its own engine and summaries; one writes the scores back
+        write_back = await asyncio.to_thread(is_leader, "nightly-rescore", 3600)
+        result = await asyncio.to_thread(rescore_symptoms, write_back)
+        logging.info(f"Nightly severity rescoring: {result}")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -103,8 +829,24 @@ def get_user(db, username: str):
     if username in db:
         return UserInDB(**db[username])
 
-def authenticate_user(username: str, password: str):
+def lookup_user(username):
+    # index_sync_loop refreshes the local copy of Users; on a miss the table is read
+    # at once, so an account created through another worker can log in straight away
     user = get_user(fake_users_db, username)
+    if user is None:
+        conn = open_db_connection()
+        if conn is not None:
+            try:
+                sync_user_directory(conn)
+            except Exception as e:
+                logging.error(f"User lookup failed: {e}")
+            finally:
+                conn.close()
+            user = get_user(fake_users_db, username)
+    return user
+
+def authenticate_user(username: str, password: str):
+    user = lookup_user(username)
     if not user or not verify_password(password, user.hashed_password):
         return None
     return user
@@ -112,7 +854,7 @@ def authenticate_user(username: str, password: str):
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -129,7 +871,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(fake_users_db, username)
+    if payload.get("jti") and await store_call(shared_store.is_revoked, payload["jti"]):
+        raise credentials_exception
+    user = get_user(fake_users_db, username) or await asyncio.to_thread(lookup_user, username)
     if user is None:
         raise credentials_exception
     return user
@@ -156,42 +900,131 @@ def fetch_satellite_data(area, start_date, end_date):
         logging.error(f"Error fetching satellite data: {e}")
         return {}
 
-def reverse_geocode(lat, lon):
-    try:
-        response = requests.get(f"https://nominatim.openstreetmap.org/reverse", params={
+def nominatim_fetch(kind, query):
+    if kind == "reverse":
+        lat, lon = query
+        response = requests.get("https://nominatim.openstreetmap.org/reverse", params={
             "lat": lat,
             "lon": lon,
             "format": "json"
-        })
+        }, headers={"User-Agent": GEOCODE_USER_AGENT}, timeout=10)
         response.raise_for_status()
         data = response.json()
         logging.info(f"Reverse geocoding response: {data}")
-        return data.get("display_name", f"{lat}, {lon}")
+        return data.get("display_name")
+    response = requests.get(
+        "https://nominatim.openstreetmap.org/search",
+        params={"q": query, "format": "json"},
+        headers={"User-Agent": GEOCODE_USER_AGENT},
+        timeout=10
+    )
+    response.raise_for_status()
+    results = response.json()
+    logging.info(f"Geocoding '{query}' results: {results}")
+    if results:
+        return float(results[0]["lat"]), float(results[0]["lon"])
+    return None, None
+
+geocoder = GeocodingWorker(
+    nominatim_fetch,
+    rate=GEOCODE_RATE_PER_SECOND,
+    take=lambda: shared_store.take("geocode", GEOCODE_RATE_PER_SECOND, 1),
+    max_queue=GEOCODE_QUEUE_MAX,
+)
+
+def reverse_geocode(lat, lon, priority=PRIORITY_UI):
+    try:
+        return geocoder.reverse(lat, lon, priority, timeout=GEOCODE_TIMEOUT_SECONDS) or f"{lat}, {lon}"
+    except TimeoutError:
+        logging.warning(f"Reverse geocoding of {lat}, {lon} timed out in the queue")
+        return f"{lat}, {lon}"
+    except GeocodingBusy as e:
+        logging.warning(f"Reverse geocoding of {lat}, {lon} refused: {e}")
+        return f"{lat}, {lon}"
     except Exception as e:
         logging.error(f"Error in reverse geocoding: {e}")
         return f"{lat}, {lon}"
 
-def geocode_location(location_name):
+def geocode_location(location_name, priority=PRIORITY_UI):
     try:
-        response = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"q": location_name, "format": "json"}
-        )
-        response.raise_for_status()
-        results = response.json()
-        logging.info(f"Geocoding '{location_name}' results: {results}")
-        if results:
-            lat = results[0]["lat"]
-            lon = results[0]["lon"]
-            return float(lat), float(lon)
-        else:
-            return None, None
+        return geocoder.geocode(location_name, priority, timeout=GEOCODE_TIMEOUT_SECONDS)
+    except TimeoutError:
+        logging.warning(f"Geocoding '{location_name}' timed out in the queue")
+        return None, None
+    except GeocodingBusy as e:
+        logging.warning(f"Geocoding '{location_name}' refused: {e}")
+        return None, None
     except Exception as e:
         logging.error(f"Error in geocoding: {e}")
         return None, None
 
+def load_scenes(product_ids):
+    conn = get_read_connection("/satellite/scenes")
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    scenes = {}
+    try:
+        for i in range(0, len(product_ids), 500):
+            chunk = product_ids[i:i + 500]
+            for product_id, metadata in conn.execute(
+                f"SELECT product_id, metadata FROM SatelliteScenes WHERE product_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchall():
+                scenes[product_id] = decode_metadata(metadata)
+    finally:
+        conn.close()
+    return scenes
+
+scene_cache = SceneCache(load_scenes, max_scenes=SCENE_CACHE_SIZE)
+
+def save_scenes(conn, products):
+    # Inserts the scenes not stored yet and returns the satellite_data value for the
+    # SAR row, a JSON list of their product ids. The caller commits.
+    rows = scene_rows(products)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO SatelliteScenes (product_id, title, platform, begin_position, cloud_cover, metadata) "
+        "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM SatelliteScenes WHERE product_id = ?)",
+        [row + (row[0],) for row in rows]
+    )
+    return json.dumps([row[0] for row in rows]), rows
+
+def store_scenes(products):
+    # satellite_data for a new or updated SAR row. Anything that is not a product
+    # document, or scenes that cannot be saved right now (the row may be spooled),
+    # is stored inline as before; hydrate_scenes reads both forms.
+    if not products:
+        return "[]"
+    if not all(isinstance(properties, dict) for properties in products.values()):
+        return json.dumps(products, default=str)
+    conn = open_db_connection()
+    if conn is None:
+        return json.dumps(products, default=str)
+    try:
+        refs, rows = save_scenes(conn, products)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Could not store satellite scenes, keeping them inline: {e}")
+        return json.dumps(products, default=str)
+    finally:
+        conn.close()
+    for row in rows:
+        scene_cache.put(row[0], decode_metadata(row[5]))
+    return refs
+
+def hydrate_scenes(values):
+    # satellite_data column values -> {product_id: metadata} per value, with one
+    # lookup for all the referenced scenes that are not cached
+    parsed = [parse_scene_refs(value) for value in values]
+    scenes = scene_cache.get_many([product_id for ids, inline in parsed if not inline for product_id in ids])
+    return [
+        inline if inline else {product_id: scenes[product_id] for product_id in ids if product_id in scenes}
+        for ids, inline in parsed
+    ]
+
 def format_json_column(df, column_name):
-    df[column_name] = df[column_name].apply(lambda x: json.dumps(json.loads(x), indent=2) if x else "{}")
+    df[column_name] = df[column_name].apply(lambda x: json.dumps(json.loads(x), separators=(",", ":")) if x else "{}")
     return df
 
 @app.post("/token")
@@ -209,143 +1042,1032 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         "role": user.role
     }
 
+@app.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme), current_user: User = Depends(get_current_user)):
+    # Revokes this token in every worker until it would have expired anyway
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if not payload.get("jti"):
+        raise HTTPException(status_code=400, detail="This token cannot be revoked; it expires on its own")
+    await store_call(shared_store.revoke, payload["jti"], payload["exp"])
+    return {"message": f"Logged out {current_user.username}"}
+
 @app.post("/submit-symptoms")
 async def submit_symptoms(
-    symptoms: dict,
+    symptoms: SymptomReport,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
-    symptom = symptoms.get("symptom", "").lower()
-    user_severity = symptoms.get("severity", 1)
-    calculated_severity = user_severity  # or your logic
+    symptom = symptoms.symptom.lower()
+    user_severity = symptoms.severity
+    timestamp = datetime.now()  # Use datetime.now() if your column is DATETIME
+    # Scored without touching the engine: a reading that is never saved must not
+    # shift the patient's level and trend
+    calculated_severity = severity_engine.score(current_user.username, symptom, user_severity, timestamp, commit=False)
     entry = {
         "patient": current_user.username,
         "symptom": symptom,
         "user_severity": user_severity,
         "calculated_severity": min(calculated_severity, 10),
-        "timestamp": datetime.now()  # Use datetime.now() if your column is DATETIME
+        "timestamp": timestamp
     }
+    # One batch, so SCOPE_IDENTITY() sees the new Symptoms row and the rollup
+    # commits together with it
+    query = """
+    INSERT INTO Symptoms (patient, symptom, user_severity, calculated_severity, timestamp)
+    VALUES (?, ?, ?, ?, ?);
+    MERGE INTO PatientSummaries AS target
+    USING (SELECT ? AS patient, CAST(SCOPE_IDENTITY() AS INT) AS latest_id, ? AS latest_symptom,
+                  ? AS latest_severity, ? AS latest_timestamp) AS source
+    ON target.patient = source.patient
+    WHEN MATCHED THEN
+        UPDATE SET symptom_count = target.symptom_count + 1, open_diagnoses = target.open_diagnoses + 1,
+            latest_id = source.latest_id, latest_symptom = source.latest_symptom,
+            latest_severity = source.latest_severity, latest_timestamp = source.latest_timestamp,
+            updated_at = GETDATE()
+    WHEN NOT MATCHED THEN
+        INSERT (patient, symptom_count, open_diagnoses, latest_id, latest_symptom, latest_severity, latest_timestamp, updated_at)
+        VALUES (source.patient, 1, 1, source.latest_id, source.latest_symptom, source.latest_severity, source.latest_timestamp, GETDATE());
+    """
+    future = submit_write("Symptoms", query, (
+        entry["patient"],
+        entry["symptom"],
+        entry["user_severity"],
+        entry["calculated_severity"],
+        entry["timestamp"],
+        entry["patient"],
+        entry["symptom"],
+        entry["calculated_severity"],
+        entry["timestamp"]
+    ))
+    try:
+        spooled = await asyncio.wrap_future(future)
+    except Exception as e:
+        logging.error(f"Error in /submit-symptoms: {e}")
+        raise HTTPException(status_code=500, detail="Could not save symptoms")
+    # Saved, or spooled for replay: either way the reading counts from now on, and
+    # the nightly rescore reconciles the engine with what the table ends up holding
+    severity_engine.score(current_user.username, symptom, user_severity, timestamp)
+    if spooled:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {**entry, "queued": True, "idempotency_key": spooled}
+    return entry
+
+@app.get("/patient-symptoms")
+async def get_patient_symptoms(
+    patient: str,
+    include_archive: bool = Query(False),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    conn = get_read_connection("/patient-symptoms")
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        # Adjust table/column names as needed
+        query = "SELECT * FROM Symptoms WHERE patient = ?"
+        df = pd.read_sql(query, conn, params=[patient])
+        if include_archive:
+            df = with_archive(df, "Symptoms", [("patient", "==", patient)])
+        return df.to_dict(orient="records")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+
+@app.post("/update-diagnosis")
+def update_diagnosis(
+    updates: list[dict] = Body(...),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    rows = [row for row in updates if row.get("id") is not None]
+    if not rows:
+        raise HTTPException(status_code=400, detail="Each row needs the Symptoms id")
     conn = get_db_connection()
     if conn is None:
-        raise HTTPException(status_code=500, detail="Database connection failed")
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        ids = [int(row["id"]) for row in rows]
+        placeholders = ", ".join("?" for _ in ids)
+        previous = {
+            symptom_id: (patient, diagnosis)
+            for symptom_id, patient, diagnosis in conn.execute(
+                f"SELECT id, patient, diagnosis FROM Symptoms WHERE id IN ({placeholders})", ids
+            ).fetchall()
+        }
+        open_delta = {}
+        for row in rows:
+            symptom_id = int(row["id"])
+            if symptom_id not in previous:
+                continue
+            patient, old_diagnosis = previous[symptom_id]
+            diagnosis = (row.get("diagnosis") or "").strip() or None
+            conn.execute(
+                "UPDATE Symptoms SET diagnosis = ?, treatment_guidance = ? WHERE id = ?",
+                (diagnosis, (row.get("treatment_guidance") or "").strip() or None, symptom_id)
+            )
+            was_open = not (old_diagnosis or "").strip()
+            is_open = diagnosis is None
+            if was_open != is_open:
+                open_delta[patient] = open_delta.get(patient, 0) + (1 if is_open else -1)
+        for patient, delta in open_delta.items():
+            conn.execute(
+                "UPDATE PatientSummaries SET open_diagnoses = open_diagnoses + ?, updated_at = GETDATE() WHERE patient = ?",
+                (delta, patient)
+            )
+        conn.commit()
+        sync_patient_summaries(conn)
+        return {"message": "Diagnosis updated", "updated": len([i for i in ids if i in previous])}
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error updating diagnosis: {e}")
+    finally:
+        conn.close()
+
+@app.post("/users")
+def create_user(new_user: NewUser, current_user: User = Depends(require_role("medical_staff"))):
+    if new_user.role not in ("patient", "medical_staff"):
+        raise HTTPException(status_code=400, detail="Role must be 'patient' or 'medical_staff'")
+    if new_user.username in fake_users_db:
+        raise HTTPException(status_code=409, detail="Username already exists")
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        conn.execute(
+            "INSERT INTO Users (username, role, hashed_password, full_name) VALUES (?, ?, ?, ?)",
+            (new_user.username, new_user.role, pwd_context.hash(new_user.password), new_user.full_name)
+        )
+        conn.commit()
+        sync_user_directory(conn)
+        return {"message": f"User {new_user.username} created"}
+    except pyodbc.IntegrityError:
+        # Created through another worker that this one has not synced yet
+        conn.rollback()
+        sync_user_directory(conn)
+        raise HTTPException(status_code=409, detail="Username already exists")
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating user: {e}")
+    finally:
+        conn.close()
+
+@app.get("/patients/directory")
+def search_patient_directory(
+    q: str = Query(""),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    usernames, has_more = patient_directory.search(q, offset=offset, limit=limit)
+    return {
+        "results": [
+            {"username": username, "full_name": fake_users_db.get(username, {}).get("full_name")}
+            for username in usernames
+        ],
+        "offset": offset,
+        "has_more": has_more
+    }
+
+@app.get("/patients/summary")
+def get_patient_summaries(
+    patient: Optional[str] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    now = datetime.now()
+    if patient is not None:
+        summary = patient_summaries.get(patient, now)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="No symptoms recorded for this patient")
+        return summary
+    return {"total": len(patient_summaries), "patients": patient_summaries.page(now, offset, limit)}
+
+@app.post("/symptoms/rescore")
+def rescore_all_symptoms(current_user: User = Depends(require_role("medical_staff"))):
+    result = rescore_symptoms()
+    if result is None:
+        raise HTTPException(status_code=500, detail="Severity rescoring failed")
+    return result
+
+@app.get("/symptoms/severity-state")
+def get_severity_state(patient: str, current_user: User = Depends(require_role("medical_staff"))):
+    state = severity_engine.state(patient)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No recent symptoms for this patient")
+    return state
+
+@app.post("/create-video-session")
+async def create_video_session(current_user: User = Depends(get_current_user)):
+    room_id = str(uuid.uuid4())
+    jitsi_url = f"https://meet.jit.si/{room_id}"
+    # The session's chat room shares its id; if this cannot be stored the chat still works
+    try:
+        await asyncio.wrap_future(submit_write(
+            "ChatRooms",
+            "INSERT INTO ChatRooms (room_id, created_by, created_at) VALUES (?, ?, ?)",
+            (room_id, current_user.username, datetime.now())
+        ))
+    except Exception as e:
+        logging.error(f"Error saving chat room {room_id}: {e}")
+    chat_hub.open(room_id, owner=current_user.username)
+    return {
+        "message": f"Video session created by {current_user.username}",
+        "video_url": jitsi_url,
+        "room_id": room_id,
+        "chat_url": f"/chat/{room_id}"
+    }
+
+chat_hub = ChatHub(history_size=CHAT_HISTORY_SIZE)
+chat_writer = None
+chat_synced_until = None
+
+def start_chat_writer():
+    global chat_writer
+    chat_writer = GroupCommitWriter(
+        "ChatMessages",
+        open_db_connection,
+        max_batch=256,
+        max_wait_ms=CHAT_FLUSH_MS,
+        fallback=(lambda query, params: spool_write("ChatMessages", query, params)) if write_spool else None,
+    )
+
+def stop_chat_writer():
+    global chat_writer
+    if chat_writer is not None:
+        chat_writer.stop()
+        chat_writer = None
+
+def chat_message_from_row(row):
+    message_id, room_id, sender, role, kind, text, created_at = row
+    return {
+        "id": message_id,
+        "room_id": room_id,
+        "sender": sender,
+        "role": role,
+        "kind": kind,
+        "text": text,
+        "timestamp": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+    }
+
+def load_chat_room(room_id):
+    # Returns (creator, recent messages oldest first), or None if the room does not
+    # exist. While the database is unreachable any room id is accepted, with no
+    # history and no known creator.
+    conn = open_db_connection()
+    if conn is None:
+        return None, []
+    try:
+        row = conn.execute("SELECT created_by FROM ChatRooms WHERE room_id = ?", (room_id,)).fetchone()
+        if row is None:
+            return None
+        rows = conn.execute(
+            "SELECT message_id, room_id, sender, role, kind, text, created_at FROM ChatMessages "
+            "WHERE room_id = ? ORDER BY created_at DESC, id DESC",
+            (room_id,)
+        ).fetchmany(CHAT_HISTORY_SIZE)
+        return row[0], [chat_message_from_row(row) for row in reversed(rows)]
+    finally:
+        conn.close()
+
+async def ensure_chat_room(room_id):
+    # Returns False if there is no such room; a room whose creator is not known yet
+    # is looked up again
+    if chat_hub.owner(room_id) is not None:
+        return True
+    loaded = await asyncio.to_thread(load_chat_room, room_id)
+    if loaded is None:
+        return False
+    owner, history = loaded
+    chat_hub.open(room_id, history, owner)
+    return True
+
+def may_join_chat(user, room_id):
+    # A session's room is for the user who opened it and for medical staff
+    return user.role == "medical_staff" or user.username == chat_hub.owner(room_id)
+
+def log_chat_write_error(future):
+    if future.exception() is not None:
+        logging.error(f"Error saving chat message: {future.exception()}")
+
+def post_chat_message(room_id, user, kind, text):
+    # Delivered to the room at once; persisted by the chat writer in the background
+    now = datetime.now()
+    message = {
+        "id": uuid.uuid4().hex,
+        "room_id": room_id,
+        "sender": user.username,
+        "role": user.role,
+        "kind": kind,
+        "text": text,
+        "timestamp": now.isoformat(),
+    }
+    chat_hub.publish(room_id, message)
+    if chat_writer is not None:
+        future = chat_writer.submit(
+            "INSERT INTO ChatMessages (message_id, room_id, sender, role, kind, text, created_at, origin) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (message["id"], room_id, user.username, user.role, kind, text, now, WORKER_ID)
+        )
+        future.add_done_callback(log_chat_write_error)
+    return message
+
+def validate_chat_message(user, kind, text):
+    if kind not in CHAT_KINDS:
+        return f"kind must be one of {', '.join(sorted(CHAT_KINDS))}"
+    if kind == "diagnosis" and user.role != "medical_staff":
+        return "Only medical staff can send a diagnosis"
+    if not text or not text.strip():
+        return "Message text is required"
+    if len(text) > CHAT_MAX_MESSAGE_CHARS:
+        return f"Messages are limited to {CHAT_MAX_MESSAGE_CHARS} characters"
+    return None
+
+def fetch_remote_chat_messages(since):
+    conn = open_db_connection()
+    if conn is None:
+        return None
+    try:
+        return conn.execute(
+            "SELECT message_id, room_id, sender, role, kind, text, created_at FROM ChatMessages "
+            "WHERE created_at >= ? AND origin <> ? ORDER BY created_at, id",
+            (since, WORKER_ID)
+        ).fetchall()
+    finally:
+        conn.close()
+
+async def chat_sync_loop():
+    # Delivers messages sent through other workers to rooms open here; the 5s
+    # overlap covers batches committed late, and rooms drop duplicates by id
+    global chat_synced_until
+    chat_synced_until = datetime.now()
+    while True:
+        await asyncio.sleep(CHAT_SYNC_SECONDS)
+        try:
+            chat_hub.evict_idle(CHAT_ROOM_IDLE_SECONDS)
+            if not len(chat_hub):
+                chat_synced_until = datetime.now()
+                continue
+            rows = await asyncio.to_thread(fetch_remote_chat_messages, chat_synced_until - timedelta(seconds=5))
+            if rows is None:
+                continue
+            for row in rows:
+                if row[1] in chat_hub:
+                    chat_hub.publish(row[1], chat_message_from_row(row))
+                chat_synced_until = max(chat_synced_until, row[6])
+        except Exception as e:
+            logging.error(f"Error syncing chat messages: {e}")
+
+@app.websocket("/chat/{room_id}")
+async def chat_websocket(websocket: WebSocket, room_id: str, token: str = Query(...)):
+    # Browsers cannot set headers on a WebSocket, so the access token comes as ?token=
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    if not await ensure_chat_room(room_id):
+        await websocket.close(code=4404)
+        return
+    if not may_join_chat(user, room_id):
+        await websocket.close(code=4403)
+        return
+    await websocket.accept()
+    subscriber = chat_hub.subscribe(room_id)
+    await websocket.send_json({"type": "history", "messages": chat_hub.recent(room_id)})
+
+    async def send_messages():
+        while True:
+            batch = await subscriber.next_batch()
+            if batch is None:
+                await websocket.close(code=4408)
+                return
+            for message in batch:
+                await websocket.send_json({"type": "message", **message})
+
+    async def receive_messages():
+        while True:
+            data = await websocket.receive_json()
+            kind = data.get("kind", "message")
+            text = data.get("text", "")
+            error = validate_chat_message(user, kind, text)
+            if error:
+                await websocket.send_json({"type": "error", "detail": error})
+            else:
+                post_chat_message(room_id, user, kind, text)
+
+    tasks = [asyncio.create_task(send_messages()), asyncio.create_task(receive_messages())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                logging.error(f"Chat connection to {room_id} failed: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        chat_hub.unsubscribe(room_id, subscriber)
+
+@app.get("/chat/{room_id}/messages")
+async def get_chat_messages(room_id: str, limit: int = Query(50, ge=1, le=500), current_user: User = Depends(get_current_user)):
+    if not await ensure_chat_room(room_id):
+        raise HTTPException(status_code=404, detail="Chat room not found")
+    if not may_join_chat(current_user, room_id):
+        raise HTTPException(status_code=403, detail="Not a member of this chat room")
+    return chat_hub.recent(room_id, limit)
+
+@app.post("/chat/{room_id}/messages")
+async def send_chat_message(room_id: str, message: dict, current_user: User = Depends(get_current_user)):
+    kind = message.get("kind", "message")
+    text = message.get("text", "")
+    error = validate_chat_message(current_user, kind, text)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    if not await ensure_chat_room(room_id):
+        raise HTTPException(status_code=404, detail="Chat room not found")
+    if not may_join_chat(current_user, room_id):
+        raise HTTPException(status_code=403, detail="Not a member of this chat room")
+    return post_chat_message(room_id, current_user, kind, text)
+
+@app.get("/chat/stats")
+def get_chat_stats(current_user: User = Depends(require_role("medical_staff"))):
+    return {**chat_hub.stats(), "writer": chat_writer.stats() if chat_writer is not None else None}
+
+@app.post("/trigger-alert")
+async def trigger_alert(response: Response, current_user: User = Depends(get_current_user)):
+    query = """
+    INSERT INTO Alerts (alert_id, patient, status)
+    VALUES (?, ?, ?)
+    """
+    alert_id = f"ALERT-{uuid.uuid4().hex[:6].upper()}"
+    try:
+        spooled = await asyncio.wrap_future(submit_write("Alerts", query, (alert_id, current_user.username, "active")))
+    except Exception as e:
+        logging.error(f"Error in /trigger-alert: {e}")
+        raise HTTPException(status_code=500, detail="Could not save alert")
+    if spooled:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": f"Alert queued for {current_user.username}", "alert_id": alert_id, "queued": True, "idempotency_key": spooled}
+    dashboard_stats.add("alerts", "active")
+    return {"message": f"Alert triggered by {current_user.username}", "alert_id": alert_id}
+
+@app.get("/active-alerts")
+def get_active_alerts(status: Optional[str] = Query(None), include_archive: bool = Query(False)):
+    conn = get_read_connection("/active-alerts")
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    if status:
+        query = "SELECT * FROM Alerts WHERE status = ?"
+        df = pd.read_sql(query, conn, params=[status])
+    else:
+        query = "SELECT * FROM Alerts"
+        df = pd.read_sql(query, conn)
+    conn.close()
+    if include_archive:
+        df = with_archive(df, "Alerts", [("status", "==", status)] if status else None)
+    return df.to_dict(orient="records")
+
+cold_archive = ParquetArchive(ARCHIVE_DIR)
+
+# Per table: time column, key column, retention, and which old rows must stay hot
+ARCHIVE_POLICIES = {
+    "Symptoms": {"time": "timestamp", "key": "id", "days": SYMPTOMS_RETENTION_DAYS, "keep": ""},
+    "Alerts": {"time": "trigger_time", "key": "alert_id", "days": ALERTS_RETENTION_DAYS, "keep": " AND status <> 'active'"},
+}
+
+def with_archive(df, table, filters=None):
+    policy = ARCHIVE_POLICIES[table]
+    cold = cold_archive.read(table, policy["key"], policy["time"], filters=filters)
+    if cold.empty:
+        return df
+    df = pd.concat([cold, df], ignore_index=True).drop_duplicates(subset=policy["key"], keep="last")
+    return df.astype(object).where(df.notna(), None)
+
+def archive_table(table, lock=None):
+    # Moves old rows a batch at a time: each batch is written to Parquet and
+    # fsynced before its hot rows are deleted in a short transaction of their own.
+    # The archiver lock is refreshed between batches and the run stops if it was lost.
+    policy = ARCHIVE_POLICIES[table]
+    cutoff = datetime.now() - timedelta(days=policy["days"])
+    moved = 0
+    while True:
+        conn = open_db_connection()
+        if conn is None:
+            return moved
+        try:
+            cursor = conn.execute(
+                f"SELECT * FROM {table} WHERE {policy['time']} < ?{policy['keep']} ORDER BY {policy['key']}",
+                (cutoff,)
+            )
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchmany(ARCHIVE_BATCH_ROWS)
+            cursor.close()
+            if not rows:
+                return moved
+            df = pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+            cold_archive.write(table, df, policy["time"], policy["key"])
+            keys = df[policy["key"]].tolist()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                conn.execute(
+                    f"DELETE FROM {table} WHERE {policy['key']} IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+            conn.commit()
+            moved += len(rows)
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error archiving {table}: {e}")
+            return moved
+        finally:
+            conn.close()
+        if len(rows) < ARCHIVE_BATCH_ROWS:
+            return moved
+        if lock is not None and not lock.refresh():
+            logging.error(f"Archiver lock lost while archiving {table}; stopping")
+            return moved
+        time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+
+def run_archival():
+    # One archiver at a time across workers sharing ARCHIVE_DIR
+    lock = LockFile(os.path.join(ARCHIVE_DIR, ".archiver.lock"))
+    if not lock.acquire():
+        return None
+    moved = {}
+    try:
+        for table in ARCHIVE_POLICIES:
+            moved[table] = archive_table(table, lock)
+            if not lock.held:
+                return moved
+        prune_change_log()
+        current_month = datetime.now().strftime("%Y-%m")
+        for table, policy in ARCHIVE_POLICIES.items():
+            for month in cold_archive.months(table):
+                if month < current_month:
+                    if not lock.refresh():
+                        logging.error("Archiver lock lost during compaction; stopping")
+                        return moved
+                    cold_archive.compact(table, month, policy["key"])
+        return moved
+    finally:
+        lock.release()
+        if any(moved.values()):
+            logging.info(f"Archived rows: {moved}")
+            dashboard_stats.invalidate()
+
+async def archive_loop():
+    if ARCHIVE_INTERVAL_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        if not await asyncio.to_thread(is_leader, "archive", ARCHIVE_INTERVAL_SECONDS * 2):
+            continue
+        try:
+            await asyncio.to_thread(run_archival)
+        except Exception as e:
+            logging.error(f"Error in archival: {e}")
+
+@app.post("/archive/run")
+def run_archival_now(current_user: User = Depends(require_role("medical_staff"))):
+    moved = run_archival()
+    if moved is None:
+        raise HTTPException(status_code=409, detail="Archival is already running")
+    return {"archived": moved}
+
+@app.get("/archive/stats")
+def get_archive_stats(current_user: User = Depends(require_role("medical_staff"))):
+    return {"path": ARCHIVE_DIR, "tables": cold_archive.stats()}
+
+# Change feed entity -> (table, key column); "supplies" is derived from the supply ledger
+CHANGE_FEED_ENTITIES = {
+    "sar_requests": ("SARRequests", "id"),
+    "alerts": ("Alerts", "alert_id"),
+    "deliveries": ("Deliveries", "id"),
+    "supplies": ("SupplyMovements", "item"),
+}
+
+def record_tombstone(conn, entity, entity_id):
+    # For deletes the triggers cannot see, such as an item written out of stock
+    conn.execute("INSERT INTO ChangeLog (entity, entity_id, op) VALUES (?, ?, 'delete')", (entity, str(entity_id)))
+
+def prune_change_log():
+    # Drops old entries and remembers the newest dropped version, so a client whose
+    # cursor is older than that is told to reload instead of silently missing changes
+    conn = open_db_connection()
+    if conn is None:
+        return 0
+    try:
+        cutoff = datetime.now() - timedelta(days=CHANGE_FEED_RETENTION_DAYS)
+        pruned_to = conn.execute(
+            "SELECT MAX(CAST(version AS BIGINT)) FROM ChangeLog WHERE changed_at < ? AND op <> 'pruned'", (cutoff,)
+        ).fetchone()[0]
+        if pruned_to is None:
+            return 0
+        cursor = conn.execute(
+            "DELETE FROM ChangeLog WHERE version <= CAST(CAST(? AS BIGINT) AS BINARY(8)) AND op <> 'pruned'", (pruned_to,)
+        )
+        pruned = cursor.rowcount
+        conn.execute("DELETE FROM ChangeLog WHERE op = 'pruned'")
+        conn.execute("INSERT INTO ChangeLog (entity, entity_id, op) VALUES ('*', ?, 'pruned')", (str(pruned_to),))
+        conn.commit()
+        logging.info(f"Pruned {pruned} change log entries up to version {pruned_to}")
+        return pruned
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error pruning change log: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def change_feed_frame_rows(df, table, key):
+    if table == "SARRequests":
+        df = format_json_column(df, "satellite_data")
+    df = df.astype(object).where(df.notna(), None)
+    return {str(row[key]): row for row in df.to_dict(orient="records")}
+
+def change_feed_rows(conn, entity, ids):
+    # Current state of changed rows as {id: row}; ids missing from the result were deleted
+    table, key = CHANGE_FEED_ENTITIES[entity]
+    if entity == "supplies":
+        stock, _ = supply_stock(conn)
+        return {item: {"item": item, "quantity": stock[item]} for item in ids if item in stock}
+    rows = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        df = pd.read_sql(f"SELECT * FROM {table} WHERE {key} IN ({', '.join('?' * len(chunk))})", conn, params=chunk)
+        rows.update(change_feed_frame_rows(df, table, key))
+    return rows
+
+def change_feed_all_rows(conn, entity):
+    table, key = CHANGE_FEED_ENTITIES[entity]
+    if entity == "supplies":
+        stock, _ = supply_stock(conn)
+        return [{"item": item, "quantity": quantity} for item, quantity in sorted(stock.items())]
+    return list(change_feed_frame_rows(pd.read_sql(f"SELECT * FROM {table}", conn), table, key).values())
+
+@app.get("/changes")
+def get_changes(
+    since: int = Query(0, ge=0),
+    entities: Optional[str] = Query(None),
+    limit: int = Query(CHANGE_FEED_PAGE_SIZE, ge=1, le=5000),
+    snapshot: bool = Query(False)
+):
+    # Inserts, updates and deletes after the cursor, oldest first. since=0, or a cursor
+    # older than the retained log, answers reset=true with a fresh cursor: reload the
+    # full lists, then poll from that cursor. With snapshot=true a reset also carries
+    # the full lists, read from the primary after the cursor was taken, so a lagging
+    # replica can never hand out rows older than the cursor.
+    names = [name.strip() for name in entities.split(",")] if entities else list(CHANGE_FEED_ENTITIES)
+    unknown = [name for name in names if name not in CHANGE_FEED_ENTITIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown entities: {', '.join(unknown)}")
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        pruned = conn.execute("SELECT entity_id FROM ChangeLog WHERE op = 'pruned'").fetchone()
+        if since == 0 or (pruned is not None and since < int(pruned[0])):
+            # Versions below MIN_ACTIVE_ROWVERSION() are final: no open transaction can still add one
+            cursor = conn.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT) - 1").fetchone()[0]
+            reset = {"reset": True, "cursor": cursor, "has_more": False, "changes": []}
+            if snapshot:
+                reset["rows"] = {name: change_feed_all_rows(conn, name) for name in names}
+            return reset
+        entries = conn.execute(
+            f"""
+            SELECT CAST(version AS BIGINT), entity, entity_id, op FROM ChangeLog
+            WHERE version > CAST(CAST(? AS BIGINT) AS BINARY(8)) AND version < MIN_ACTIVE_ROWVERSION()
+            AND entity IN ({', '.join('?' * len(names))})
+            ORDER BY version
+            """,
+            [since, *names]
+        ).fetchmany(limit)
+        # Only the last entry per row matters; upserts are answered with the row as it is now
+        latest = {}
+        for version, entity, entity_id, op in entries:
+            latest.pop((entity, entity_id), None)
+            latest[(entity, entity_id)] = (version, op)
+        upserts = {}
+        for (entity, entity_id), (_, op) in latest.items():
+            if op == "upsert":
+                upserts.setdefault(entity, []).append(entity_id)
+        current = {entity: change_feed_rows(conn, entity, ids) for entity, ids in upserts.items()}
+    finally:
+        conn.close()
+    changes = []
+    for (entity, entity_id), (version, op) in latest.items():
+        row = current.get(entity, {}).get(entity_id) if op == "upsert" else None
+        changes.append({
+            "entity": entity,
+            "id": int(entity_id) if entity_id.isdigit() and entity != "supplies" else entity_id,
+            "op": "upsert" if row is not None else "delete",
+            "version": version,
+            "row": row,
+        })
+    return {
+        "reset": False,
+        "cursor": entries[-1][0] if entries else since,
+        "has_more": len(entries) == limit,
+        "changes": changes,
+    }
+
+APPEND_ONLY_TABLES = {"SupplyMovements"}
+
+def supply_stock(conn, as_of=None):
+    # Returns ({item: quantity}, movement id the result is current to)
+    if as_of is None:
+        base = conn.execute("SELECT MAX(movement_id) FROM SupplySnapshots").fetchone()[0] or 0
+        tail = conn.execute(
+            "SELECT id, item, kind, quantity FROM SupplyMovements WHERE id > ? ORDER BY id", (base,)
+        ).fetchall()
+    else:
+        base = conn.execute("SELECT MAX(movement_id) FROM SupplySnapshots WHERE as_of <= ?", (as_of,)).fetchone()[0] or 0
+        tail = conn.execute(
+            "SELECT id, item, kind, quantity FROM SupplyMovements WHERE id > ? AND created_at <= ? ORDER BY id",
+            (base, as_of)
+        ).fetchall()
+    snapshot = {
+        item: quantity
+        for item, quantity in conn.execute("SELECT item, quantity FROM SupplySnapshots WHERE movement_id = ?", (base,)).fetchall()
+    }
+    stock = fold(snapshot, ((item, kind, quantity) for _, item, kind, quantity in tail))
+    return stock, tail[-1][0] if tail else base
+
+def lock_supply_item(conn, item):
+    # Serializes movements of one item until the transaction ends, so a consume
+    # checked against the stock cannot interleave with another movement of it
+    conn.execute(
+        "DECLARE @result INT; "
+        "EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Transaction', @LockTimeout = ?; "
+        "IF @result < 0 THROW 51000, 'Timed out waiting for the supply item lock', 1;",
+        (f"supply:{item}", SUPPLY_LOCK_TIMEOUT_MS)
+    )
+
+def record_supply_movement(conn, item, kind, quantity, note=None, created_by=None):
+    lock_supply_item(conn, item)
+    conn.execute(
+        "INSERT INTO SupplyMovements (item, kind, quantity, note, created_by, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (item, kind, quantity, note, created_by, datetime.now())
+    )
+
+def take_supply_snapshot():
+    conn = open_db_connection()
+    if conn is None:
+        return None
     try:
-        query = """
-        INSERT INTO Symptoms (patient, symptom, user_severity, calculated_severity, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-        """
-        conn.execute(query, (
-            entry["patient"],
-            entry["symptom"],
-            entry["user_severity"],
-            entry["calculated_severity"],
-            entry["timestamp"]
-        ))
+        cutoff = datetime.now() - timedelta(seconds=SUPPLY_SNAPSHOT_LAG_SECONDS)
+        base = conn.execute("SELECT MAX(movement_id) FROM SupplySnapshots").fetchone()[0] or 0
+        row = conn.execute(
+            "SELECT MAX(id) FROM SupplyMovements WHERE id > ? AND created_at < ?", (base, cutoff)
+        ).fetchone()
+        upto = row[0] if row and row[0] else None
+        if upto is None:
+            return None
+        as_of = conn.execute("SELECT created_at FROM SupplyMovements WHERE id = ?", (upto,)).fetchone()[0]
+        snapshot = {
+            item: quantity
+            for item, quantity in conn.execute("SELECT item, quantity FROM SupplySnapshots WHERE movement_id = ?", (base,)).fetchall()
+        }
+        tail = conn.execute(
+            "SELECT item, kind, quantity FROM SupplyMovements WHERE id > ? AND id <= ? ORDER BY id", (base, upto)
+        ).fetchall()
+        stock = fold(snapshot, tail)
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO SupplySnapshots (movement_id, item, quantity, as_of, taken_at) VALUES (?, ?, ?, ?, ?)",
+            [(upto, item, quantity, as_of, datetime.now()) for item, quantity in stock.items()]
+        )
         conn.commit()
+        logging.info(f"Supply snapshot at movement {upto}: {len(stock)} items, folded {len(tail)} movements")
+        return {"movement_id": upto, "items": len(stock), "movements_folded": len(tail)}
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error taking supply snapshot: {e}")
+        return None
     finally:
         conn.close()
-    return entry
 
-@app.get("/patient-symptoms")
-async def get_patient_symptoms(
-    patient: str,
-    current_user: User = Depends(require_role("medical_staff"))
-):
-    conn = get_db_connection()
+async def supply_snapshot_loop():
+    while True:
+        await asyncio.sleep(SUPPLY_SNAPSHOT_SECONDS)
+        if await asyncio.to_thread(is_leader, "supply-snapshot", SUPPLY_SNAPSHOT_SECONDS * 2):
+            await asyncio.to_thread(take_supply_snapshot)
+
+supply_forecast = {"computed_at": None, "items": [], "drafts_created": 0}
+
+def refresh_supply_forecast():
+    conn = open_db_connection()
     if conn is None:
-        raise HTTPException(status_code=500, detail="Database connection failed")
+        return None
     try:
-        # Adjust table/column names as needed
-        query = "SELECT * FROM Symptoms WHERE patient = ?"
-        df = pd.read_sql(query, conn, params=[patient])
-        return df.to_dict(orient="records")
+        now = datetime.now()
+        stock, _ = supply_stock(conn)
+        movements = pd.read_sql(
+            "SELECT item, quantity, created_at FROM SupplyMovements WHERE kind = 'consume' AND created_at >= ?",
+            conn,
+            params=[now - timedelta(days=SUPPLY_FORECAST_WINDOW_DAYS)]
+        )
+        df = forecast(
+            stock,
+            movements,
+            now,
+            window_days=SUPPLY_FORECAST_WINDOW_DAYS,
+            reorder_days=SUPPLY_REORDER_DAYS,
+            target_days=SUPPLY_TARGET_DAYS,
+            first_seen=dict(conn.execute("SELECT item, MIN(created_at) FROM SupplyMovements GROUP BY item").fetchall()),
+        )
+        drafts = []
+        if SUPPLY_AUTO_REORDER and is_leader("supply-reorder", SUPPLY_FORECAST_SECONDS * 2):
+            # Skip items that already have a reorder on the way
+            open_orders = {
+                row[0] for row in conn.execute(
+                    "SELECT DISTINCT item FROM Deliveries WHERE destination = ? AND status IN ('draft', 'pending', 'assigned')",
+                    (SUPPLY_REORDER_DESTINATION,)
+                ).fetchall()
+            }
+            delivery_time = (now + timedelta(days=1)).strftime("%Y-%m-%d")
+            # Any vehicle type may carry a reorder
+            drafts = [
+                [SUPPLY_REORDER_DESTINATION, item, int(quantity), "any", delivery_time]
+                for item, quantity in df.loc[df["low_stock"], ["item", "reorder_quantity"]].itertuples(index=False)
+                if item not in open_orders
+            ]
+            if drafts:
+                lat, lon = reorder_destination_coordinates()
+                drafts = [draft + [lat, lon] for draft in drafts]
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "INSERT INTO Deliveries (destination, item, quantity, vehicle, delivery_time, latitude, longitude, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')",
+                    drafts
+                )
+                conn.commit()
+                dashboard_stats.add("deliveries", ("any", "draft"), len(drafts))
+                logging.info(f"Drafted {len(drafts)} reorder deliveries")
+        supply_forecast.update(
+            computed_at=now.isoformat(),
+            items=df.astype(object).where(df.notna(), None).to_dict(orient="records"),
+            drafts_created=len(drafts),
+        )
+        return supply_forecast
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        conn.rollback()
+        logging.error(f"Error forecasting supplies: {e}")
+        return None
     finally:
         conn.close()
 
-@app.post("/create-video-session")
-async def create_video_session(current_user: User = Depends(get_current_user)):
-    room_id = str(uuid.uuid4())
-    jitsi_url = f"https://meet.jit.si/{room_id}"
-    return {
-        "message": f"Video session created by {current_user.username}",
-        "video_url": jitsi_url
-    }
+def reorder_destination_coordinates():
+    lat, lon = parse_location_coordinates(SUPPLY_REORDER_DESTINATION)
+    if lat is None or lon is None:
+        lat, lon = geocode_location(SUPPLY_REORDER_DESTINATION, PRIORITY_DELIVERY)
+    if lat is None or lon is None:
+        raise RuntimeError(
+            f"Reorder destination {SUPPLY_REORDER_DESTINATION!r} could not be resolved to coordinates; "
+            "set SUPPLY_REORDER_DESTINATION to 'lat,lon'"
+        )
+    return lat, lon
 
-@app.post("/trigger-alert")
-async def trigger_alert(current_user: User = Depends(get_current_user)):
+async def supply_forecast_loop():
+    while True:
+        await asyncio.sleep(SUPPLY_FORECAST_SECONDS)
+        await asyncio.to_thread(refresh_supply_forecast)
+
+@app.get("/supplies/forecast")
+def get_supply_forecast(low_only: bool = Query(False), current_user: User = Depends(require_role("medical_staff"))):
+    # Served from the last precomputed forecast
+    items = supply_forecast["items"]
+    if low_only:
+        items = [row for row in items if row["low_stock"]]
+    return {**supply_forecast, "items": items}
+
+@app.post("/supplies/forecast/refresh")
+def refresh_supply_forecast_now(current_user: User = Depends(require_role("medical_staff"))):
+    result = refresh_supply_forecast()
+    if result is None:
+        raise HTTPException(status_code=500, detail="Supply forecast failed")
+    return {"computed_at": result["computed_at"], "items": len(result["items"]), "drafts_created": result["drafts_created"]}
+
+@app.post("/update-supply")
+def update_supply(item: str = Body(...), quantity: int = Body(...)):
+    # Setting a quantity is recorded as a stocktake adjustment
+    if quantity < 0:
+        raise HTTPException(status_code=400, detail="quantity must not be negative")
     conn = get_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
-    query = """
-    INSERT INTO Alerts (alert_id, patient, status)
-    VALUES (?, ?, ?)
-    """
-    alert_id = f"ALERT-{uuid.uuid4().hex[:6].upper()}"
-    conn.execute(query, (alert_id, current_user.username, "active"))
-    conn.commit()
-    conn.close()
-    return {"message": f"Alert triggered by {current_user.username}", "alert_id": alert_id}
+    try:
+        record_supply_movement(conn, item, "adjust", quantity)
+        conn.commit()
+    except Exception as e:
+        # e.g. the item lock timed out behind another movement
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error updating supply: {e}")
+    finally:
+        conn.close()
+    dashboard_stats.apply_movement(item, "adjust", quantity)
+    return {"message": "Supply updated successfully"}
 
-@app.get("/active-alerts")
-def get_active_alerts(status: Optional[str] = Query(None)):
+@app.post("/supplies/movements")
+def add_supply_movement(movement: SupplyMovement, current_user: User = Depends(require_role("medical_staff"))):
+    if movement.kind not in MOVEMENT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(MOVEMENT_KINDS)}")
+    if movement.quantity < 0 or (movement.kind != "adjust" and movement.quantity == 0):
+        raise HTTPException(status_code=400, detail="quantity must be positive")
     conn = get_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
-    if status:
-        query = "SELECT * FROM Alerts WHERE status = ?"
-        df = pd.read_sql(query, conn, params=[status])
-    else:
-        query = "SELECT * FROM Alerts"
-        df = pd.read_sql(query, conn)
-    conn.close()
-    return df.to_dict(orient="records")
+    try:
+        if movement.kind == "consume":
+            lock_supply_item(conn, movement.item)
+            stock, _ = supply_stock(conn)
+            if movement.quantity > stock.get(movement.item, 0):
+                raise HTTPException(status_code=400, detail=f"Only {stock.get(movement.item, 0)} {movement.item} in stock")
+        record_supply_movement(conn, movement.item, movement.kind, movement.quantity, movement.note, current_user.username)
+        conn.commit()
+        dashboard_stats.apply_movement(movement.item, movement.kind, movement.quantity)
+        return {"message": f"Recorded {movement.kind} of {movement.quantity} {movement.item}"}
+    finally:
+        conn.close()
 
-@app.post("/update-supply")
-def update_supply(item: str = Body(...), quantity: int = Body(...)):
-    conn = get_db_connection()
+@app.get("/supplies/movements")
+def get_supply_movements(
+    item: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    limit: int = Query(200, ge=1, le=5000),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    conn = get_read_connection("/supplies/movements")
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
-    query = """
-    MERGE INTO MedicalSupplies AS target
-    USING (SELECT ? AS item, ? AS quantity) AS source
-    ON target.item = source.item
-    WHEN MATCHED THEN
-        UPDATE SET quantity = source.quantity, updates = target.updates + 1
-    WHEN NOT MATCHED THEN
-        INSERT (item, quantity, updates) VALUES (source.item, source.quantity, 1);
-    """
-    conn.execute(query, (item, quantity))
-    conn.commit()
-    conn.close()
-    return {"message": "Supply updated successfully"}
+    try:
+        query = "SELECT id, item, kind, quantity, note, created_by, created_at FROM SupplyMovements WHERE 1 = 1"
+        params = []
+        if item:
+            query += " AND item = ?"
+            params.append(item)
+        if since:
+            query += " AND created_at >= ?"
+            params.append(since)
+        query += " ORDER BY id DESC"
+        rows = conn.execute(query, params).fetchmany(limit)
+        return [
+            {"id": r[0], "item": r[1], "kind": r[2], "quantity": r[3], "note": r[4], "created_by": r[5], "created_at": r[6]}
+            for r in rows
+        ]
+    finally:
+        conn.close()
+
+@app.post("/supplies/snapshot")
+def create_supply_snapshot(current_user: User = Depends(require_role("medical_staff"))):
+    result = take_supply_snapshot()
+    if result is None:
+        return {"message": "Nothing to snapshot"}
+    return result
 
 @app.get("/medical-supplies")
-def get_supplies():
-    conn = get_db_connection()
+def get_supplies(as_of: Optional[datetime] = Query(None)):
+    # Current stock, or the stock at a past point in time with as_of
+    conn = get_read_connection("/medical-supplies")
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
-    query = "SELECT * FROM MedicalSupplies"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df.to_dict(orient="records")
+    try:
+        stock, _ = supply_stock(conn, as_of)
+    finally:
+        conn.close()
+    return [{"item": item, "quantity": quantity} for item, quantity in sorted(stock.items())]
 
 @app.delete("/delete-supply")
 def delete_supply(request: DeleteSupplyRequest):
+    # Takes the requested quantity out of stock
+    if request.quantity <= 0:
+        raise HTTPException(status_code=400, detail="quantity must be positive")
     conn = get_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
-    query = "DELETE FROM MedicalSupplies WHERE item = ?"
-    conn.execute(query, (request.item,))
-    conn.commit()
-    conn.close()
-    return {"message": f"Deleted {request.item}"}
+    try:
+        lock_supply_item(conn, request.item)
+        stock, _ = supply_stock(conn)
+        if request.item not in stock:
+            raise HTTPException(status_code=404, detail=f"Unknown item: {request.item}")
+        if request.quantity > stock[request.item]:
+            raise HTTPException(status_code=400, detail=f"Only {stock[request.item]} {request.item} in stock")
+        record_supply_movement(conn, request.item, "consume", request.quantity)
+        if request.quantity == stock[request.item]:
+            record_tombstone(conn, "supplies", request.item)
+        conn.commit()
+        dashboard_stats.apply_movement(request.item, "consume", request.quantity)
+    finally:
+        conn.close()
+    return {"message": f"Deleted {request.quantity} {request.item}", "remaining": stock[request.item] - request.quantity}
 
 @app.delete("/delete-supply-row")
 def delete_supply_row(item: str):
+    # Writes off whatever is left of the item; its history stays in the ledger
     conn = get_db_connection()
     try:
-        conn.execute("DELETE FROM MedicalSupplies WHERE item = ?", (item,))
+        record_supply_movement(conn, item, "adjust", 0, note="written off")
+        record_tombstone(conn, "supplies", item)
         conn.commit()
+        dashboard_stats.apply_movement(item, "adjust", 0)
         return {"message": f"Deleted row for item: {item}"}
     except Exception as e:
         conn.rollback()
@@ -355,12 +2077,15 @@ def delete_supply_row(item: str):
 
 @app.post("/request-delivery")
 def request_delivery(request: DeliveryRequest):
+    lat, lon = parse_location_coordinates(request.destination)
+    if lat is None or lon is None:
+        lat, lon = geocode_location(request.destination, PRIORITY_DELIVERY)
     conn = get_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     query = """
-    INSERT INTO Deliveries (destination, item, quantity, vehicle, delivery_time)
-    VALUES (?, ?, ?, ?, ?)
+    INSERT INTO Deliveries (destination, item, quantity, vehicle, delivery_time, latitude, longitude)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
     """
     try:
         conn.execute(query, (
@@ -368,9 +2093,13 @@ def request_delivery(request: DeliveryRequest):
             request.item,
             request.quantity,
             request.vehicle,
-            request.delivery_time
+            request.delivery_time,
+            lat,
+            lon
         ))
         conn.commit()
+        dashboard_stats.add("deliveries", (request.vehicle, "pending"))
+        sync_after_commit(sync_delivery_index, conn)
         return {"message": "Delivery requested successfully"}
     except Exception as e:
         conn.rollback()
@@ -382,7 +2111,7 @@ def request_delivery(request: DeliveryRequest):
 
 @app.get("/deliveries")
 def get_deliveries():
-    conn = get_db_connection()
+    conn = get_read_connection("/deliveries")
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     query = "SELECT * FROM Deliveries"
@@ -392,101 +2121,346 @@ def get_deliveries():
         return {"message": "No deliveries found"}
     return df.to_dict(orient="records")
 
-@app.post("/sar-request")
-def create_sar_request(request: SARRequest):
+@app.post("/deliveries/{delivery_id}/confirm")
+def confirm_delivery(delivery_id: int, current_user: User = Depends(require_role("medical_staff"))):
+    # Turns a draft reorder into a pending delivery that /deliveries/plan will route
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        cursor = conn.execute("UPDATE Deliveries SET status = 'pending' WHERE id = ? AND status = 'draft'", (delivery_id,))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="No draft delivery with this id")
+        conn.commit()
+        dashboard_stats.invalidate()
+        sync_after_commit(lambda c: refresh_delivery_entries(c, [delivery_id]), conn)
+        return {"message": f"Delivery {delivery_id} confirmed"}
+    finally:
+        conn.close()
+
+@app.get("/vehicles")
+def get_vehicles(current_user: User = Depends(require_role("medical_staff"))):
+    conn = get_read_connection("/vehicles")
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    df = pd.read_sql("SELECT * FROM Vehicles", conn)
+    conn.close()
+    return df.to_dict(orient="records")
+
+@app.post("/vehicles")
+def upsert_vehicle(vehicle: Vehicle, current_user: User = Depends(require_role("medical_staff"))):
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    query = """
+    MERGE INTO Vehicles AS target
+    USING (SELECT ? AS name, ? AS vehicle_type, ? AS capacity, ? AS latitude, ? AS longitude, ? AS status) AS source
+    ON target.name = source.name
+    WHEN MATCHED THEN
+        UPDATE SET vehicle_type = source.vehicle_type, capacity = source.capacity,
+            latitude = source.latitude, longitude = source.longitude, status = source.status
+    WHEN NOT MATCHED THEN
+        INSERT (name, vehicle_type, capacity, latitude, longitude, status)
+        VALUES (source.name, source.vehicle_type, source.capacity, source.latitude, source.longitude, source.status);
+    """
+    try:
+        conn.execute(query, (
+            vehicle.name,
+            vehicle.vehicle_type,
+            vehicle.capacity,
+            vehicle.latitude,
+            vehicle.longitude,
+            vehicle.status
+        ))
+        conn.commit()
+        return {"message": f"Vehicle {vehicle.name} saved"}
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error saving vehicle: {e}")
+    finally:
+        conn.close()
+
+@app.post("/deliveries/plan")
+def plan_delivery_routes(
+    apply: bool = Query(False),
+    current_user: User = Depends(require_role("medical_staff"))
+):
     conn = get_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        vehicles = [
+            {"id": row[0], "name": row[1], "vehicle_type": row[2], "capacity": row[3], "latitude": row[4], "longitude": row[5]}
+            for row in conn.execute(
+                "SELECT id, name, vehicle_type, capacity, latitude, longitude FROM Vehicles "
+                "WHERE status = 'available' AND latitude IS NOT NULL AND longitude IS NOT NULL"
+            ).fetchall()
+        ]
+        deliveries = [
+            {"id": row[0], "vehicle": row[1], "quantity": row[2], "latitude": row[3], "longitude": row[4]}
+            for row in conn.execute(
+                "SELECT id, vehicle, quantity, latitude, longitude FROM Deliveries "
+                "WHERE status = 'pending' AND latitude IS NOT NULL AND longitude IS NOT NULL"
+            ).fetchall()
+        ]
+        plan = plan_deliveries(vehicles, deliveries)
+        if apply and plan["routes"]:
+            assignments = [
+                (route["vehicle_id"], stop_number, delivery_id)
+                for route in plan["routes"]
+                for stop_number, delivery_id in enumerate(route["stops"], start=1)
+            ]
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE Deliveries SET status = 'assigned', assigned_vehicle_id = ?, route_order = ? "
+                "WHERE id = ? AND status = 'pending'",
+                assignments
+            )
+            conn.commit()
+            dashboard_stats.invalidate()
+            sync_after_commit(lambda c: refresh_delivery_entries(c, [a[2] for a in assignments]), conn)
+        return {
+            "vehicles": len(vehicles),
+            "pending": len(deliveries),
+            "applied": apply,
+            **plan
+        }
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error in /deliveries/plan: {e}")
+        raise HTTPException(status_code=500, detail=f"Error planning deliveries: {e}")
+    finally:
+        conn.close()
+
+@app.post("/sar-request")
+def create_sar_request(request: SARRequest, response: Response):
+    lat, lon = parse_location_coordinates(request.location)
     query = """
-    INSERT INTO SARRequests (emergency_type, location, urgency, description, contact_number, satellite_data)
-    VALUES (?, ?, ?, ?, ?, ?)
+    INSERT INTO SARRequests (emergency_type, location, urgency, description, contact_number, satellite_data, latitude, longitude)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """
-    conn.execute(query, (
+    future = submit_write("SARRequests", query, (
         request.emergency_type,
         request.location,
         request.urgency,
         request.description,
         request.contact_number,
-        json.dumps(request.satellite_data) if request.satellite_data else "{}"
+        store_scenes(request.satellite_data),
+        lat,
+        lon
     ))
-    conn.commit()
-    conn.close()
+    try:
+        spooled = future.result()
+    except Exception as e:
+        logging.error(f"Error in /sar-request: {e}")
+        raise HTTPException(status_code=500, detail="Could not save SAR request")
+    if spooled:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "SAR request queued, it will be saved once the database is reachable", "queued": True, "idempotency_key": spooled}
+    dashboard_stats.add("sar", ("open", urgency_label(request.urgency)))
     return {"message": "SAR request submitted successfully"}
 
 @app.post("/sar-with-satellite")
-def sar_with_sarellite(request: SARRequest):
+def sar_with_sarellite(request: SARRequest, response: Response):
     # Try to parse as coordinates
     try:
         lat, lon = map(float, request.location.split(","))
         location_label = None
     except ValueError:
         # Not coordinates, try geocoding
-        lat, lon = geocode_location(request.location)
+        lat, lon = geocode_location(request.location, PRIORITY_SAR)
         location_label = request.location
         if lat is None or lon is None:
             raise HTTPException(status_code=400, detail="Could not geocode location name.")
     area = {"type": "Point", "coordinates": [lon, lat]}
     satellite_data = fetch_satellite_data(area, '2025-01-01', '2025-01-31')
-    human_readable_location = reverse_geocode(lat, lon)
+    human_readable_location = reverse_geocode(lat, lon, PRIORITY_SAR)
     # Format as NAME[lat,lon] if label is present
     if location_label:
         stored_location = f"{location_label}[{lat},{lon}]"
     else:
         stored_location = human_readable_location
-    conn = get_db_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Database connection failed")
     query = """
-    INSERT INTO SARRequests (emergency_type, location, urgency, description, contact_number, satellite_data)
-    VALUES (?, ?, ?, ?, ?, ?)
+    INSERT INTO SARRequests (emergency_type, location, urgency, description, contact_number, satellite_data, latitude, longitude)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """
-    conn.execute(query, (
+    future = submit_write("SARRequests", query, (
         request.emergency_type,
         stored_location,
         request.urgency,
         request.description,
         request.contact_number,
-        json.dumps(satellite_data)
+        store_scenes(satellite_data),
+        lat,
+        lon
     ))
-    conn.commit()
-    conn.close()
-    return {
+    try:
+        spooled = future.result()
+    except Exception as e:
+        logging.error(f"Error in /sar-with-satellite: {e}")
+        raise HTTPException(status_code=500, detail="Could not save SAR request")
+    result = {
         "message": "SAR request submitted with satellite data",
         "satellite_data": satellite_data,
         "location": stored_location
     }
+    if spooled:
+        response.status_code = status.HTTP_202_ACCEPTED
+        result.update(message="SAR request queued with satellite data", queued=True, idempotency_key=spooled)
+    else:
+        dashboard_stats.add("sar", ("open", urgency_label(request.urgency)))
+    return result
+
+GEOCODE_PRIORITIES = {"sar": PRIORITY_SAR, "delivery": PRIORITY_DELIVERY, "ui": PRIORITY_UI}
+
+@app.post("/geocode/batch")
+async def geocode_batch(batch: GeocodeBatch, current_user: User = Depends(get_current_user)):
+    # Addresses still queued when GEOCODE_TIMEOUT_SECONDS runs out come back as
+    # "pending"; asking again later is answered from the cache
+    if len(batch.addresses) > GEOCODE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {GEOCODE_BATCH_MAX} addresses per batch")
+    if batch.priority not in GEOCODE_PRIORITIES:
+        raise HTTPException(status_code=400, detail="priority must be 'sar', 'delivery' or 'ui'")
+    if batch.priority == "sar" and current_user.role != "medical_staff":
+        # SAR lookups jump the queue; patients reach them only through the SAR endpoints
+        raise HTTPException(status_code=403, detail="Only medical staff can geocode at SAR priority")
+    priority = GEOCODE_PRIORITIES[batch.priority]
+    futures = [
+        asyncio.wrap_future(geocoder.search(address, priority))
+        for address in batch.addresses
+    ]
+    if futures:
+        await asyncio.wait(futures, timeout=GEOCODE_TIMEOUT_SECONDS)
+    results = []
+    for address, future in zip(batch.addresses, futures):
+        if not future.done():
+            future.add_done_callback(lambda f: f.exception())
+            results.append({"address": address, "status": "pending", "latitude": None, "longitude": None})
+        elif isinstance(future.exception(), GeocodingBusy):
+            results.append({"address": address, "status": "busy", "latitude": None, "longitude": None})
+        elif future.exception() is not None:
+            results.append({"address": address, "status": "error", "latitude": None, "longitude": None})
+        else:
+            lat, lon = future.result()
+            results.append({
+                "address": address,
+                "status": "ok" if lat is not None else "not_found",
+                "latitude": lat,
+                "longitude": lon
+            })
+    return {"results": results}
+
+@app.get("/geocode/stats")
+def get_geocode_stats(current_user: User = Depends(require_role("medical_staff"))):
+    return geocoder.stats()
 
 @app.get("/sar-requests")
-def get_sar_requests():
-    conn = get_db_connection()
+def get_sar_requests(hydrate: bool = Query(False)):
+    # satellite_data holds the scene ids; hydrate=true expands them to the full scene metadata
+    conn = get_read_connection("/sar-requests")
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     query = "SELECT * FROM SARRequests"
     df = pd.read_sql(query, conn)
-    df = format_json_column(df, "satellite_data")
     conn.close()
+    if hydrate and not df.empty:
+        df["satellite_data"] = [
+            json.dumps(scenes, separators=(",", ":"), default=str) for scenes in hydrate_scenes(df["satellite_data"].tolist())
+        ]
+    else:
+        df = format_json_column(df, "satellite_data")
     return df.to_dict(orient="records")
 
+@app.get("/sar-requests/{sar_id}/scenes")
+def get_sar_scenes(sar_id: int):
+    conn = get_read_connection("/sar-requests")
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        row = conn.execute("SELECT satellite_data FROM SARRequests WHERE id = ?", (sar_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"SAR request {sar_id} not found")
+    return hydrate_scenes([row[0]])[0]
+
+@app.get("/satellite/scenes/{product_id}")
+def get_satellite_scene(product_id: str):
+    scene = scene_cache.get_many([product_id]).get(product_id)
+    if scene is None:
+        raise HTTPException(status_code=404, detail=f"Scene {product_id} not found")
+    return scene
+
+@app.post("/satellite/compact")
+def compact_satellite_data(current_user: User = Depends(require_role("medical_staff"))):
+    # Moves scene documents stored inline on older SAR rows into SatelliteScenes,
+    # SCENE_COMPACT_BATCH_ROWS rows per transaction
+    last_id = 0
+    compacted = scenes = 0
+    while True:
+        conn = get_db_connection()
+        if conn is None:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        try:
+            cursor = conn.execute(
+                "SELECT id, satellite_data FROM SARRequests WHERE id > ? AND satellite_data LIKE '{%' ORDER BY id",
+                (last_id,)
+            )
+            rows = cursor.fetchmany(SCENE_COMPACT_BATCH_ROWS)
+            cursor.close()
+            for sar_id, satellite_data in rows:
+                last_id = sar_id
+                products = json.loads(satellite_data) if satellite_data else {}
+                if not all(isinstance(properties, dict) for properties in products.values()):
+                    continue
+                refs, scene_batch = save_scenes(conn, products) if products else ("[]", [])
+                conn.execute("UPDATE SARRequests SET satellite_data = ? WHERE id = ?", (refs, sar_id))
+                compacted += 1
+                scenes += len(scene_batch)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Error compacting satellite data: {e}")
+            raise HTTPException(status_code=500, detail=f"Error compacting satellite data: {e}")
+        finally:
+            conn.close()
+        if len(rows) < SCENE_COMPACT_BATCH_ROWS:
+            return {"rows_compacted": compacted, "scene_references": scenes}
+
+@app.get("/satellite/stats")
+def get_satellite_stats(current_user: User = Depends(require_role("medical_staff"))):
+    return scene_cache.stats()
+
 @app.post("/update-sar-request")
 def update_sar_request(request: SARRequest):
+    lat, lon = parse_location_coordinates(request.location)
     conn = get_db_connection()
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     query = """
     UPDATE SARRequests
-    SET location = ?, urgency = ?, description = ?, contact_number = ?, satellite_data = ?
+    SET location = ?, urgency = ?, description = ?, contact_number = ?, satellite_data = ?,
+        latitude = ?, longitude = ?, updated_at = GETDATE()
     WHERE id = ?
     """
+    previous = sar_triage.get(request.id)
     try:
         conn.execute(query, (
             request.location,
             request.urgency,
             request.description,
             request.contact_number,
-            json.dumps(request.satellite_data) if request.satellite_data else "{}",
+            store_scenes(request.satellite_data),
+            lat,
+            lon,
             request.id
         ))
         conn.commit()
+        if previous is not None:
+            dashboard_stats.move("sar", ("open", urgency_label(previous["urgency"])), ("open", urgency_label(request.urgency)))
+        else:
+            dashboard_stats.invalidate()
+        sync_after_commit(sync_sar_cases, conn)
         return {"message": "SAR request updated successfully"}
     except Exception as e:
         conn.rollback()
@@ -494,26 +2468,236 @@ def update_sar_request(request: SARRequest):
     finally:
         conn.close()
 
+@app.get("/sar/triage")
+def get_sar_triage(
+    limit: int = Query(10, ge=1, le=500),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    return {"open": len(sar_triage), "next": sar_triage.peek(limit)}
+
+@app.post("/sar/triage/claim")
+def claim_sar_case(
+    case_id: Optional[int] = Body(None, embed=True),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        sync_sar_cases(conn)
+        candidates = [case_id] if case_id is not None else sar_triage.candidates()
+        for candidate in candidates:
+            case = sar_triage.describe(candidate) if sar_triage.get(candidate) else {"id": candidate}
+            # The conditional update makes the claim safe across workers holding stale queues
+            cursor = conn.execute(
+                "UPDATE SARRequests SET status = 'claimed', claimed_by = ?, updated_at = GETDATE() "
+                "WHERE id = ? AND status = 'open'",
+                (current_user.username, candidate)
+            )
+            conn.commit()
+            sar_triage.discard(candidate)
+            if cursor.rowcount == 1:
+                if "urgency" in case:
+                    urgency = urgency_label(case["urgency"])
+                    dashboard_stats.move("sar", ("open", urgency), ("claimed", urgency))
+                else:
+                    dashboard_stats.invalidate()
+                return {"message": f"SAR request {candidate} claimed by {current_user.username}", "case": case}
+        if case_id is not None:
+            raise HTTPException(status_code=409, detail=f"SAR request {case_id} is not open")
+        raise HTTPException(status_code=404, detail="No open SAR requests")
+    finally:
+        conn.close()
+
+@app.post("/sar/triage/{case_id}/reprioritize")
+def reprioritize_sar_case(
+    case_id: int,
+    urgency: str = Body(..., embed=True),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    if urgency.lower() not in URGENCY_RANK:
+        raise HTTPException(status_code=400, detail="Urgency must be one of Low, Medium, High, Critical")
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    previous = sar_triage.get(case_id)
+    try:
+        cursor = conn.execute(
+            "UPDATE SARRequests SET urgency = ?, updated_at = GETDATE() WHERE id = ?",
+            (urgency, case_id)
+        )
+        conn.commit()
+        if cursor.rowcount != 1:
+            raise HTTPException(status_code=404, detail=f"SAR request {case_id} not found")
+        if previous is not None:
+            dashboard_stats.move("sar", ("open", urgency_label(previous["urgency"])), ("open", urgency_label(urgency)))
+        else:
+            dashboard_stats.invalidate()
+        if not sar_triage.reprioritize(case_id, urgency):
+            sync_after_commit(sync_sar_cases, conn)
+        return {"message": f"SAR request {case_id} set to {urgency}"}
+    finally:
+        conn.close()
+
+@app.post("/sar/triage/{case_id}/complete")
+def complete_sar_case(case_id: int, current_user: User = Depends(require_role("medical_staff"))):
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    previous = sar_triage.get(case_id)
+    try:
+        cursor = conn.execute(
+            "UPDATE SARRequests SET status = 'completed', updated_at = GETDATE() "
+            "WHERE id = ? AND status IN ('open', 'claimed')",
+            (case_id,)
+        )
+        conn.commit()
+        sar_triage.discard(case_id)
+        if cursor.rowcount != 1:
+            raise HTTPException(status_code=409, detail=f"SAR request {case_id} is not open or claimed")
+        if previous is not None:
+            urgency = urgency_label(previous["urgency"])
+            dashboard_stats.move("sar", ("open", urgency), ("completed", urgency))
+        else:
+            dashboard_stats.invalidate()
+        return {"message": f"SAR request {case_id} completed"}
+    finally:
+        conn.close()
+
+def spatial_index_for(kind):
+    if kind == "sar":
+        return sar_spatial
+    if kind == "delivery":
+        return delivery_spatial
+    raise HTTPException(status_code=400, detail="kind must be 'sar' or 'delivery'")
+
+@app.get("/spatial/nearby")
+def spatial_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(20, gt=0, le=20000),
+    kind: str = Query("sar"),
+    limit: int = Query(100, ge=1, le=10000),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    results = spatial_index_for(kind).within_radius(lat, lon, radius_km, limit=limit)
+    return {"count": len(results), "results": results}
+
+@app.get("/spatial/bbox")
+def spatial_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    kind: str = Query("sar"),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    # min_lon > max_lon means the box crosses the antimeridian
+    results = spatial_index_for(kind).within_bbox(min_lat, min_lon, max_lat, max_lon, limit=limit)
+    return {"count": len(results), "results": results}
+
 @app.get("/table/{table_name}")
 def get_table(table_name: str, limit: int = Query(1000, ge=1, le=10000)):
-    conn = get_db_connection()
+    conn = get_read_connection("/table")
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     try:
-        query = f"SELECT TOP {limit} * FROM [{table_name}]"
+        if getattr(conn, "dialect", "mssql") == "sqlite":
+            query = f"SELECT * FROM [{table_name}] LIMIT {limit}"
+        else:
+            query = f"SELECT TOP {limit} * FROM [{table_name}]"
         df = pd.read_sql(query, conn)
+        # Binary columns (e.g. compressed scene metadata) are shown by their size
+        for column in df.columns:
+            if df[column].map(lambda v: isinstance(v, (bytes, bytearray))).any():
+                df[column] = pd.Series(
+                    [f"<{len(v)} bytes>" if isinstance(v, (bytes, bytearray)) else v for v in df[column]],
+                    index=df.index, dtype=object
+                )
         return df.to_dict(orient="records")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     finally:
         conn.close()
 
+@app.get("/export/{table_name}")
+def export_table(
+    table_name: str,
+    format: str = Query("arrow"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    include_archive: bool = Query(False),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    # Streams the table as typed record batches: an Arrow IPC stream (format=arrow)
+    # or a Parquet file (format=parquet), without the /table row cap
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be arrow or parquet")
+    if not re.fullmatch(r"\w+", table_name):
+        raise HTTPException(status_code=400, detail="Invalid table name")
+    time_column = EXPORT_TIME_COLUMNS.get(table_name)
+    if (since or until) and time_column is None:
+        raise HTTPException(status_code=400, detail=f"{table_name} has no time column to filter on")
+    query = f"SELECT * FROM [{table_name}] WHERE 1 = 1"
+    params = []
+    if since:
+        query += f" AND {time_column} >= ?"
+        params.append(since)
+    if until:
+        query += f" AND {time_column} < ?"
+        params.append(until)
+    if time_column:
+        query += f" ORDER BY {time_column}"
+    conn = get_read_connection("/export")
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        cursor = conn.execute(query, params)
+        schema, batches = cursor_batches(cursor, EXPORT_BATCH_ROWS)
+    except Exception as e:
+        conn.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    if include_archive and table_name in ARCHIVE_POLICIES:
+        # Archived months first; a row that is in both (archived but not yet deleted) is sent once
+        policy = ARCHIVE_POLICIES[table_name]
+        archived_keys = []
+
+        def archived_batches():
+            for df in cold_archive.read_months(table_name, policy["key"], policy["time"], since=since, until=until):
+                archived_keys.append(df[policy["key"]].to_numpy())
+                yield from frame_batches([df], schema, EXPORT_BATCH_ROWS)
+
+        batches = itertools.chain(archived_batches(), drop_keys(batches, policy["key"], archived_keys))
+
+    def body():
+        try:
+            yield from stream(schema, batches, format)
+        finally:
+            conn.close()
+
+    suffix = "arrows" if format == "arrow" else "parquet"
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.{suffix}"'},
+    )
+
 @app.delete("/clear-table/{table_name}")
 def clear_table(table_name: str):
+    if table_name in APPEND_ONLY_TABLES:
+        raise HTTPException(status_code=400, detail=f"{table_name} is append-only")
     conn = get_db_connection()
     try:
         conn.execute(f"DELETE FROM [{table_name}]")
         conn.commit()
+        if table_name == "SARRequests":
+            sar_triage.clear()
+            sar_spatial.clear()
+        elif table_name == "Deliveries":
+            delivery_spatial.clear()
+        if table_name in STATS_TABLES:
+            dashboard_stats.invalidate()
         return {"message": f"Cleared table: {table_name}"}
     except Exception as e:
         conn.rollback()
@@ -523,10 +2707,19 @@ def clear_table(table_name: str):
 
 @app.delete("/delete-row/{table_name}")
 def delete_row(table_name: str, id: int):
+    if table_name in APPEND_ONLY_TABLES:
+        raise HTTPException(status_code=400, detail=f"{table_name} is append-only")
     conn = get_db_connection()
     try:
         conn.execute(f"DELETE FROM [{table_name}] WHERE id = ?", (id,))
         conn.commit()
+        if table_name == "SARRequests":
+            sar_triage.discard(id)
+            sar_spatial.remove(id)
+        elif table_name == "Deliveries":
+            delivery_spatial.remove(id)
+        if table_name in STATS_TABLES:
+            dashboard_stats.invalidate()
         return {"message": f"Deleted row with id: {id} from {table_name}"}
     except Exception as e:
         conn.rollback()
@@ -534,18 +2727,73 @@ def delete_row(table_name: str, id: int):
     finally:
         conn.close()
 
+dashboard_stats = DashboardStats(low_stock_quantity=STATS_LOW_STOCK_QUANTITY)
+STATS_TABLES = {"Alerts", "SARRequests", "Deliveries", "SupplyMovements"}
+
+def reconcile_dashboard_stats():
+    # Exact counts from the primary; deltas applied meanwhile are replayed on top
+    conn = open_db_connection()
+    if conn is None:
+        return
+    dashboard_stats.begin_reconcile()
+    try:
+        counts = {"alerts": {}, "sar": {}, "deliveries": {}}
+        for alert_status, n in conn.execute("SELECT status, COUNT(*) FROM Alerts GROUP BY status").fetchall():
+            counts["alerts"][alert_status] = n
+        for case_status, urgency, n in conn.execute(
+            "SELECT status, urgency, COUNT(*) FROM SARRequests GROUP BY status, urgency"
+        ).fetchall():
+            key = (case_status, urgency_label(urgency))
+            counts["sar"][key] = counts["sar"].get(key, 0) + n
+        for vehicle, delivery_status, n in conn.execute(
+            "SELECT vehicle, status, COUNT(*) FROM Deliveries GROUP BY vehicle, status"
+        ).fetchall():
+            counts["deliveries"][(vehicle, delivery_status)] = n
+        stock, _ = supply_stock(conn)
+        dashboard_stats.finish_reconcile(counts, stock)
+        if any(dashboard_stats.drift.values()):
+            logging.info(f"Dashboard counters corrected by reconciliation: {dashboard_stats.drift}")
+    except Exception as e:
+        dashboard_stats.abort_reconcile()
+        logging.error(f"Error reconciling dashboard stats: {e}")
+    finally:
+        conn.close()
+
+async def stats_reconcile_loop():
+    # Wakes every second so bulk changes are reflected promptly, but only queries on
+    # the interval or when a handler could not tell how its change moved the counts
+    last_run = time.monotonic()
+    while True:
+        await asyncio.sleep(1)
+        if dashboard_stats.needs_reconcile() or time.monotonic() - last_run >= STATS_RECONCILE_SECONDS:
+            last_run = time.monotonic()
+            await asyncio.to_thread(reconcile_dashboard_stats)
+
+@app.get("/stats")
+def get_dashboard_stats(current_user: User = Depends(require_role("medical_staff"))):
+    # Served from memory: the cost does not grow with the tables
+    return dashboard_stats.snapshot()
+
 @app.get("/tables")
 def list_tables():
-    conn = get_db_connection()
+    conn = get_read_connection("/tables")
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     try:
-        # This works for SQL Server
-        query = """
-        SELECT TABLE_NAME
-        FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_TYPE = 'BASE TABLE'
-        """
+        if getattr(conn, "dialect", "mssql") == "sqlite":
+            # SQLite replica written by replicator.py
+            query = """
+            SELECT name AS TABLE_NAME
+            FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name <> '_replication'
+            """
+        else:
+            # This works for SQL Server
+            query = """
+            SELECT TABLE_NAME
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_TYPE = 'BASE TABLE'
+            """
         df = pd.read_sql(query, conn)
         return df["TABLE_NAME"].tolist()
     except Exception as e:
@@ -553,10 +2801,92 @@ def list_tables():
     finally:
         conn.close()
 
+@app.get("/profiles")
+def list_profiles(current_user: User = Depends(require_role("medical_staff"))):
+    return profile_ring.list()
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, current_user: User = Depends(require_role("medical_staff"))):
+    profile = profile_ring.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    meta, collapsed = profile
+    # Collapsed stacks load directly into speedscope or flamegraph.pl
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed.txt"'}
+    )
+
+@app.get("/db/query-stats")
+def get_query_stats(
+    order_by: str = Query("total_ms", pattern="^(total_ms|avg_ms|max_ms|calls|rows|slow_calls|errors)$"),
+    limit: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    return query_monitor.top(order_by=order_by, limit=limit)
+
+@app.get("/db/slow-queries")
+def get_slow_queries(
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(require_role("medical_staff"))
+):
+    return query_monitor.slow_log(limit=limit)
+
+@app.get("/admission/stats")
+def get_admission_stats(current_user: User = Depends(require_role("medical_staff"))):
+    return {**admission_controller.stats(), "shared_store": shared_store.stats()}
+
+@app.get("/spool/stats")
+def get_spool_stats(current_user: User = Depends(require_role("medical_staff"))):
+    if write_spool is None:
+        return {"enabled": False}
+    return {"enabled": True, "path": SPOOL_PATH, **write_spool.stats()}
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open_handler(request, exc: CircuitOpen):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database unavailable, try again later"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Telemedicine API is running"}
 
+@app.get("/ready")
+def readiness():
+    # Unlike the liveness root this checks the database, through the circuit breaker
+    ready = False
+    try:
+        conn = get_db_connection()
+    except CircuitOpen:
+        conn = None
+    if conn is not None:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            ready = True
+        except Exception as e:
+            logging.error(f"Readiness check failed: {e}")
+        finally:
+            conn.close()
+    body = {
+        "status": "ready" if ready else "unavailable",
+        "database": db_breaker.stats(),
+        "spooled_writes": write_spool.depth() if write_spool is not None else None,
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.get("/db/replica")
+def replica_status(current_user: User = Depends(require_role("medical_staff"))):
+    return {
+        "configured": bool(DB_REPLICA_CONNECTION_STRING),
+        "dialect": REPLICA_DIALECT if DB_REPLICA_CONNECTION_STRING else None,
+        "breaker": replica_breaker.stats(),
+        "lag_seconds": replica_lag_seconds() if DB_REPLICA_CONNECTION_STRING else None,
+        "read_primary_endpoints": sorted(READ_PRIMARY_ENDPOINTS),
+    }
+
 def view_any_table():
     # ... existing code ...
     if records:
@@ -0,0 +1,87 @@
+import datetime
+import os
+import sqlite3
+
+import pytest
+
+# SQLite stand-ins for the SQL Server tables the API tests touch (see README for the real DDL)
+SCHEMA = """
+CREATE TABLE Users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, role TEXT, hashed_password TEXT, full_name TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE Symptoms (id INTEGER PRIMARY KEY AUTOINCREMENT, patient TEXT, symptom TEXT, user_severity INT, calculated_severity INT, timestamp TIMESTAMP, diagnosis TEXT, treatment_guidance TEXT);
+CREATE TABLE PatientSummaries (patient TEXT PRIMARY KEY, symptom_count INT DEFAULT 0, open_diagnoses INT DEFAULT 0, latest_id INT, latest_symptom TEXT, latest_severity INT, latest_timestamp TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE Alerts (alert_id TEXT PRIMARY KEY, patient TEXT, status TEXT, trigger_time TEXT DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE SARRequests (id INTEGER PRIMARY KEY AUTOINCREMENT, emergency_type TEXT, location TEXT, urgency TEXT, description TEXT, contact_number TEXT, satellite_data TEXT, latitude REAL, longitude REAL, status TEXT NOT NULL DEFAULT 'open', claimed_by TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE Deliveries (id INTEGER PRIMARY KEY AUTOINCREMENT, destination TEXT, item TEXT, quantity INT, vehicle TEXT, delivery_time TEXT, latitude REAL, longitude REAL, status TEXT NOT NULL DEFAULT 'pending', assigned_vehicle_id INT, route_order INT);
+CREATE TABLE Vehicles (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, vehicle_type TEXT, capacity INT, latitude REAL, longitude REAL, status TEXT DEFAULT 'available');
+CREATE TABLE SupplyMovements (id INTEGER PRIMARY KEY AUTOINCREMENT, item TEXT, kind TEXT, quantity INT, note TEXT, created_by TEXT, created_at TIMESTAMP);
+CREATE TABLE SupplySnapshots (movement_id INT, item TEXT, quantity INT, as_of TIMESTAMP, taken_at TIMESTAMP, PRIMARY KEY (movement_id, item));
+CREATE TABLE ChatRooms (room_id TEXT PRIMARY KEY, created_by TEXT, created_at TIMESTAMP);
+CREATE TABLE ChatMessages (id INTEGER PRIMARY KEY AUTOINCREMENT, message_id TEXT UNIQUE, room_id TEXT, sender TEXT, role TEXT, kind TEXT, text TEXT, created_at TIMESTAMP, origin TEXT);
+CREATE TABLE AppliedWrites (idempotency_key TEXT PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE ChangeLog (version INTEGER PRIMARY KEY AUTOINCREMENT, entity TEXT, entity_id TEXT, op TEXT, changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+"""
+
+
+@pytest.fixture(scope="session")
+def telemedicine(tmp_path_factory):
+    # The API module needs the ODBC driver manager even though the tests run on SQLite
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    state = tmp_path_factory.mktemp("state")
+    os.environ.update({
+        "SPOOL_PATH": str(state / "spool.db"),
+        "ARCHIVE_DIR": str(state / "archive"),
+        "ADMISSION_ENABLED": "0",
+        "SHARED_STORE_URL": "memory://",
+        "SLOW_QUERY_CAPTURE_PLAN": "0",
+    })
+    import telemedicine
+    return telemedicine
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "telemedicine.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def api(telemedicine, db_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    def connect():
+        conn = sqlite3.connect(db_path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.create_function("GETDATE", 0, lambda: datetime.datetime.now().isoformat(" "))
+        # No rowversions here: every change counts as committed
+        conn.create_function("MIN_ACTIVE_ROWVERSION", 0, lambda: 1 << 62)
+        return conn
+
+    monkeypatch.setattr(telemedicine, "connect_primary", connect)
+    for index in (telemedicine.sar_triage, telemedicine.sar_spatial, telemedicine.delivery_spatial):
+        index.clear()
+    # No `with`: the background loops of the lifespan stay off
+    return TestClient(telemedicine.app)
+
+
+def login(api, username, password):
+    token = api.post("/token", data={"username": username, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def medic(api):
+    return login(api, "medic1", "medicpass")
+
+
+@pytest.fixture
+def patient(api):
+    return login(api, "patient1", "patientpass")
+
+
+@pytest.fixture
+def sql(db_path):
+    conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+    yield conn
+    conn.close()
@@ -0,0 +1,77 @@
+import asyncio
+
+from admission import AdmissionController, AdmissionMiddleware, EndpointClass, TokenBucket
+
+
+def controller(**overrides):
+    classes = [
+        EndpointClass("critical", max_in_flight=4, global_share=1.0, rate=1.0, burst=2, limit_anonymous=False),
+        EndpointClass("read", max_in_flight=2, global_share=0.5, rate=1.0, burst=2),
+    ]
+    return AdmissionController(classes, classify=lambda method, path: path.strip("/"), global_max_in_flight=4, **overrides)
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, burst=1)
+    assert bucket.take(now=bucket.updated) == 0
+    assert bucket.take(now=bucket.updated) == 0.5
+    assert bucket.take(now=bucket.updated + 0.5) == 0
+
+
+def test_authenticated_user_is_rate_limited_per_class():
+    admission = controller()
+    assert admission.try_admit("read", "user:a") is None
+    admission.release("read")
+    assert admission.try_admit("read", "user:a") is None
+    admission.release("read")
+    status, retry_after = admission.try_admit("read", "user:a")
+    assert status == 429 and retry_after > 0
+    # Another user has a bucket of their own
+    assert admission.try_admit("read", "user:b") is None
+
+
+def test_anonymous_critical_requests_share_an_ip_without_rate_limit():
+    admission = controller()
+    for _ in range(4):
+        assert admission.try_admit("critical", "ip:10.0.0.1", authenticated=False) is None
+    # Only the in-flight cap applies
+    assert admission.try_admit("critical", "ip:10.0.0.1", authenticated=False) == (503, 1.0)
+
+
+def test_anonymous_reads_are_still_bucketed_by_ip():
+    admission = controller()
+    for _ in range(2):
+        assert admission.try_admit("read", "ip:10.0.0.1", authenticated=False) is None
+        admission.release("read")
+    assert admission.try_admit("read", "ip:10.0.0.1", authenticated=False)[0] == 429
+
+
+def test_low_priority_class_leaves_global_headroom_for_critical():
+    admission = controller()
+    assert admission.try_admit("read", "user:a") is None
+    assert admission.try_admit("read", "user:b") is None
+    # read may fill half of the global limit, critical the rest
+    assert admission.try_admit("read", "user:c")[0] == 503
+    assert admission.try_admit("critical", "user:a") is None
+    assert admission.try_admit("critical", "user:b") is None
+
+
+def test_middleware_sheds_with_retry_after():
+    admission = controller()
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = AdmissionMiddleware(app, admission, identify=lambda headers, client: ("user:a", True))
+    scope = {"type": "http", "method": "GET", "path": "/read", "headers": [], "client": ("10.0.0.1", 1)}
+    for _ in range(3):
+        asyncio.run(middleware(scope, None, send))
+    statuses = [m["status"] for m in sent if m["type"] == "http.response.start"]
+    assert statuses == [200, 200, 429]
+    assert dict(sent[-2]["headers"])[b"retry-after"] == b"1"
+    assert admission.in_flight == 0
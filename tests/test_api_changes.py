@@ -0,0 +1,6 @@
+def test_reset_snapshot_carries_rows_from_the_primary(api, medic, sql):
+    sql.execute("INSERT INTO Alerts (alert_id, patient, status) VALUES ('ALERT-1', 'patient1', 'active')")
+    sql.commit()
+    feed = api.get("/changes", params={"since": 0, "entities": "alerts", "snapshot": True}, headers=medic).json()
+    assert feed["reset"]
+    assert [row["alert_id"] for row in feed["rows"]["alerts"]] == ["ALERT-1"]
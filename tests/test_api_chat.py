@@ -0,0 +1,25 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+def test_only_the_creator_and_medical_staff_can_use_a_room(api, patient, medic, sql):
+    room_id = api.post("/create-video-session", headers=patient).json()["room_id"]
+    assert api.post(f"/chat/{room_id}/messages", json={"text": "hello"}, headers=patient).status_code == 200
+    assert [m["text"] for m in api.get(f"/chat/{room_id}/messages", headers=medic).json()] == ["hello"]
+
+    sql.execute("INSERT INTO ChatRooms (room_id, created_by, created_at) VALUES ('other-room', 'patient2', '2025-01-01')")
+    sql.commit()
+    assert api.get("/chat/other-room/messages", headers=patient).status_code == 403
+    assert api.post("/chat/other-room/messages", json={"text": "hi"}, headers=patient).status_code == 403
+    assert api.get("/chat/other-room/messages", headers=medic).status_code == 200
+    assert api.get("/chat/no-such-room/messages", headers=medic).status_code == 404
+
+
+def test_websocket_refuses_non_members(api, patient, sql):
+    sql.execute("INSERT INTO ChatRooms (room_id, created_by, created_at) VALUES ('other-room', 'patient2', '2025-01-01')")
+    sql.commit()
+    token = patient["Authorization"].split()[1]
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with api.websocket_connect(f"/chat/other-room?token={token}") as websocket:
+            websocket.receive_json()
+    assert closed.value.code == 4403
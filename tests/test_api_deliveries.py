@@ -0,0 +1,13 @@
+def test_plan_updates_delivery_index_status(api, medic, sql, telemedicine):
+    # /vehicles uses MERGE, which SQLite does not have
+    sql.execute("INSERT INTO Vehicles (name, vehicle_type, capacity, latitude, longitude) VALUES ('van1', 'van', 100, 37.9, 23.7)")
+    sql.commit()
+    response = api.post("/request-delivery", json={"destination": "38.0,23.8", "item": "bandages", "quantity": 5,
+                                                   "vehicle": "van", "delivery_time": "today"})
+    assert response.status_code == 200
+    assert telemedicine.delivery_spatial.within_radius(38.0, 23.8, 1)[0]["data"]["status"] == "pending"
+
+    plan = api.post("/deliveries/plan", params={"apply": True}, headers=medic).json()
+    assert plan["routes"][0]["stops"] == [1]
+    entry = telemedicine.delivery_spatial.within_radius(38.0, 23.8, 1)[0]["data"]
+    assert entry["status"] == "assigned" and entry["assigned_vehicle_id"] == 1
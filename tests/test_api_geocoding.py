@@ -0,0 +1,3 @@
+def test_sar_priority_is_for_medical_staff(api, patient):
+    response = api.post("/geocode/batch", json={"addresses": ["Athens"], "priority": "sar"}, headers=patient)
+    assert response.status_code == 403
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+
+def seed_consumption(sql):
+    now = datetime.now()
+    rows = [("gauze", "receive", 100, now - timedelta(days=20))]
+    rows += [("gauze", "consume", 9, now - timedelta(days=day)) for day in range(10)]
+    sql.executemany("INSERT INTO SupplyMovements (item, kind, quantity, created_at) VALUES (?, ?, ?, ?)", rows)
+    sql.execute("INSERT INTO Vehicles (name, vehicle_type, capacity, latitude, longitude) VALUES ('truck1', 'truck', 1000, 37.9, 23.7)")
+    sql.commit()
+
+
+def test_reorder_draft_is_routed_once_confirmed(api, medic, sql, telemedicine, monkeypatch):
+    monkeypatch.setattr(telemedicine, "SUPPLY_REORDER_DESTINATION", "Depot[37.95,23.70]")
+    seed_consumption(sql)
+    assert api.post("/supplies/forecast/refresh", headers=medic).json()["drafts_created"] == 1
+    delivery_id, vehicle, lat = sql.execute("SELECT id, vehicle, latitude FROM Deliveries WHERE status = 'draft'").fetchone()
+    assert (vehicle, lat) == ("any", 37.95)
+    # Drafts wait for confirmation
+    assert api.post("/deliveries/plan", headers=medic).json()["pending"] == 0
+
+    assert api.post(f"/deliveries/{delivery_id}/confirm", headers=medic).status_code == 200
+    plan = api.post("/deliveries/plan", params={"apply": True}, headers=medic).json()
+    assert plan["routes"][0]["stops"] == [delivery_id]
+    assert sql.execute("SELECT status FROM Deliveries WHERE id = ?", (delivery_id,)).fetchone()[0] == "assigned"
+
+
+def test_unresolvable_destination_fails_drafting(api, medic, sql, telemedicine, monkeypatch):
+    monkeypatch.setattr(telemedicine, "SUPPLY_REORDER_DESTINATION", "Nowhere in particular")
+    monkeypatch.setattr(telemedicine, "geocode_location", lambda name, priority=None: (None, None))
+    seed_consumption(sql)
+    assert api.post("/supplies/forecast/refresh", headers=medic).status_code == 500
+    assert sql.execute("SELECT COUNT(*) FROM Deliveries").fetchone()[0] == 0
@@ -0,0 +1,50 @@
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from replicator import open_replica, sync_from_sqlite
+
+
+@pytest.fixture
+def replica(telemedicine, db_path, sql, tmp_path, monkeypatch):
+    # The primary as of the last replication pass, then a write the replica has not seen
+    sql.execute("INSERT INTO SARRequests (emergency_type, location, urgency) VALUES ('flood', '1,1', 'High')")
+    sql.execute("INSERT INTO Alerts (alert_id, patient, status) VALUES ('a1', 'patient1', 'active')")
+    sql.commit()
+    path = tmp_path / "replica.db"
+    conn = open_replica(str(path))
+    sync_from_sqlite(str(db_path), conn)
+    sql.execute("INSERT INTO SARRequests (emergency_type, location, urgency) VALUES ('fire', '2,2', 'Low')")
+    sql.execute("INSERT INTO Alerts (alert_id, patient, status) VALUES ('a2', 'patient1', 'active')")
+    sql.commit()
+    monkeypatch.setattr(telemedicine, "DB_REPLICA_CONNECTION_STRING", f"sqlite:///{path}")
+    monkeypatch.setattr(telemedicine, "REPLICA_DIALECT", "sqlite")
+    monkeypatch.setattr(telemedicine, "replica_breaker", CircuitBreaker("replica"))
+    yield conn
+    conn.close()
+
+
+def test_read_only_endpoint_is_served_by_the_replica(api, replica):
+    rows = api.get("/sar-requests").json()
+    assert [row["emergency_type"] for row in rows] == ["flood"]
+
+
+def test_read_primary_endpoints_see_the_latest_writes(api, replica):
+    rows = api.get("/active-alerts").json()
+    assert sorted(row["alert_id"] for row in rows) == ["a1", "a2"]
+
+
+def test_unreachable_replica_falls_back_to_the_primary(api, telemedicine, replica, tmp_path, monkeypatch):
+    monkeypatch.setattr(telemedicine, "DB_REPLICA_CONNECTION_STRING", f"sqlite:///{tmp_path}/missing/replica.db")
+    rows = api.get("/sar-requests").json()
+    assert [row["emergency_type"] for row in rows] == ["flood", "fire"]
+    assert telemedicine.replica_breaker.stats()["recent_failure_rate"] == 1.0
+
+
+def test_replica_status_reports_lag(api, replica, medic):
+    status = api.get("/db/replica", headers=medic).json()
+    assert status["configured"] is True and status["dialect"] == "sqlite"
+    assert 0 <= status["lag_seconds"] < 60
+    assert "/active-alerts" in status["read_primary_endpoints"]
+    replica.execute("UPDATE _replication SET synced_at = datetime('now', 'localtime', '-1 hour')")
+    replica.commit()
+    assert api.get("/db/replica", headers=medic).json()["lag_seconds"] >= 3600 - 60
@@ -0,0 +1,35 @@
+import sqlite3
+
+
+def test_update_supply_records_a_stocktake(api, telemedicine, sql, monkeypatch):
+    monkeypatch.setattr(telemedicine, "lock_supply_item", lambda conn, item: None)
+    response = api.post("/update-supply", json={"item": "saline", "quantity": 12})
+    assert response.status_code == 200
+    assert sql.execute("SELECT item, kind, quantity FROM SupplyMovements").fetchall() == [("saline", "adjust", 12)]
+
+
+def test_update_supply_lock_timeout_rolls_back_and_closes(api, telemedicine, sql, monkeypatch):
+    opened = []
+    connect = telemedicine.connect_primary
+
+    def tracked():
+        conn = connect()
+        opened.append(conn)
+        return conn
+
+    def timed_out(conn, item):
+        conn.execute("INSERT INTO SupplyMovements (item, kind, quantity) VALUES (?, 'adjust', 1)", (item,))
+        raise RuntimeError("Timed out waiting for the supply item lock")
+
+    monkeypatch.setattr(telemedicine, "connect_primary", tracked)
+    monkeypatch.setattr(telemedicine, "lock_supply_item", timed_out)
+    response = api.post("/update-supply", json={"item": "saline", "quantity": 12})
+    assert response.status_code == 500
+    assert "supply item lock" in response.json()["detail"]
+    assert sql.execute("SELECT COUNT(*) FROM SupplyMovements").fetchone()[0] == 0
+    for conn in opened:
+        try:
+            conn.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            continue
+        raise AssertionError("connection left open")
@@ -0,0 +1,20 @@
+from concurrent.futures import Future
+
+
+def test_rejects_out_of_range_severity(api, patient):
+    for severity in (0, 11, "severe", 5.5):
+        assert api.post("/submit-symptoms", json={"symptom": "fever", "severity": severity}, headers=patient).status_code == 422
+
+
+def test_failed_write_leaves_engine_state_alone(api, patient, telemedicine, monkeypatch):
+    before = telemedicine.severity_engine.state("patient1")
+
+    def failing_write(table, query, params):
+        future = Future()
+        future.set_exception(RuntimeError("database down"))
+        return future
+
+    monkeypatch.setattr(telemedicine, "submit_write", failing_write)
+    response = api.post("/submit-symptoms", json={"symptom": "fever", "severity": 9}, headers=patient)
+    assert response.status_code == 500
+    assert telemedicine.severity_engine.state("patient1") == before
@@ -0,0 +1,11 @@
+def test_committed_reprioritize_survives_index_sync_failure(api, medic, sql, telemedicine, monkeypatch):
+    sql.execute("INSERT INTO SARRequests (emergency_type, location, urgency) VALUES ('Lost Person', '37.9,23.7', 'Low')")
+    sql.commit()
+
+    def broken_sync(conn, full=False):
+        raise RuntimeError("index sync failed")
+
+    monkeypatch.setattr(telemedicine, "sync_sar_cases", broken_sync)
+    response = api.post("/sar/triage/1/reprioritize", json={"urgency": "Critical"}, headers=medic)
+    assert response.status_code == 200
+    assert sql.execute("SELECT urgency FROM SARRequests WHERE id = 1").fetchone()[0] == "Critical"
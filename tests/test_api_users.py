@@ -0,0 +1,31 @@
+from conftest import login
+
+
+def test_created_patient_can_log_in_and_is_searchable(api, telemedicine, medic, monkeypatch):
+    # Each test database starts its Users ids at 1 again
+    monkeypatch.setattr(telemedicine, "users_synced_id", 0)
+    created = api.post("/users", headers=medic, json={
+        "username": "qwilson", "password": "secret", "full_name": "Quinn Wilson",
+    })
+    assert created.status_code == 200
+    for q in ("qwil", "quinn", "WILSON"):
+        found = api.get("/patients/directory", headers=medic, params={"q": q}).json()
+        assert found["results"] == [{"username": "qwilson", "full_name": "Quinn Wilson"}]
+        assert found["has_more"] is False
+    assert api.get("/patients/directory", headers=login(api, "qwilson", "secret")).status_code == 403
+
+
+def test_medical_staff_are_not_listed(api, telemedicine, medic, monkeypatch):
+    monkeypatch.setattr(telemedicine, "users_synced_id", 0)
+    api.post("/users", headers=medic, json={"username": "xstaff", "password": "secret", "role": "medical_staff"})
+    assert api.get("/patients/directory", headers=medic, params={"q": "xstaff"}).json()["results"] == []
+
+
+def test_username_taken_through_another_worker_is_a_conflict(api, telemedicine, medic, sql, monkeypatch):
+    monkeypatch.setattr(telemedicine, "users_synced_id", 1 << 30)
+    sql.execute("INSERT INTO Users (username, role, hashed_password) VALUES ('zelsewhere', 'patient', 'x')")
+    sql.commit()
+    response = api.post("/users", headers=medic, json={"username": "zelsewhere", "password": "secret"})
+    assert response.status_code == 409
+    assert api.post("/users", headers=medic, json={"username": "medic1", "password": "x"}).status_code == 409
+    assert api.post("/users", headers=medic, json={"username": "y", "password": "x", "role": "admin"}).status_code == 400
@@ -0,0 +1,40 @@
+import os
+import time
+
+import pandas as pd
+
+from archive import LockFile, ParquetArchive
+
+
+def test_refresh_keeps_a_long_run_from_going_stale(tmp_path):
+    path = str(tmp_path / ".archiver.lock")
+    first = LockFile(path, stale_seconds=60)
+    assert first.acquire()
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert first.refresh()
+    assert not LockFile(path, stale_seconds=60).acquire()
+    first.release()
+    assert not os.path.exists(path)
+
+
+def test_stale_lock_is_taken_over_and_the_old_holder_notices(tmp_path):
+    path = str(tmp_path / ".archiver.lock")
+    first = LockFile(path, stale_seconds=60)
+    assert first.acquire()
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    second = LockFile(path, stale_seconds=60)
+    assert second.acquire()
+    assert not first.refresh()
+    # Releasing a lost lock leaves the new holder's file alone
+    first.release()
+    assert os.path.exists(path) and second.refresh()
+
+
+def test_archived_batches_read_back_without_duplicates(tmp_path):
+    archive = ParquetArchive(str(tmp_path))
+    batch = pd.DataFrame({"id": [1, 2], "timestamp": pd.to_datetime(["2024-01-05", "2024-01-06"]), "patient": ["a", "b"]})
+    archive.write("Symptoms", batch, "timestamp", "id")
+    archive.write("Symptoms", batch, "timestamp", "id")
+    assert sorted(archive.read("Symptoms", "id")["id"]) == [1, 2]
@@ -0,0 +1,56 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_on_failure_rate_and_rejects(clock):
+    breaker = CircuitBreaker("db", failure_rate=0.5, min_calls=4, open_seconds=10)
+    for ok in (True, False, True):
+        breaker.before_call()
+        breaker.record_success() if ok else breaker.record_failure("timeout")
+    breaker.before_call()
+    breaker.record_failure("timeout")
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after == pytest.approx(10)
+    assert breaker.stats()["state"] == "open" and breaker.trips == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("db", min_calls=1, open_seconds=10)
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.stats()["state"] == "closed"
+    breaker.before_call()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("db", min_calls=1, open_seconds=10)
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.before_call()
+    breaker.record_failure("still down")
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    assert breaker.trips == 2
+
+
+def test_old_failures_leave_the_window(clock):
+    breaker = CircuitBreaker("db", failure_rate=0.6, min_calls=2, window_seconds=30)
+    breaker.record_failure()
+    clock[0] += 31
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.stats()["state"] == "closed"
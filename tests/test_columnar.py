@@ -0,0 +1,45 @@
+import datetime
+import io
+import sqlite3
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from columnar import cursor_batches, drop_keys, frame_batches, stream
+
+
+def sqlite_cursor(n):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Alerts (alert_id TEXT, patient TEXT, severity INT)")
+    conn.executemany("INSERT INTO Alerts VALUES (?, ?, ?)", [(f"A{i}", None if i % 2 else "p", i) for i in range(n)])
+    return conn.execute("SELECT * FROM Alerts ORDER BY severity")
+
+
+def test_cursor_is_read_in_batches_with_inferred_types():
+    schema, batches = cursor_batches(sqlite_cursor(25), 10)
+    batches = list(batches)
+    assert [b.num_rows for b in batches] == [10, 10, 5]
+    assert schema.field("severity").type == pa.int64()
+    assert schema.field("patient").type == pa.string()
+
+
+def test_arrow_stream_round_trips():
+    schema, batches = cursor_batches(sqlite_cursor(25), 10)
+    table = pa.ipc.open_stream(b"".join(stream(schema, batches, "arrow"))).read_all()
+    assert table.column("alert_id").to_pylist() == [f"A{i}" for i in range(25)]
+
+
+def test_parquet_stream_yields_a_piece_per_batch():
+    schema, batches = cursor_batches(sqlite_cursor(25), 10)
+    pieces = list(stream(schema, batches, "parquet"))
+    assert len([p for p in pieces if p]) >= 3
+    assert pq.read_table(io.BytesIO(b"".join(pieces))).num_rows == 25
+
+
+def test_archived_frames_are_merged_without_hot_duplicates():
+    schema = pa.schema([("alert_id", pa.string()), ("trigger_time", pa.timestamp("us"))])
+    seen = [pa.array(["A1"])]
+    archived = pd.DataFrame({"alert_id": ["A1", "A2"], "trigger_time": [datetime.datetime(2024, 1, 1)] * 2})
+    batches = list(drop_keys(frame_batches([archived], schema, 10), "alert_id", seen))
+    assert pa.Table.from_batches(batches).column("alert_id").to_pylist() == ["A2"]
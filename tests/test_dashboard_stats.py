@@ -0,0 +1,73 @@
+from dashboard_stats import DashboardStats, urgency_label
+
+
+def test_urgency_label_normalises_case_and_missing_values():
+    assert urgency_label(" high ") == "High"
+    assert urgency_label(None) == "Unknown"
+
+
+def test_add_and_move_keep_counts_positive():
+    stats = DashboardStats()
+    stats.add("alerts", "active", 2)
+    stats.move("alerts", "active", "resolved")
+    stats.move("alerts", "resolved", "resolved")
+    snapshot = stats.snapshot()
+    assert snapshot["alerts"] == {"active": 1, "by_status": {"active": 1, "resolved": 1}}
+    stats.move("alerts", "active", "resolved")
+    # Keys that drop to zero disappear instead of lingering as 0
+    assert stats.snapshot()["alerts"] == {"active": 0, "by_status": {"resolved": 2}}
+
+
+def test_sar_and_delivery_breakdowns():
+    stats = DashboardStats()
+    stats.add("sar", ("open", "High"), 2)
+    stats.add("sar", ("open", "Low"))
+    stats.add("sar", ("closed", "High"))
+    stats.add("deliveries", ("van-1", "pending"), 2)
+    stats.add("deliveries", ("any", "draft"))
+    snapshot = stats.snapshot()
+    assert snapshot["sar"] == {"open_by_urgency": {"High": 2, "Low": 1}, "by_status": {"open": 3, "closed": 1}}
+    assert snapshot["deliveries"] == {"by_vehicle": {"van-1": 2, "any": 1}, "by_status": {"pending": 2, "draft": 1}}
+
+
+def test_movements_track_low_stock():
+    stats = DashboardStats(low_stock_quantity=10)
+    stats.apply_movement("bandages", "receive", 50)
+    stats.apply_movement("saline", "receive", 5)
+    supplies = stats.snapshot()["supplies"]
+    assert supplies == {"items": 2, "low_stock_quantity": 10, "low_stock_count": 1, "low_stock": ["saline"]}
+    stats.apply_movement("bandages", "consume", 45)
+    stats.apply_movement("saline", "adjust", 20)
+    assert stats.snapshot()["supplies"]["low_stock"] == ["bandages"]
+    # Used up: no longer stocked, and no longer reported as low
+    stats.apply_movement("bandages", "consume", 5)
+    supplies = stats.snapshot()["supplies"]
+    assert supplies["items"] == 1 and supplies["low_stock"] == []
+
+
+def test_reconcile_replays_writes_made_during_the_query():
+    stats = DashboardStats(low_stock_quantity=10)
+    stats.add("alerts", "active", 3)
+    stats.invalidate()
+    assert stats.needs_reconcile()
+    stats.begin_reconcile()
+    assert not stats.needs_reconcile()
+    # These land after the GROUP BY was read, so its result does not include them
+    stats.add("alerts", "active")
+    stats.apply_movement("saline", "consume", 25)
+    stats.finish_reconcile({"alerts": {"active": 1, "resolved": 2}}, {"saline": 30})
+    snapshot = stats.snapshot()
+    assert snapshot["alerts"]["by_status"] == {"active": 2, "resolved": 2}
+    assert snapshot["supplies"]["low_stock"] == ["saline"]
+    # Before: active 4; after: active 2, resolved 2
+    assert snapshot["drift"] == {"alerts": 4, "sar": 0, "deliveries": 0}
+    assert snapshot["reconciled_at"] is not None
+
+
+def test_aborted_reconcile_stops_journaling():
+    stats = DashboardStats()
+    stats.begin_reconcile()
+    stats.abort_reconcile()
+    stats.add("alerts", "active")
+    stats.finish_reconcile({"alerts": {"active": 5}}, {})
+    assert stats.snapshot()["alerts"]["active"] == 5
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+import time
+
+from db_monitor import MonitoredConnection, QueryMonitor, fingerprint
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_fingerprint_replaces_literals():
+    first, statement = fingerprint("SELECT TOP 500 * FROM [Alerts] WHERE status = 'active' AND id IN (1, 2, 3)")
+    second, _ = fingerprint("select top 1000 *  from [Alerts] where status = N'resolved' and id in (7, 8)")
+    assert first == second
+    assert "'" not in statement
+
+
+def test_plan_captured_once_per_fingerprint_on_one_thread():
+    connections = []
+    threads = set()
+
+    def connect():
+        threads.add(threading.current_thread().name)
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+        connections.append(conn)
+        return conn
+
+    monitor = QueryMonitor(slow_ms=0, plan_connection_factory=connect, dialect="sqlite", plan_interval=60)
+    for _ in range(20):
+        monitor.record("SELECT * FROM t WHERE id = ?", (1,), 5.0, 0)
+    wait_for(lambda: monitor.slow_log()[-1]["plan"] is not None)
+    assert len(connections) == 1
+    assert threads == {"query-plan-capture"}
+    assert len(monitor.slow_log()) == 20
+
+
+def test_full_plan_queue_skips_instead_of_piling_up():
+    release = threading.Event()
+
+    def connect():
+        release.wait(5)
+        return None
+
+    monitor = QueryMonitor(slow_ms=0, plan_connection_factory=connect, dialect="sqlite", plan_queue_size=1)
+    for i in range(10):
+        monitor.record(f"SELECT * FROM t{i}", None, 5.0, 0)
+    release.set()
+    assert monitor.plans_skipped >= 8
+
+
+def test_monitored_connection_charges_fetched_rows():
+    monitor = QueryMonitor(slow_ms=10_000)
+    conn = MonitoredConnection(sqlite3.connect(":memory:"), monitor, dialect="sqlite")
+    conn.execute("CREATE TABLE t (id INTEGER)")
+    conn.cursor().executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(5)])
+    conn.execute("SELECT id FROM t").fetchall()
+    select = next(row for row in monitor.top() if row["statement"].startswith("SELECT"))
+    assert select["calls"] == 1 and select["rows"] == 5
@@ -0,0 +1,40 @@
+from directory import PrefixIndex
+
+
+def directory():
+    index = PrefixIndex()
+    index.add("jdoe", ["jdoe", "John", "Doe"])
+    index.add("asmith", ["asmith", "Anna", "Smith"])
+    index.add("jsmith", ["jsmith", "Jane", "Smith"])
+    return index
+
+
+def test_prefix_search_matches_any_term_once():
+    index = directory()
+    assert index.search("smi") == (["asmith", "jsmith"], False)
+    # Ordered by matching term ("jane", "jdoe", "john"); jdoe is listed once
+    assert index.search(" J ") == (["jsmith", "jdoe"], False)
+    assert index.search("x") == ([], False)
+    assert len(index) == 3 and "jdoe" in index
+
+
+def test_pagination_reports_more_results():
+    index = directory()
+    assert index.search("", limit=2) == (["asmith", "jdoe"], True)
+    assert index.search("", offset=2, limit=2) == (["jsmith"], False)
+    # Exactly a page left: nothing more after it
+    assert index.search("", offset=1, limit=2) == (["jdoe", "jsmith"], False)
+
+
+def test_re_adding_replaces_terms_and_remove_drops_them():
+    index = directory()
+    index.add("jdoe", ["jdoe", "Johanna", "Roe"])
+    assert index.search("doe") == ([], False)
+    assert index.search("roe") == (["jdoe"], False)
+    # e.g. the account became medical staff
+    index.remove("jdoe")
+    assert index.search("j") == (["jsmith"], False)
+    assert "jdoe" not in index and len(index) == 2
+    index.remove("jdoe")
+    index.clear()
+    assert index.search("") == ([], False)
@@ -0,0 +1,45 @@
+import numpy as np
+
+from dispatch import assign, order_route, plan_deliveries, route_length_km, type_feasibility
+
+
+def test_assign_respects_capacity_and_type():
+    distance = np.array([[1.0, 2.0, 3.0, 4.0],
+                         [9.0, 9.0, 9.0, 9.0]])
+    feasible = type_feasibility(["van", "truck"], ["", "any", "van", "truck"])
+    assigned = assign(distance, feasible, capacity=[10, 100], quantity=[6, 6, 4, 1])
+    assert list(assigned) == [0, 1, 0, 1]
+
+
+def test_assign_leaves_unservable_deliveries_open():
+    distance = np.array([[1.0, 1.0]])
+    assigned = assign(distance, np.array([[True, False]]), capacity=[5], quantity=[10, 1])
+    assert list(assigned) == [-1, -1]
+
+
+def test_order_route_visits_points_on_a_line_in_order():
+    lats = [0.0, 0.0, 0.0, 0.0, 0.0]
+    lons = [0.4, 0.1, 0.5, 0.2, 0.3]
+    tour = order_route(0.0, 0.0, lats, lons)
+    assert [lons[i] for i in tour] == [0.1, 0.2, 0.3, 0.4, 0.5]
+
+
+def test_order_route_is_a_permutation_no_longer_than_input_order():
+    rng = np.random.default_rng(5)
+    lats, lons = rng.uniform(37, 39, 30), rng.uniform(22, 24, 30)
+    tour = order_route(38.0, 23.0, lats, lons)
+    assert sorted(tour) == list(range(30))
+    assert route_length_km(38.0, 23.0, lats[tour], lons[tour]) <= route_length_km(38.0, 23.0, lats, lons)
+
+
+def test_plan_deliveries_routes_and_reports_unassigned():
+    vehicles = [{"id": 7, "vehicle_type": "van", "capacity": 10, "latitude": 38.0, "longitude": 23.0}]
+    deliveries = [
+        {"id": 1, "vehicle": "van", "quantity": 4, "latitude": 38.2, "longitude": 23.0},
+        {"id": 2, "vehicle": "any", "quantity": 4, "latitude": 38.1, "longitude": 23.0},
+        {"id": 3, "vehicle": "helicopter", "quantity": 1, "latitude": 38.1, "longitude": 23.0},
+    ]
+    plan = plan_deliveries(vehicles, deliveries)
+    assert plan["routes"][0]["stops"] == [2, 1]
+    assert plan["routes"][0]["load"] == 8
+    assert plan["unassigned"] == [3]
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from forecasting import consumption_rates, forecast
+
+NOW = datetime(2025, 3, 1, 12)
+
+
+def movements(rows):
+    return pd.DataFrame(rows, columns=["item", "quantity", "created_at"])
+
+
+def test_steady_consumption_gives_its_daily_rate():
+    df = movements([("gauze", 4, NOW - timedelta(days=day)) for day in range(28)])
+    rate, std = consumption_rates(df, ["gauze", "saline"], NOW)
+    assert np.allclose(rate, [4.0, 0.0])
+    assert np.allclose(std, 0.0)
+
+
+def test_new_item_is_not_diluted_by_days_before_it_existed():
+    df = movements([("mask", 10, NOW - timedelta(days=day)) for day in range(3)])
+    diluted, _ = consumption_rates(df, ["mask"], NOW)
+    rate, _ = consumption_rates(df, ["mask"], NOW, first_seen={"mask": NOW - timedelta(days=2)})
+    assert rate[0] == 10.0 and diluted[0] < 10.0
+
+
+def test_low_cover_is_flagged_with_a_top_up_order():
+    df = movements([("gauze", 5, NOW - timedelta(days=day)) for day in range(28)])
+    result = forecast({"gauze": 20, "saline": 50}, df, NOW, reorder_days=7, target_days=30).set_index("item")
+    assert result.loc["gauze", "days_of_cover"] == 4.0
+    assert bool(result.loc["gauze", "low_stock"]) and result.loc["gauze", "reorder_quantity"] == 130
+    # Nothing consumed: infinite cover, never flagged
+    assert not result.loc["saline", "low_stock"] and np.isnan(result.loc["saline", "days_of_cover"])
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from geocoding import PRIORITY_DELIVERY, PRIORITY_SAR, PRIORITY_UI, GeocodingBusy, GeocodingWorker
+
+
+class BlockingFetch:
+    # Holds the first upstream call until released, and records the call order
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, kind, query):
+        self.calls.append(query)
+        self.started.set()
+        self.release.wait(5)
+        return (1.0, 2.0)
+
+
+def test_identical_lookups_share_one_upstream_call():
+    fetch = BlockingFetch()
+    worker = GeocodingWorker(fetch, take=lambda: 0)
+    first, second = worker.search("Athens"), worker.search("  athens ")
+    fetch.release.set()
+    assert first.result(5) == second.result(5) == (1.0, 2.0)
+    assert worker.search("ATHENS").result(5) == (1.0, 2.0)
+    stats = worker.stats()
+    assert (stats["upstream_calls"], stats["coalesced"], stats["cache_hits"]) == (1, 1, 1)
+
+
+def test_sar_lookups_go_first():
+    fetch = BlockingFetch()
+    worker = GeocodingWorker(fetch, take=lambda: 0)
+    futures = [worker.search("first")]
+    fetch.started.wait(5)
+    futures += [worker.search("ui"), worker.search("delivery", PRIORITY_DELIVERY), worker.search("sar", PRIORITY_SAR)]
+    fetch.release.set()
+    for future in futures:
+        future.result(5)
+    assert fetch.calls == ["first", "sar", "delivery", "ui"]
+
+
+def test_full_queue_sheds_the_least_urgent_lookup():
+    fetch = BlockingFetch()
+    worker = GeocodingWorker(fetch, take=lambda: 0, max_queue=2)
+    in_flight = worker.search("first")
+    fetch.started.wait(5)
+    ui = worker.search("ui", PRIORITY_UI)
+    with pytest.raises(GeocodingBusy):
+        worker.search("another ui", PRIORITY_UI).result(1)
+    sar = worker.search("sar", PRIORITY_SAR)
+    with pytest.raises(GeocodingBusy):
+        ui.result(1)
+    fetch.release.set()
+    assert in_flight.result(5) == sar.result(5) == (1.0, 2.0)
+    assert worker.stats()["shed"] == 2
@@ -0,0 +1,81 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from group_commit import GroupCommitWriter
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "writes.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Readings (id INTEGER PRIMARY KEY, value INT NOT NULL)")
+    conn.close()
+    return lambda: sqlite3.connect(path, check_same_thread=False)
+
+
+def count(connect):
+    conn = connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM Readings").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_concurrent_writes_share_batches_and_are_committed(db):
+    writer = GroupCommitWriter("Readings", db, max_wait_ms=50)
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            futures = list(pool.map(lambda i: writer.submit("INSERT INTO Readings (value) VALUES (?)", (i,)), range(200)))
+        assert [f.result(timeout=5) for f in futures] == [None] * 200
+        assert count(db) == 200
+        assert writer.stats()["batches"] < 200
+    finally:
+        writer.stop()
+
+
+def test_bad_row_fails_alone(db):
+    writer = GroupCommitWriter("Readings", db, max_wait_ms=50)
+    try:
+        futures = [
+            writer.submit("INSERT INTO Readings (value) VALUES (?)", (1,)),
+            writer.submit("INSERT INTO Readings (value) VALUES (?)", (None,)),
+            writer.submit("INSERT INTO Readings (value) VALUES (?)", (3,)),
+        ]
+        assert futures[0].result(timeout=5) is None
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[1].result(timeout=5)
+        assert futures[2].result(timeout=5) is None
+        assert count(db) == 2
+    finally:
+        writer.stop()
+
+
+def test_unreachable_database_goes_to_fallback():
+    spooled = []
+    writer = GroupCommitWriter("Readings", lambda: None, fallback=lambda query, params: spooled.append(params) or f"key-{params[0]}")
+    try:
+        assert writer.submit("INSERT INTO Readings (value) VALUES (?)", (7,)).result(timeout=5) == "key-7"
+        assert spooled == [(7,)]
+    finally:
+        writer.stop()
+
+
+def test_after_commit_errors_do_not_fail_the_write(db):
+    def hook(conn):
+        raise RuntimeError("index refresh failed")
+
+    writer = GroupCommitWriter("Readings", db, after_commit=hook)
+    try:
+        assert writer.submit("INSERT INTO Readings (value) VALUES (?)", (1,)).result(timeout=5) is None
+        assert count(db) == 1
+    finally:
+        writer.stop()
+
+
+def test_submit_after_stop_fails():
+    writer = GroupCommitWriter("Readings", lambda: None)
+    writer.stop()
+    with pytest.raises(RuntimeError):
+        writer.submit("SELECT 1", ()).result(timeout=1)
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from profiling import ProfileRing, ProfilingMiddleware
+
+
+def profiled_work():
+    sum(range(1000))
+
+
+def other_work():
+    sum(range(1000))
+
+
+def endpoint(work, seconds=0.2):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        work()
+
+
+async def async_endpoint(seconds=0.1):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        profiled_work()
+
+
+async def app(scope, receive, send):
+    # Stands in for the router: the endpoint is written into the scope before it runs
+    if scope["path"] == "/async":
+        scope["endpoint"] = async_endpoint
+        await async_endpoint()
+    else:
+        scope["endpoint"] = endpoint
+        await run_in_threadpool(endpoint, profiled_work if scope["path"] == "/profiled" else other_work)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def request(path, headers=()):
+    return {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+
+
+async def discard(message):
+    pass
+
+
+def middleware(ring, **overrides):
+    options = {"enabled": True, "interval": 0.001, "is_privileged": lambda headers: headers.get(b"authorization") == b"medic"}
+    return ProfilingMiddleware(app, ring, **{**options, **overrides})
+
+
+def test_ring_keeps_newest_profiles():
+    ring = ProfileRing(size=2)
+    ids = [ring.add({"path": f"/{n}"}, "") for n in range(3)]
+    assert [meta["path"] for meta in ring.list()] == ["/2", "/1"]
+    assert ring.get(ids[0]) is None
+    assert ring.get(ids[2])[0]["id"] == ids[2]
+
+
+def test_header_needs_a_privileged_caller():
+    profiler = middleware(ProfileRing())
+    assert profiler._wants_profile(request("/", [(b"x-profile-request", b"1"), (b"authorization", b"medic")]))
+    assert not profiler._wants_profile(request("/", [(b"x-profile-request", b"1"), (b"authorization", b"patient")]))
+    assert not profiler._wants_profile(request("/", [(b"authorization", b"medic")]))
+
+
+def test_sample_rate_profiles_without_header():
+    assert middleware(ProfileRing(), sample_rate=1.0)._wants_profile(request("/"))
+    assert not middleware(ProfileRing(), sample_rate=0.0)._wants_profile(request("/"))
+
+
+def test_profile_only_samples_its_own_request():
+    ring = ProfileRing()
+    profiler = middleware(ring)
+    headers = [(b"x-profile-request", b"1"), (b"authorization", b"medic")]
+
+    async def both():
+        # The same endpoint runs concurrently on another threadpool thread
+        await asyncio.gather(
+            profiler(request("/other"), None, discard),
+            profiler(request("/profiled", headers), None, discard),
+        )
+
+    asyncio.run(both())
+    (meta,) = ring.list()
+    assert meta["path"] == "/profiled" and meta["status"] == 200 and meta["samples"] > 0
+    collapsed = ring.get(meta["id"])[1]
+    assert "profiled_work" in collapsed
+    assert "other_work" not in collapsed
+
+
+def test_async_endpoint_is_sampled_while_it_runs():
+    ring = ProfileRing()
+    asyncio.run(middleware(ring, sample_rate=1.0)(request("/async"), None, discard))
+    (meta,) = ring.list()
+    assert meta["samples"] > 0
+    assert "async_endpoint" in ring.get(meta["id"])[1]
+
+
+def test_profiles_endpoints(api, telemedicine, medic, patient):
+    profile_id = telemedicine.profile_ring.add({"path": "/sar-requests"}, "main;handler 3")
+    assert api.get("/profiles", headers=patient).status_code == 403
+    listed = api.get("/profiles", headers=medic).json()
+    assert listed[0] == {"path": "/sar-requests", "id": profile_id}
+    response = api.get(f"/profiles/{profile_id}", headers=medic)
+    assert response.status_code == 200
+    assert response.text == "main;handler 3"
+    assert profile_id in response.headers["content-disposition"]
+    assert api.get("/profiles/unknown", headers=medic).status_code == 404
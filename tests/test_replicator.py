@@ -0,0 +1,98 @@
+import re
+import sqlite3
+import sys
+import types
+
+import pytest
+
+from replicator import open_replica, sync_from_odbc, sync_from_sqlite
+
+# pandas warns about DBAPI connections other than sqlite3, as it would for pyodbc
+pytestmark = pytest.mark.filterwarnings("ignore:pandas only supports SQLAlchemy")
+
+
+class SqlServerLike:
+    # Just enough of a SQL Server connection for sync_from_odbc, backed by SQLite
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+
+    def execute(self, query):
+        assert "INFORMATION_SCHEMA.TABLES" in query
+        return self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+
+    def cursor(self):
+        return _Cursor(self._conn.cursor())
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+class _Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, *args):
+        query = re.sub(r"SELECT TOP 0 \* FROM (\[\w+\])", r"SELECT * FROM \1 LIMIT 0", query)
+        self._cursor.execute(query, *args)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def primary(tmp_path):
+    path = tmp_path / "primary.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Alerts (alert_id TEXT PRIMARY KEY, patient TEXT, status TEXT);
+        CREATE TABLE Vehicles (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO Alerts VALUES ('a1', 'patient1', 'active'), ('a2', 'patient2', 'resolved');
+    """)
+    conn.commit()
+    return path, conn
+
+
+def synced_at(replica):
+    return replica.execute("SELECT synced_at FROM _replication").fetchall()
+
+
+def test_sync_from_sqlite_copies_a_snapshot_and_marks_it(tmp_path):
+    source_path, source = primary(tmp_path)
+    replica = open_replica(str(tmp_path / "replica.db"))
+    sync_from_sqlite(str(source_path), replica)
+    assert replica.execute("SELECT alert_id, status FROM Alerts ORDER BY alert_id").fetchall() == [("a1", "active"), ("a2", "resolved")]
+    (first,) = synced_at(replica)
+    source.execute("UPDATE Alerts SET status = 'resolved' WHERE alert_id = 'a1'")
+    source.commit()
+    sync_from_sqlite(str(source_path), replica)
+    assert replica.execute("SELECT status FROM Alerts WHERE alert_id = 'a1'").fetchone() == ("resolved",)
+    (second,) = synced_at(replica)
+    assert second[0] >= first[0]
+
+
+def test_sync_from_odbc_swaps_staging_tables_in(tmp_path, monkeypatch):
+    source_path, source = primary(tmp_path)
+    monkeypatch.setitem(sys.modules, "pyodbc", types.SimpleNamespace(connect=lambda dsn: SqlServerLike(source_path)))
+    replica = open_replica(str(tmp_path / "replica.db"))
+    # A previous copy with other columns, and staging left behind by an interrupted pass
+    replica.executescript("""
+        CREATE TABLE Alerts (alert_id TEXT, stale INTEGER);
+        INSERT INTO Alerts VALUES ('old', 1);
+        CREATE TABLE Alerts__staging (alert_id TEXT);
+        INSERT INTO Alerts__staging VALUES ('half');
+    """)
+    sync_from_odbc("DRIVER=test", replica, chunksize=1)
+    assert replica.execute("SELECT alert_id, patient, status FROM Alerts ORDER BY alert_id").fetchall() == [
+        ("a1", "patient1", "active"), ("a2", "patient2", "resolved"),
+    ]
+    tables = {row[0] for row in replica.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"_replication", "Alerts", "Vehicles"}
+    # An empty table still gets its columns
+    assert [column[1] for column in replica.execute("PRAGMA table_info(Vehicles)")] == ["id", "name"]
+    assert len(synced_at(replica)) == 1
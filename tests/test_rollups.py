@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from rollups import MaxWindow, PatientSummaryCache
+
+NOW = datetime(2025, 1, 8)
+
+
+def test_late_reading_with_older_timestamp_keeps_window_exact():
+    window = MaxWindow(timedelta(hours=24))
+    window.push(NOW - timedelta(hours=2), 4)
+    window.push(NOW - timedelta(hours=1), 3)
+    window.push(NOW - timedelta(hours=23), 9)
+    assert window.max(NOW) == 9
+    # Once the late reading leaves the window the newer ones are still there
+    assert window.max(NOW + timedelta(hours=2)) == 4
+    assert window.max(NOW + timedelta(hours=22, minutes=30)) == 3
+
+
+def test_reading_committed_below_the_high_water_id_is_applied():
+    cache = PatientSummaryCache(gap_seconds=60)
+    cache.apply_reading(1, "p1", 2, NOW)
+    cache.apply_reading(3, "p1", 3, NOW)
+    cache.advance(now=0)
+    assert cache.last_symptom_id == 1
+    # Id 2 commits after id 3 was read
+    cache.apply_reading(2, "p1", 8, NOW)
+    cache.apply_reading(3, "p1", 3, NOW)
+    cache.advance(now=1)
+    assert cache.last_symptom_id == 3
+    assert cache.get("p1", NOW)["max_severity_24h"] == 8
+
+
+def test_gap_from_rolled_back_insert_is_skipped_after_timeout():
+    cache = PatientSummaryCache(gap_seconds=60)
+    cache.start_after(10)
+    cache.apply_reading(12, "p1", 5, NOW)
+    cache.apply_reading(13, "p1", 5, NOW)
+    cache.advance(now=0)
+    assert cache.last_symptom_id == 10
+    cache.advance(now=30)
+    assert cache.last_symptom_id == 10
+    cache.advance(now=61)
+    assert cache.last_symptom_id == 13
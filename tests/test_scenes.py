@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+from scenes import SceneCache, decode_metadata, encode_metadata, parse_scene_refs, scene_rows
+
+
+def test_metadata_round_trip_is_deterministic():
+    metadata = {"title": "S2A_MSIL1C", "beginposition": datetime(2024, 5, 1, 10, 30), "cloudcoverpercentage": 12.5}
+    blob = encode_metadata(metadata)
+    assert blob == encode_metadata(metadata)
+    assert decode_metadata(blob) == {**metadata, "beginposition": "2024-05-01 10:30:00"}
+    assert decode_metadata(bytearray(blob))["title"] == "S2A_MSIL1C"
+
+
+def test_scene_rows_from_query_results():
+    rows = scene_rows({
+        "p1": {"title": "S1", "platformname": "Sentinel-2", "beginposition": "2024-05-01T10:30:00Z", "cloudcoverpercentage": "7.5"},
+        "p2": {"title": "S2"},
+    })
+    product_id, title, platform, begin, cloud_cover, blob = rows[0]
+    assert (product_id, title, platform, begin, cloud_cover) == ("p1", "S1", "Sentinel-2", datetime(2024, 5, 1, 10, 30), 7.5)
+    assert decode_metadata(blob)["platformname"] == "Sentinel-2"
+    assert rows[1][:5] == ("p2", "S2", None, None, None)
+
+
+def test_parse_scene_refs_reads_lists_and_legacy_documents():
+    assert parse_scene_refs(None) == ([], {})
+    assert parse_scene_refs(json.dumps(["p1", 2])) == (["p1", "2"], {})
+    legacy = {"p1": {"title": "S1"}}
+    assert parse_scene_refs(json.dumps(legacy)) == (["p1"], legacy)
+    assert parse_scene_refs(legacy) == (["p1"], legacy)
+
+
+def test_scene_cache_loads_misses_once_and_evicts_least_recent():
+    loads = []
+    store = {"p1": {"title": "S1"}, "p2": {"title": "S2"}, "p3": {"title": "S3"}}
+
+    def load(product_ids):
+        loads.append(list(product_ids))
+        return {product_id: store[product_id] for product_id in product_ids if product_id in store}
+
+    cache = SceneCache(load, max_scenes=2)
+    assert cache.get_many(["p1", "p2", "p1", "missing"]) == {"p1": {"title": "S1"}, "p2": {"title": "S2"}}
+    assert loads == [["p1", "p2", "missing"]]
+    # p1 is used again, so p2 is the one to make room for p3
+    assert cache.get_many(["p1"]) == {"p1": {"title": "S1"}}
+    cache.get_many(["p3"])
+    assert cache.stats()["cached"] == 2
+    cache.get_many(["p2"])
+    assert loads[-1] == ["p2"]
+    assert cache.stats() == {"cached": 2, "hits": 1, "misses": 5}
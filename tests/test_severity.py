@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from severity import SeverityEngine
+
+START = datetime(2025, 1, 1)
+
+
+def test_preview_leaves_state_untouched():
+    engine = SeverityEngine()
+    engine.score("p1", "fever", 4, START)
+    before = engine.state("p1")
+    preview = engine.score("p1", "fever", 9, START + timedelta(hours=1), commit=False)
+    assert engine.state("p1") == before
+    assert engine.score("p1", "fever", 9, START + timedelta(hours=1)) == preview
+    assert engine.state("p1") != before
+
+
+def test_preview_for_new_patient_has_no_state():
+    engine = SeverityEngine()
+    engine.score("p2", "cough", 5, START, commit=False)
+    assert engine.state("p2") is None
+
+
+def test_worsening_and_recurrence_raise_the_score():
+    engine = SeverityEngine()
+    scores = [engine.score("p1", "shortness of breath", s, START + timedelta(hours=i)) for i, s in enumerate([1, 2, 3, 4])]
+    assert scores == sorted(scores)
+    assert engine.state("p1")["trend"] > 0
+    assert scores[-1] > SeverityEngine().score("p9", "shortness of breath", 4, START)
+
+
+def test_rescore_matches_incremental_scoring():
+    rng = np.random.default_rng(11)
+    patients = rng.choice(["a", "b", "c"], 60)
+    symptoms = rng.choice(["fever", "cough", "headache", "rash"], 60)
+    severities = rng.integers(1, 11, 60)
+    timestamps = [START + timedelta(minutes=int(m)) for m in np.sort(rng.integers(0, 10000, 60))]
+    incremental = SeverityEngine()
+    expected = [incremental.score(*row) for row in zip(patients, symptoms, severities, timestamps)]
+    # Rows in any order come back aligned with the input
+    order = rng.permutation(60)
+    batch = SeverityEngine().rescore(patients[order], symptoms[order], severities[order], [timestamps[i] for i in order])
+    assert list(batch) == [expected[i] for i in order]
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from admission import AdmissionController, EndpointClass
+from circuit_breaker import CircuitBreaker
+from shared_store import FailOpenStore, MemoryStore, SQLiteStore, open_store
+
+
+class BrokenStore:
+    shared = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def _fail(self, *args):
+        self.calls += 1
+        raise ConnectionError("store unreachable")
+
+    take = revoke = is_revoked = lease = stats = _fail
+
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first, second = SQLiteStore(path), SQLiteStore(path)
+    assert first.take("user:a:read", 1.0, 1) == 0
+    # The bucket emptied through one worker is empty for the other
+    assert second.take("user:a:read", 1.0, 1) > 0
+    first.revoke("jti-1", time.time() + 60)
+    assert second.is_revoked("jti-1")
+    assert not second.is_revoked("jti-2")
+    assert first.lease("archive", "worker-1", 60)
+    assert not second.lease("archive", "worker-2", 60)
+    assert second.lease("archive", "worker-1", 60)
+
+
+def test_memory_store_lease_expires():
+    store = MemoryStore()
+    assert store.lease("archive", "worker-1", 0.01)
+    time.sleep(0.02)
+    assert store.lease("archive", "worker-2", 60)
+
+
+def test_open_store_wraps_shared_backends(tmp_path):
+    assert isinstance(open_store("memory://"), MemoryStore)
+    store = open_store(f"sqlite:///{tmp_path / 'shared.db'}")
+    assert isinstance(store, FailOpenStore) and store.shared
+
+
+def test_failing_store_falls_back_to_local_state():
+    backend = BrokenStore()
+    store = FailOpenStore(backend, breaker=CircuitBreaker("shared-store", min_calls=2))
+    # Per-process buckets still limit the caller
+    assert store.take("user:a:read", 1.0, 1) == 0
+    assert store.take("user:a:read", 1.0, 1) > 0
+    # A logout through this worker holds even though the store missed it
+    store.revoke("jti-1", time.time() + 60)
+    assert store.is_revoked("jti-1")
+    assert not store.is_revoked("jti-2")
+    # Nobody leads while the store is down
+    assert not store.lease("archive", "worker-1", 60)
+    # Once the breaker opens, the backend is no longer called
+    calls = backend.calls
+    store.take("user:b:read", 1.0, 1)
+    assert backend.calls == calls
+    stats = store.stats()
+    assert stats["backend"] == "unavailable" and stats["fallbacks"] >= 6
+
+
+def test_admit_fails_open_when_the_store_is_down():
+    store = FailOpenStore(BrokenStore())
+    admission = AdmissionController(
+        [EndpointClass("read", max_in_flight=4, global_share=1.0, rate=1.0, burst=1)],
+        classify=lambda method, path: "read",
+        take=store.take,
+    )
+    assert asyncio.run(admission.admit("read", "user:a")) is None
+    status, retry_after = asyncio.run(admission.admit("read", "user:a"))
+    assert status == 429 and retry_after > 0
+    assert admission.in_flight == 1
@@ -0,0 +1,31 @@
+import random
+
+from spatial import GridIndex, haversine_km
+
+
+def test_radius_query_matches_brute_force():
+    rng = random.Random(3)
+    index, points = GridIndex(0.5), {}
+    for item_id in range(500):
+        points[item_id] = (rng.uniform(36, 40), rng.uniform(20, 26))
+        index.upsert(item_id, *points[item_id])
+    expected = sorted(i for i, (lat, lon) in points.items() if haversine_km(38, 23, lat, lon) <= 100)
+    assert sorted(r["id"] for r in index.within_radius(38, 23, 100)) == expected
+
+
+def test_upsert_moves_and_remove_drops_points():
+    index = GridIndex(0.1)
+    index.upsert(1, 10.0, 10.0, {"status": "pending"})
+    index.upsert(1, 50.0, 50.0, {"status": "assigned"})
+    assert index.within_radius(10.0, 10.0, 5) == []
+    assert index.within_radius(50.0, 50.0, 5)[0]["data"] == {"status": "assigned"}
+    assert index.remove(1) and not index.remove(1)
+    assert len(index) == 0
+
+
+def test_bbox_across_antimeridian():
+    index = GridIndex(1.0)
+    index.upsert(1, 0.0, 179.5)
+    index.upsert(2, 0.0, -179.5)
+    index.upsert(3, 0.0, 0.0)
+    assert sorted(r["id"] for r in index.within_bbox(-1, 179, 1, -179)) == [1, 2]
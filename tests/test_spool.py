@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from spool import WriteSpool
+
+INSERT = "INSERT INTO Readings (value, taken_at) VALUES (?, ?)"
+
+
+@pytest.fixture
+def primary(tmp_path):
+    path = tmp_path / "primary.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Readings (id INTEGER PRIMARY KEY, value INT NOT NULL, taken_at TIMESTAMP);
+        CREATE TABLE AppliedWrites (idempotency_key TEXT PRIMARY KEY);
+    """)
+    conn.close()
+    return lambda: sqlite3.connect(path)
+
+
+def values(connect):
+    conn = connect()
+    try:
+        return [row[0] for row in conn.execute("SELECT value FROM Readings ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_entries_survive_reopening_and_replay_in_order(tmp_path, primary):
+    spool = WriteSpool(str(tmp_path / "spool.db"))
+    for value in range(5):
+        spool.append("Readings", INSERT, (value, datetime(2025, 1, 1, 12, value)))
+    spool._conn.close()
+
+    reopened = WriteSpool(str(tmp_path / "spool.db"))
+    assert reopened.depth() == 5
+    assert reopened.replay(primary) == 5
+    assert values(primary) == [0, 1, 2, 3, 4]
+    assert not reopened.has_pending()
+
+
+def test_failing_entry_holds_back_later_writes(tmp_path, primary):
+    spool = WriteSpool(str(tmp_path / "spool.db"), max_attempts=2, retry_base_seconds=0)
+    spool.append("Readings", INSERT, (1, None))
+    spool.append("Readings", "INSERT INTO Missing (value) VALUES (?)", (2,))
+    spool.append("Readings", INSERT, (3, None))
+    for _ in range(4):
+        spool.replay(primary)
+    # Past max_attempts the bad entry still blocks instead of being skipped
+    assert values(primary) == [1]
+    assert spool.depth() == 2
+    assert spool.stats()["head_attempts"] == 4
+
+    conn = primary()
+    conn.execute("CREATE TABLE Missing (value INT)")
+    conn.commit()
+    conn.close()
+    assert spool.replay(primary) == 2
+    assert values(primary) == [1, 3]
+
+
+def test_backoff_delays_the_next_attempt(tmp_path, primary):
+    spool = WriteSpool(str(tmp_path / "spool.db"), retry_base_seconds=60)
+    spool.append("Readings", "INSERT INTO Missing (value) VALUES (?)", (1,))
+    connects = []
+
+    def connect():
+        connects.append(1)
+        return primary()
+
+    spool.replay(connect)
+    assert spool.replay(connect) == 0
+    assert len(connects) == 1
+    assert spool.stats()["retry_in_seconds"] > 0
+
+
+def test_already_applied_keys_are_not_applied_twice(tmp_path, primary):
+    spool = WriteSpool(str(tmp_path / "spool.db"))
+    key = spool.append("Readings", INSERT, (1, None))
+    conn = primary()
+    conn.execute("INSERT INTO AppliedWrites (idempotency_key) VALUES (?)", (key,))
+    conn.commit()
+    conn.close()
+    assert spool.replay(primary) == 0
+    assert values(primary) == []
+    assert spool.stats()["duplicates_skipped"] == 1
+    assert spool.depth() == 0
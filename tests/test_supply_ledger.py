@@ -0,0 +1,25 @@
+import pytest
+
+from supply_ledger import apply_movement, fold
+
+
+def test_fold_applies_movements_in_ledger_order():
+    movements = [
+        ("gauze", "receive", 10),
+        ("gauze", "consume", 4),
+        ("saline", "receive", 3),
+        ("gauze", "adjust", 20),
+        ("gauze", "consume", 5),
+    ]
+    assert fold({"saline": 2}, movements) == {"gauze": 15, "saline": 5}
+
+
+def test_fold_leaves_the_snapshot_alone():
+    snapshot = {"gauze": 1}
+    fold(snapshot, [("gauze", "receive", 1)])
+    assert snapshot == {"gauze": 1}
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        apply_movement(1, "borrow", 1)
@@ -0,0 +1,91 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import brotli
+import msgpack
+import pytest
+
+from transport import BodyTooLarge, Compressor, TransportMiddleware, choose_coding, choose_media_type, decompress
+
+
+def run(app, headers=(), body=b""):
+    # Drives one HTTP request through an ASGI app; returns (start message, body messages)
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": [(k.encode(), v.encode()) for k, v in headers]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0], sent[1:]
+
+
+def streaming_app(chunks):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def echo_app():
+    async def app(scope, receive, send):
+        message = await receive()
+        headers = dict(scope["headers"])
+        body = json.dumps({"body": message["body"].decode(), "type": headers.get(b"content-type", b"").decode()}).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def test_negotiation():
+    assert choose_coding("gzip, br") == "br"
+    assert choose_coding("gzip;q=1, br;q=0.5") == "gzip"
+    assert choose_coding("identity") is None
+    assert choose_media_type("application/msgpack, application/json;q=0.5") == "application/msgpack"
+    assert choose_media_type("application/json, application/msgpack;q=0.5") is None
+
+
+@pytest.mark.parametrize("coding", ["gzip", "br"])
+def test_every_streamed_chunk_decodes_as_it_arrives(coding):
+    lines = [json.dumps({"n": i}).encode() + b"\n" for i in range(3)]
+    start, messages = run(TransportMiddleware(streaming_app(lines)), [("accept-encoding", coding)])
+    assert dict(start["headers"])[b"content-encoding"] == coding.encode()
+    decoder = zlib.decompressobj(31) if coding == "gzip" else brotli.Decompressor()
+    decode = decoder.decompress if coding == "gzip" else decoder.process
+    for line, message in zip(lines, messages):
+        assert decode(message["body"]) == line
+    assert [m["more_body"] for m in messages] == [True, True, False]
+
+
+def test_compressor_round_trip():
+    compressor = Compressor("gzip", 6)
+    data = compressor.compress(b"a" * 1000) + compressor.flush() + compressor.compress(b"b") + compressor.finish()
+    assert gzip.decompress(data) == b"a" * 1000 + b"b"
+
+
+def test_gzip_and_msgpack_request_bodies_are_decoded():
+    body = gzip.compress(msgpack.packb({"symptom": "fever"}))
+    _, messages = run(TransportMiddleware(echo_app()), [("content-encoding", "gzip"), ("content-type", "application/msgpack")], body)
+    echoed = json.loads(messages[0]["body"])
+    assert json.loads(echoed["body"]) == {"symptom": "fever"} and echoed["type"] == "application/json"
+
+
+def test_oversized_bodies_are_refused_with_413():
+    bomb = gzip.compress(b"\0" * 100_000)
+    start, _ = run(TransportMiddleware(echo_app(), max_request_bytes=10_000), [("content-encoding", "gzip")], bomb)
+    assert start["status"] == 413
+    start, _ = run(TransportMiddleware(echo_app(), max_request_bytes=10), [("content-encoding", "identity"), ("content-type", "application/msgpack")], b"x" * 11)
+    assert start["status"] == 413
+    with pytest.raises(BodyTooLarge):
+        decompress(brotli.compress(b"\0" * 100_000), "br", 10_000)
+
+
+def test_unknown_encoding_is_refused_with_415():
+    start, _ = run(TransportMiddleware(echo_app()), [("content-encoding", "compress")], b"x")
+    assert start["status"] == 415
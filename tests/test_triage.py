@@ -0,0 +1,46 @@
+import random
+from datetime import datetime, timedelta
+
+from triage import IndexedHeap, TriageQueue
+
+
+def test_indexed_heap_keeps_order_through_updates_and_removals():
+    rng = random.Random(7)
+    heap, keys = IndexedHeap(), {}
+    for item_id in range(200):
+        keys[item_id] = rng.random()
+        heap.push(item_id, keys[item_id])
+    for item_id in rng.sample(range(200), 60):
+        keys[item_id] = rng.random()
+        heap.update(item_id, keys[item_id])
+    for item_id in rng.sample(range(200), 50):
+        heap.remove(item_id)
+        del keys[item_id]
+    assert heap.smallest(20) == sorted(keys, key=keys.get)[:20]
+    assert heap.peek() == min(keys, key=keys.get)
+    assert len(heap) == 150
+
+
+def case(case_id, urgency, minutes_ago, status="open"):
+    return {"id": case_id, "urgency": urgency, "status": status,
+            "created_at": datetime(2025, 1, 1) - timedelta(minutes=minutes_ago), "lat": None, "lon": None}
+
+
+def test_triage_orders_by_urgency_then_age():
+    queue = TriageQueue()
+    queue.upsert(case(1, "Low", 50))
+    queue.upsert(case(2, "Critical", 1))
+    queue.upsert(case(3, "high", 10))
+    queue.upsert(case(4, "High", 30))
+    assert [c["id"] for c in queue.peek(4)] == [2, 4, 3, 1]
+
+
+def test_triage_reprioritize_and_close():
+    queue = TriageQueue()
+    queue.upsert(case(1, "Low", 50))
+    queue.upsert(case(2, "Medium", 1))
+    assert queue.reprioritize(1, "Critical")
+    assert queue.peek(1)[0]["id"] == 1
+    queue.upsert(case(1, "Critical", 50, status="claimed"))
+    assert [c["id"] for c in queue.peek(5)] == [2]
+    assert not queue.reprioritize(99, "High")
@@ -0,0 +1,296 @@
+import gzip
+import json
+import zlib
+
+import brotli
+import cbor2
+import msgpack
+
+# Content codings we can produce, in order of preference when the client rates them equally
+CODINGS = ("br", "gzip")
+# Compact binary alternatives to JSON, for requests and responses
+BINARY_TYPES = {
+    "application/msgpack": (msgpack.packb, msgpack.unpackb),
+    "application/x-msgpack": (msgpack.packb, msgpack.unpackb),
+    "application/cbor": (cbor2.dumps, cbor2.loads),
+}
+# Already compressed (Parquet, images, archives) or not worth it is everything else
+COMPRESSIBLE_TYPES = (
+    "application/json", "text/", "application/msgpack", "application/x-msgpack", "application/cbor",
+    "application/vnd.apache.arrow", "application/x-ndjson", "application/xml", "application/javascript",
+)
+
+
+def parse_quality(header):
+    # "gzip;q=0.8, br" -> {"gzip": 0.8, "br": 1.0}
+    values = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[token.strip().lower()] = q
+    return values
+
+
+def choose_coding(accept_encoding):
+    qualities = parse_quality(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        q = qualities.get(coding, qualities.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def choose_media_type(accept):
+    # A binary type only when the client names it and rates it at least as high as JSON
+    qualities = parse_quality(accept)
+    best, best_q = None, 0.0
+    for media_type in BINARY_TYPES:
+        if qualities.get(media_type, 0.0) > best_q:
+            best, best_q = media_type, qualities[media_type]
+    if best is None or qualities.get("application/json", 0.0) > best_q:
+        return None
+    return best
+
+
+class Compressor:
+    def __init__(self, coding, level):
+        self.coding = coding
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=level)
+        else:
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.coding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        # Everything compressed so far, decodable by the client before the stream ends
+        if self.coding == "br":
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.coding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compress(data, coding, level):
+    if coding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def decompress(data, coding, limit):
+    # Inflates a request body, refusing to produce more than limit bytes
+    chunks, size = [], 0
+    if coding == "br":
+        decompressor = brotli.Decompressor()
+        chunk = decompressor.process(data, output_buffer_limit=limit + 1)
+        while True:
+            size += len(chunk)
+            if size > limit:
+                raise BodyTooLarge(coding)
+            chunks.append(chunk)
+            if decompressor.is_finished() or decompressor.can_accept_more_data():
+                break
+            chunk = decompressor.process(b"", output_buffer_limit=limit + 1)
+        if not decompressor.is_finished():
+            raise ValueError("truncated brotli stream")
+        return b"".join(chunks)
+    decompressor = zlib.decompressobj(47 if coding == "gzip" else 15)
+    chunk = decompressor.decompress(data, limit + 1)
+    while True:
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge(coding)
+        chunks.append(chunk)
+        if not decompressor.unconsumed_tail:
+            break
+        chunk = decompressor.decompress(decompressor.unconsumed_tail, limit + 1 - size)
+    if not decompressor.eof:
+        raise ValueError(f"truncated {coding} stream")
+    return b"".join(chunks)
+
+
+class TransportMiddleware:
+    # Pure ASGI middleware for clients on metered links.
+    # Requests: bodies sent with Content-Encoding gzip/br/deflate are inflated, and
+    # MessagePack or CBOR bodies are turned into JSON, before the endpoint sees them.
+    # Responses: JSON is re-encoded as MessagePack or CBOR when Accept asks for it,
+    # then compressed per Accept-Encoding. Streamed responses are compressed chunk
+    # by chunk so they keep streaming; small single-chunk bodies are sent as they are.
+
+    def __init__(self, app, enabled=True, min_size=512, gzip_level=6, brotli_quality=5,
+                 max_request_bytes=50 * 1024 * 1024):
+        self.app = app
+        self.enabled = enabled
+        self.min_size = min_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self.max_request_bytes = max_request_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers") or []}
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_encoding != "identity" or content_type in BINARY_TYPES:
+            rejected = None
+            try:
+                scope, receive = await self._decode_request(scope, receive, content_encoding, content_type)
+            except BodyTooLarge:
+                rejected = (413, "Request body too large")
+            except LookupError:
+                rejected = (415, f"Unsupported Content-Encoding: {content_encoding}")
+            except Exception as e:
+                rejected = (400, f"Could not decode request body: {e}")
+            if rejected is not None:
+                await self._reject(send, *rejected)
+                return
+        coding = choose_coding(headers.get("accept-encoding", ""))
+        media_type = choose_media_type(headers.get("accept", ""))
+        if coding is None and media_type is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, self._encoder(send, coding, media_type))
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ConnectionError("client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_request_bytes:
+                raise BodyTooLarge("request")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _decode_request(self, scope, receive, content_encoding, content_type):
+        body = await self._read_body(receive)
+        if content_encoding in ("gzip", "x-gzip", "br", "deflate"):
+            body = decompress(body, "gzip" if content_encoding == "x-gzip" else content_encoding, self.max_request_bytes)
+        elif content_encoding != "identity":
+            raise LookupError(content_encoding)
+        replace = {b"content-encoding": None, b"content-length": str(len(body)).encode()}
+        if content_type in BINARY_TYPES:
+            _, loads = BINARY_TYPES[content_type]
+            body = json.dumps(loads(body), default=str).encode()
+            replace[b"content-length"] = str(len(body)).encode()
+            replace[b"content-type"] = b"application/json"
+        headers = [(name, value) for name, value in scope["headers"] if name.lower() not in replace]
+        headers.extend((name, value) for name, value in replace.items() if value is not None)
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return {**scope, "headers": headers}, replay
+
+    async def _reject(self, send, status_code, detail):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _encoder(self, send, coding, media_type):
+        start = None
+        reencode = False
+        compressor = None
+        buffered = []
+        passthrough = False
+
+        async def send_encoded(message):
+            nonlocal start, reencode, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                response_headers = {name.lower(): value for name, value in message.get("headers", [])}
+                response_type = response_headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+                reencode = media_type is not None and response_type == "application/json"
+                passthrough = b"content-encoding" in response_headers or not response_type.startswith(COMPRESSIBLE_TYPES)
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if reencode:
+                # Re-encoding needs the whole document
+                buffered.append(body)
+                if more_body:
+                    return
+                body = b"".join(buffered)
+                if body:
+                    dumps, _ = BINARY_TYPES[media_type]
+                    body = dumps(json.loads(body))
+            if compressor is None and not more_body:
+                # The whole body in one piece: compress it only if that is worth it
+                encoded_with = coding if coding and len(body) >= self.min_size else None
+                if encoded_with:
+                    body = compress(body, coding, self.levels[coding])
+                await send({**start, "headers": self._headers(start, reencode and media_type, encoded_with, len(body))})
+                await send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+            if compressor is None:
+                if coding is None:
+                    passthrough = True
+                    await send({**start, "headers": self._headers(start, None, None, None)})
+                    await send(message)
+                    return
+                compressor = Compressor(coding, self.levels[coding])
+                await send({**start, "headers": self._headers(start, None, coding, None)})
+            # Flushed per chunk, so each streamed piece reaches the client when it is produced
+            chunk = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        return send_encoded
+
+    def _headers(self, start, media_type, coding, length):
+        # Response headers for the encoded body; length None means it is streamed
+        vary = [b"Accept-Encoding", b"Accept"]
+        headers = []
+        for name, value in start.get("headers", []):
+            lowered = name.lower()
+            if lowered == b"content-length" or (media_type and lowered == b"content-type"):
+                continue
+            if lowered == b"vary":
+                vary.insert(0, value)
+                continue
+            headers.append((name, value))
+        if media_type:
+            headers.append((b"content-type", media_type.encode("latin-1")))
+        headers.append((b"vary", b", ".join(vary)))
+        if coding:
+            headers.append((b"content-encoding", coding.encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
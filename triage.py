@@ -0,0 +1,183 @@
+import heapq
+import math
+import threading
+
+from spatial import haversine_km
+
+URGENCY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+
+def urgency_rank(urgency):
+    return URGENCY_RANK.get((urgency or "").strip().lower(), len(URGENCY_RANK))
+
+
+class IndexedHeap:
+    # Binary min-heap that keeps a position map, so an item can be re-keyed or
+    # removed by id in O(log n) instead of the O(n) search heapq would need.
+
+    def __init__(self):
+        self._heap = []
+        self._pos = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item_id):
+        return item_id in self._pos
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][1]] = i
+        self._pos[heap[j][1]] = j
+
+    def _sift_up(self, i):
+        heap = self._heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[i][0] >= heap[parent][0]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and heap[child][0] < heap[smallest][0]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def push(self, item_id, key):
+        if item_id in self._pos:
+            self.update(item_id, key)
+            return
+        self._heap.append((key, item_id))
+        self._pos[item_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, item_id, key):
+        i = self._pos[item_id]
+        old_key = self._heap[i][0]
+        self._heap[i] = (key, item_id)
+        if key < old_key:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def remove(self, item_id):
+        i = self._pos.pop(item_id)
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._pos[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self._pos[last[1]])
+
+    def peek(self):
+        return self._heap[0][1] if self._heap else None
+
+    def smallest(self, k):
+        # Best-first walk of the heap tree: O(k log k) without disturbing the heap
+        heap = self._heap
+        result = []
+        frontier = [(heap[0][0], 0)] if heap else []
+        while frontier and len(result) < k:
+            _, i = heapq.heappop(frontier)
+            result.append(heap[i][1])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child][0], child))
+        return result
+
+
+class TriageQueue:
+    # Open SAR cases ordered by urgency (Critical first), then age, then distance
+    # from the coordination base. The database stays the source of truth: entries
+    # are (re)loaded from SARRequests and claims are confirmed with a conditional
+    # UPDATE, so several workers can each hold a copy of the queue.
+
+    def __init__(self, base_lat=None, base_lon=None):
+        self.base_lat = base_lat
+        self.base_lon = base_lon
+        self._heap = IndexedHeap()
+        self._cases = {}
+        self._lock = threading.RLock()
+        self.synced_until = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _distance(self, lat, lon):
+        if lat is None or lon is None or self.base_lat is None or self.base_lon is None:
+            return math.inf
+        return haversine_km(self.base_lat, self.base_lon, lat, lon)
+
+    def _key(self, case):
+        created_at = case["created_at"]
+        return (urgency_rank(case["urgency"]), created_at.timestamp() if created_at else math.inf, case["distance_km"], case["id"])
+
+    def upsert(self, case):
+        with self._lock:
+            case = dict(case)
+            case["distance_km"] = self._distance(case.get("lat"), case.get("lon"))
+            if (case.get("status") or "open") != "open":
+                self.discard(case["id"])
+                return
+            self._cases[case["id"]] = case
+            self._heap.push(case["id"], self._key(case))
+
+    def discard(self, case_id):
+        with self._lock:
+            self._cases.pop(case_id, None)
+            if case_id in self._heap:
+                self._heap.remove(case_id)
+
+    def reprioritize(self, case_id, urgency):
+        with self._lock:
+            case = self._cases.get(case_id)
+            if case is None:
+                return False
+            case["urgency"] = urgency
+            self._heap.update(case_id, self._key(case))
+            return True
+
+    def peek(self, limit=10):
+        with self._lock:
+            return [self.describe(case_id) for case_id in self._heap.smallest(limit)]
+
+    def candidates(self):
+        # Yields the current head until the caller removes it (claimed or stale)
+        while True:
+            with self._lock:
+                case_id = self._heap.peek()
+            if case_id is None:
+                return
+            yield case_id
+
+    def describe(self, case_id):
+        case = self._cases[case_id]
+        distance = case["distance_km"]
+        return {
+            "id": case["id"],
+            "emergency_type": case.get("emergency_type"),
+            "location": case.get("location"),
+            "urgency": case["urgency"],
+            "created_at": case["created_at"],
+            "distance_km": None if math.isinf(distance) else round(distance, 3),
+        }
+
+    def get(self, case_id):
+        with self._lock:
+            return self._cases.get(case_id)
+
+    def clear(self):
+        with self._lock:
+            self._heap = IndexedHeap()
+            self._cases = {}
+            self.synced_until = None